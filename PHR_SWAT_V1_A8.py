@@ -17,6 +17,26 @@ import traceback
 from datetime import datetime
 import threading
 import queue
+import hashlib
+import pickle
+import tempfile
+import re
+import multiprocessing
+import argparse
+import json
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import base64
+import shutil
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # --- SETUP: Error Logging ---
 logging.basicConfig(
@@ -25,6 +45,82 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s %(message)s'
 )
 
+# --- SETUP: Table Cache ---
+# Generated tables are pickled here so a re-run that only changes one dialog
+# value recomputes one table. Override with PHR_CACHE_DIR / PHR_CACHE_MAX_MB.
+CACHE_DIR       = Path(os.environ.get('PHR_CACHE_DIR', Path.home() / '.phr_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('PHR_CACHE_MAX_MB', 512)) * 1024 * 1024
+CACHE_VERSION   = 4   # bump whenever a generator's output changes shape
+
+class TableCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, enabled=True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    def _entry_path(self, name, key_parts):
+        digest = hashlib.sha1(repr((CACHE_VERSION, name, key_parts)).encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{name}_{digest}.pkl"
+
+    def get_or_compute(self, name, key_parts, compute):
+        if not self.enabled:
+            return compute()
+        path = self._entry_path(name, key_parts)
+        if path.exists():
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                os.utime(path)  # mark as recently used for LRU eviction
+                return value
+            except Exception:
+                logging.warning(f"Discarding unreadable cache entry {path}: {traceback.format_exc()}")
+                path.unlink(missing_ok=True)
+        value = compute()
+        try:
+            self._store(path, value)
+        except Exception:
+            logging.warning(f"Could not write cache entry {path}: {traceback.format_exc()}")
+        return value
+
+    def _store(self, path, value):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in self.cache_dir.glob('*.pkl'):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for entry in self.cache_dir.glob('*.pkl'):
+            entry.unlink(missing_ok=True)
+
+def file_fingerprint(file_path, chunk_size=1024 * 1024):
+    # Content hash, so a copied or re-exported but identical extract still hits the cache
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
 # --- UI COMPONENT: Yearly Comparison Dialog ---
 class YearlyComparisonDialog:
     def __init__(self, parent, years):
@@ -171,6 +267,171 @@ class FiscalMonthDialog:
         self.result = None
         self.top.destroy()
         
+# --- UI COMPONENT: Virtualized table preview ---
+# Lists the computed tables straight from memory. Only the rows that fit in the
+# window are inserted into the Treeview, so a 500k-row table opens instantly.
+PREVIEW_SHEETS = [
+    ('Summary', 'summary', 'money'), ('MoM Change', 'mom', 'pct'),
+    ('Monthly Volume', 'vol_monthly', 'volume'), ('Last Paid Price', 'last_paid', 'money'),
+    ('Yearly Avg Price', 'yearly_prices', 'money'), ('Yearly Volume', 'yearly_volumes', 'volume'),
+    ('Yearly Comparison', 'yearly_comparison', 'pct'), ('Last Paid Yearly', 'last_paid_yearly', 'money'),
+    ('Last Paid Monthly', 'last_paid_monthly', 'money'), ('Data', 'raw_data', 'plain'),
+]
+PREVIEW_COLUMN_STYLES = {'Fiscal Month Volume': 'volume', 'PV': 'plain'}
+
+def _preview_cell(value, style):
+    if isinstance(value, str):
+        return value
+    if value is None or pd.isna(value):
+        return 'NoData'
+    if isinstance(value, (float, np.floating)):
+        if style == 'pct':
+            return f"{value:.1%}"
+        if style == 'volume':
+            return f"{value:,.0f}"
+        if style == 'money':
+            return f"${value:,.4f}"
+    return str(value)
+
+class TablePreviewWindow:
+    def __init__(self, parent, tables, on_export):
+        self.tables = tables
+        self.on_export = on_export
+        self.sheets = [(title, key, style) for title, key, style in PREVIEW_SHEETS if key in tables]
+        self.sheets += [(key, key, 'money') for key in tables if str(key).startswith('SWAT')]
+        self.top = tk.Toplevel(parent)
+        self.top.title("Report Preview")
+        self.top.geometry("1000x600")
+        self.offset = 0
+        self.visible = 25
+        self.sort_col, self.sort_desc = None, False
+        self.view_rows, self.col_styles = np.arange(0), []
+
+        bar = ttk.Frame(self.top, padding=5)
+        bar.pack(fill='x')
+        ttk.Label(bar, text="Sheet:").pack(side='left')
+        self.sheet_box = ttk.Combobox(bar, values=[t for t, _, _ in self.sheets], state="readonly", width=28)
+        self.sheet_box.pack(side='left', padx=5)
+        self.sheet_box.bind("<<ComboboxSelected>>", lambda e: self._load_sheet())
+        ttk.Label(bar, text="Key contains:").pack(side='left', padx=(15, 0))
+        self.filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(bar, textvariable=self.filter_var, width=25)
+        filter_entry.pack(side='left', padx=5)
+        filter_entry.bind("<Return>", lambda e: self._apply_view())
+        ttk.Button(bar, text="Filter", command=self._apply_view).pack(side='left')
+        ttk.Button(bar, text="Export to Excel...", command=lambda: self.on_export(self.top)).pack(side='right')
+        self.status_var = tk.StringVar()
+        ttk.Label(self.top, textvariable=self.status_var, padding=(5, 0)).pack(anchor='w')
+
+        grid = ttk.Frame(self.top)
+        grid.pack(fill='both', expand=True)
+        self.tree = ttk.Treeview(grid, show='headings', selectmode='browse')
+        self.vsb = ttk.Scrollbar(grid, orient='vertical', command=self._on_scrollbar)
+        hsb = ttk.Scrollbar(grid, orient='horizontal', command=self.tree.xview)
+        self.tree.configure(xscrollcommand=hsb.set)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.vsb.grid(row=0, column=1, sticky='ns')
+        hsb.grid(row=1, column=0, sticky='ew')
+        grid.rowconfigure(0, weight=1)
+        grid.columnconfigure(0, weight=1)
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self._scroll_by(-1 if e.delta > 0 else 1, 'units'))
+        self.tree.bind("<Button-4>", lambda e: self._scroll_by(-1, 'units'))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_by(1, 'units'))
+
+        if self.sheets:
+            self.sheet_box.current(0)
+            self._load_sheet()
+
+    # --- data access ---
+    def _load_sheet(self):
+        _, key, style = self.sheets[self.sheet_box.current()]
+        self.table = self.tables[key]
+        self.is_sparse = isinstance(self.table, SparseMonthTable)
+        self.columns = [str(c) for c in self.table.columns]
+        self.col_styles = [PREVIEW_COLUMN_STYLES.get(c, 'pct' if '%' in c else style) for c in self.columns]
+        keys = self.table.keys if self.is_sparse else self.table
+        self.key_cols = [c for c in ('Part Number', 'Vendor', 'Vendor Number', 'Plnt') if c in keys.columns]
+        self.tree.configure(columns=list(range(len(self.columns))))
+        for i, col in enumerate(self.columns):
+            self.tree.heading(i, text=col, command=lambda i=i: self._sort_by(i))
+            self.tree.column(i, width=max(80, 8 * len(col)), stretch=False)
+        self.sort_col, self.sort_desc = None, False
+        self._apply_view()
+
+    def _column_values(self, i):
+        if self.is_sparse:
+            id_len = len(self.table.id_cols)
+            if i >= id_len:
+                return pd.Series(self.table.column_values(i - id_len))
+            return self.table.keys.iloc[:, i]
+        return self.table.iloc[:, i]
+
+    def _apply_view(self):
+        rows = np.arange(len(self.table))
+        text = self.filter_var.get().strip().lower()
+        if text and self.key_cols:
+            keys = self.table.keys if self.is_sparse else self.table
+            hit = np.zeros(len(keys), dtype=bool)
+            for col in self.key_cols:
+                hit |= keys[col].astype(str).str.lower().str.contains(text, regex=False).to_numpy()
+            rows = rows[hit]
+        if self.sort_col is not None:
+            values = self._column_values(self.sort_col).iloc[rows].reset_index(drop=True)
+            order = values.sort_values(ascending=not self.sort_desc, kind='stable', na_position='last').index
+            rows = rows[order.to_numpy()]
+        self.view_rows = rows
+        self.offset = 0
+        self._render()
+
+    def _sort_by(self, i):
+        self.sort_desc = not self.sort_desc if self.sort_col == i else False
+        self.sort_col = i
+        self._apply_view()
+
+    def _row_values(self, r):
+        if self.is_sparse:
+            vals, _ = self.table.dense_row(r)
+            return list(self.table.keys.iloc[r]) + vals.tolist()
+        return list(self.table.iloc[r])
+
+    # --- virtual scrolling ---
+    def _render(self):
+        self.tree.delete(*self.tree.get_children())
+        total = len(self.view_rows)
+        end = min(self.offset + self.visible, total)
+        for r in self.view_rows[self.offset:end]:
+            self.tree.insert('', 'end', values=[_preview_cell(v, st) for v, st in zip(self._row_values(r), self.col_styles)])
+        if total:
+            self.vsb.set(self.offset / total, end / total)
+            self.status_var.set(f"Rows {self.offset + 1:,}-{end:,} of {total:,}")
+        else:
+            self.vsb.set(0, 1)
+            self.status_var.set("No rows")
+
+    def _scroll_to(self, offset):
+        offset = max(0, min(int(offset), max(0, len(self.view_rows) - self.visible)))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _scroll_by(self, amount, what):
+        step = self.visible if what.startswith('page') else 1
+        self._scroll_to(self.offset + int(amount) * step)
+
+    def _on_scrollbar(self, action, amount, what=None):
+        if action == 'moveto':
+            self._scroll_to(float(amount) * len(self.view_rows))
+        else:
+            self._scroll_by(amount, what)
+
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        visible = max(1, (event.height - 25) // row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self._render()
+
 # --- HELPER FUNCTIONS ---
 def find_column(df, aliases, friendly_name):
     aliases_clean = [str(a).strip().lower() for a in aliases]
@@ -191,10 +452,136 @@ def open_file(file_path):
     else:
         subprocess.call(['xdg-open', file_path])
 
+# --- ROW FILTERS (applied while reading) ---
+# Each filter key maps to the aliases of the column it restricts.
+FILTER_COLUMN_ALIASES = {
+    'parts':          ["Part Number", "Material", "Part"],
+    'vendor_numbers': ["Vendor Account Number", "Vendor #", "Vendor Number", "Supplier Number"],
+    'plants':         ["Plant", "Plnt"],
+    'event_types':    ["Tr./ev.type", "Tr./Ev. type", "Transaction Event Type", "Event Type"],
+}
+DATE_COLUMN_ALIASES = ["Pstng Date", "Posting Date", "Post Date"]
+AMOUNT_COLUMN_ALIASES = ["Amount in PO currency", "USD Invoiced", "Amount"]
+QTY_COLUMN_ALIASES = ["Net Qty in BUoM", "Units", "Quantity"]
+CSV_CHUNK_ROWS = 250_000
+
+def _key_string(value):
+    text = str(value).strip()
+    return text[:-2] if text.endswith('.0') else text
+
+def _key_strings(series):
+    return series.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+
+def normalise_filters(filters):
+    # Drops empty entries; list values become sets of key strings so "1000", 1000 and 1000.0 match
+    if not filters:
+        return {}
+    clean = {}
+    for key in FILTER_COLUMN_ALIASES:
+        values = {_key_string(v) for v in (filters.get(key) or []) if str(v).strip()}
+        if values:
+            clean[key] = values
+    for key in ('date_from', 'date_to'):
+        if filters.get(key) is not None:
+            clean[key] = pd.Timestamp(filters[key])
+    return clean
+
+def filters_cache_key(filters):
+    return tuple(sorted(
+        (k, tuple(sorted(v)) if isinstance(v, set) else str(v)) for k, v in (filters or {}).items()
+    ))
+
+def resolve_filter_columns(columns, filters):
+    probe = pd.DataFrame(columns=[str(c).strip() for c in columns])
+    resolved = {}
+    for key in FILTER_COLUMN_ALIASES:
+        if key in filters:
+            col = find_column(probe, FILTER_COLUMN_ALIASES[key], key)
+            if col is None:
+                raise ValueError(f"Cannot filter on {key.replace('_', ' ')}: column not found.")
+            resolved[key] = col
+    if 'date_from' in filters or 'date_to' in filters:
+        col = find_column(probe, DATE_COLUMN_ALIASES, "posting date")
+        if col is None:
+            raise ValueError("Cannot filter on dates: posting date column not found.")
+        resolved['date'] = col
+    return resolved
+
+def apply_row_filters(df, filters, filter_cols):
+    if not filters or df.empty:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for key, wanted in filters.items():
+        if key in FILTER_COLUMN_ALIASES:
+            mask &= _key_strings(df[filter_cols[key]]).isin(wanted).to_numpy()
+    if 'date' in filter_cols:
+        dates = pd.to_datetime(df[filter_cols['date']], errors='coerce')
+        if 'date_from' in filters:
+            mask &= (dates >= filters['date_from']).to_numpy()
+        if 'date_to' in filters:
+            # date_to is inclusive of the whole day
+            mask &= (dates < filters['date_to'] + pd.Timedelta(days=1)).to_numpy()
+    return df[mask]
+
+def _read_csv_filtered(file_path, id_dtypes, filters):
+    reader = pd.read_csv(file_path, dtype=id_dtypes, keep_default_na=False, chunksize=CSV_CHUNK_ROWS)
+    kept, filter_cols = [], None
+    for chunk in reader:
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        if filter_cols is None:
+            filter_cols = resolve_filter_columns(chunk.columns, filters)
+        kept.append(apply_row_filters(chunk, filters, filter_cols))
+    if not kept:
+        return pd.read_csv(file_path, dtype=id_dtypes, keep_default_na=False, nrows=0)
+    return pd.concat(kept, ignore_index=True)
+
+def _read_xlsx_filtered(file_path, id_dtypes, filters):
+    # Streams the sheet with openpyxl and keeps only matching rows, converting
+    # cells exactly like pandas' openpyxl reader so the result matches read_excel.
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+    from pandas.io.parsers import TextParser
+
+    def convert(cell):
+        if cell.value is None:
+            return ""
+        if cell.data_type == TYPE_ERROR:
+            return np.nan
+        if cell.data_type == TYPE_NUMERIC:
+            val = int(cell.value)
+            return val if val == cell.value else float(cell.value)
+        return cell.value
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        rows = ws.iter_rows()
+        header = [convert(c) for c in next(rows, [])]
+        while header and header[-1] == "":
+            header.pop()
+        filter_cols = resolve_filter_columns(header, filters)
+        stripped = [str(h).strip() for h in header]
+        key_checks = [(stripped.index(filter_cols[k]), filters[k]) for k in filters if k in FILTER_COLUMN_ALIASES]
+        width = len(header)
+        data = [header]
+        for row in rows:
+            values = [convert(c) for c in row[:width]]
+            values += [""] * (width - len(values))
+            if all(_key_string(values[i]) in wanted for i, wanted in key_checks):
+                data.append(values)
+    finally:
+        wb.close()
+    df = TextParser(data, header=0, dtype=id_dtypes, keep_default_na=False).read()
+    df.columns = [str(c).strip() for c in df.columns]
+    # dates are compared vectorised once the (already much smaller) frame exists
+    return apply_row_filters(df, {k: v for k, v in filters.items() if k.startswith('date_')}, filter_cols)
+
 # --- DATA PROCESSING PIPELINE ---
-def read_and_prepare_data(file_path):
+def read_and_prepare_data(file_path, filters=None):
     file_path = Path(file_path)
     file_ext = file_path.suffix.lower()
+    filters = normalise_filters(filters)
     read_kw = dict(sheet_name=0)
     if file_ext in [".xlsx", ".xlsm"]:
         read_kw["engine"] = "openpyxl"
@@ -211,16 +598,26 @@ def read_and_prepare_data(file_path):
         "Vendor Number": str, "Supplier Number": str
     }
     if file_ext == ".csv":
-        df = pd.read_csv(file_path, dtype=id_dtypes, keep_default_na=False)
+        if filters:
+            df = _read_csv_filtered(file_path, id_dtypes, filters)
+        else:
+            df = pd.read_csv(file_path, dtype=id_dtypes, keep_default_na=False)
+    elif filters and file_ext in [".xlsx", ".xlsm"]:
+        df = _read_xlsx_filtered(file_path, id_dtypes, filters)
     else:
         df = pd.read_excel(file_path, dtype=id_dtypes, keep_default_na=False, **read_kw)
 
     df.columns = [str(c).strip() for c in df.columns]
+    if filters and file_ext not in [".csv", ".xlsx", ".xlsm"]:
+        # No streaming reader for these formats: filter before any further processing
+        df = apply_row_filters(df, filters, resolve_filter_columns(df.columns, filters))
+    if filters and df.empty:
+        raise ValueError("No rows match the selected filters.")
 
-    pstng_col    = find_column(df, ["Pstng Date", "Posting Date", "Post Date"], "posting date")
-    amount_col   = find_column(df, ["Amount in PO currency", "USD Invoiced", "Amount"], "amount")
-    qty_col      = find_column(df, ["Net Qty in BUoM", "Units", "Quantity"], "quantity")
-    part_num_col = find_column(df, ["Part Number", "Material", "Part"], "part number")
+    pstng_col    = find_column(df, DATE_COLUMN_ALIASES, "posting date")
+    amount_col   = find_column(df, AMOUNT_COLUMN_ALIASES, "amount")
+    qty_col      = find_column(df, QTY_COLUMN_ALIASES, "quantity")
+    part_num_col = find_column(df, FILTER_COLUMN_ALIASES['parts'], "part number")
 
     if not all([pstng_col, amount_col, qty_col, part_num_col]):
         missing = [name for name, col in [
@@ -254,9 +651,9 @@ def read_and_prepare_data(file_path):
 
     rename_map = {
         "Vendor": find_column(df, ["Vendor", "Vendor Name", "Supplier"], "vendor name"),
-        "Vendor Number": find_column(df, ["Vendor Account Number", "Vendor #", "Vendor Number", "Supplier Number"], "vendor number"),
-        "Plnt": find_column(df, ["Plant", "Plnt"], "plant"),
-        "Tr./ev.type": find_column(df, ["Tr./ev.type", "Tr./Ev. type", "Transaction Event Type", "Event Type"], "transaction / event type"),
+        "Vendor Number": find_column(df, FILTER_COLUMN_ALIASES['vendor_numbers'], "vendor number"),
+        "Plnt": find_column(df, FILTER_COLUMN_ALIASES['plants'], "plant"),
+        "Tr./ev.type": find_column(df, FILTER_COLUMN_ALIASES['event_types'], "transaction / event type"),
         "OUn": find_column(df, ["Order Unit", "OUn", "UoM"], "order unit"),
         "Crcy": found_crcy
     }
@@ -279,10 +676,289 @@ def read_and_prepare_data(file_path):
 
     return df, standard_id_cols, pstng_col, qty_col
 
-def generate_analysis_tables(df, id_cols, pstng_col, qty_col):
-    df_for_calcs = df.dropna(subset=[pstng_col]).copy()
+# --- SPARSE (LONG-FORMAT) MONTH TABLES ---
+# Key x period tables are mostly empty (parts buy a few months a year), so only
+# the observed cells are kept. Dense rows are rebuilt one at a time when a sheet
+# is written, which keeps peak memory proportional to the observations.
+class SparseMonthTable:
+    # kind: 'ffill' - cells after an observation carry it forward (Summary, Last Paid by Year/Month)
+    #       'pct'   - change vs the previous observation, 0 while nothing changes (MoM)
+    #       'sum'   - cells without an observation are 0 (Monthly Volume)
+    def __init__(self, keys, periods, row, col, values, kind, carry=None):
+        order = np.lexsort((col, row))
+        self.keys    = keys.reset_index(drop=True)
+        self.periods = [str(p) for p in periods]
+        self.kind    = kind
+        self.row     = np.asarray(row, dtype=np.int64)[order]
+        self.col     = np.asarray(col, dtype=np.int64)[order]
+        self.values  = np.asarray(values, dtype=np.float64)[order]
+        if carry is not None:
+            self.carry = np.asarray(carry, dtype=np.float64)[order]
+        else:
+            self.carry = np.zeros_like(self.values) if kind == 'sum' else self.values
+        self.before  = 0.0 if kind == 'sum' else np.nan
+        self._row_ptr = np.searchsorted(self.row, np.arange(len(self.keys) + 1))
+
+    @property
+    def id_cols(self):
+        return list(self.keys.columns)
+
+    @property
+    def columns(self):
+        return self.id_cols + self.periods
+
+    @property
+    def shape(self):
+        return (len(self.keys), len(self.keys.columns) + len(self.periods))
+
+    @property
+    def empty(self):
+        return len(self.keys) == 0 or len(self.periods) == 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def dense_row(self, i):
+        # Returns (values, carried): carried marks cells filled from an earlier observation
+        n = len(self.periods)
+        lo, hi = self._row_ptr[i], self._row_ptr[i + 1]
+        cols = self.col[lo:hi]
+        out = np.full(n, self.before)
+        carried = np.zeros(n, dtype=bool)
+        if hi > lo:
+            # index of the latest observation at or before each period
+            last_obs = np.searchsorted(cols, np.arange(n), side='right') - 1
+            seen = last_obs >= 0
+            out[seen] = self.carry[lo:hi][last_obs[seen]]
+            carried[seen] = True
+            out[cols] = self.values[lo:hi]
+            carried[cols] = False
+        return out, carried
+
+    def column_values(self, j):
+        # Dense values of period column j for every key (used for sorting previews)
+        out = np.full(len(self.keys), self.before)
+        upto = self.col <= j
+        rows, cols = self.row[upto], self.col[upto]
+        if len(rows):
+            is_last = np.r_[rows[1:] != rows[:-1], True]
+            idx = np.flatnonzero(upto)[is_last]
+            out[rows[is_last]] = np.where(cols[is_last] == j, self.values[idx], self.carry[idx])
+        return out
+
+    def iter_dense_rows(self):
+        for i in range(len(self.keys)):
+            yield (i, *self.dense_row(i))
+
+    def take(self, rows):
+        # Sub-table with the given key rows (in the given order)
+        rows = np.asarray(rows, dtype=np.int64)
+        new_pos = np.full(len(self.keys), -1, dtype=np.int64)
+        new_pos[rows] = np.arange(len(rows))
+        keep = new_pos[self.row] >= 0
+        return SparseMonthTable(self.keys.iloc[rows], self.periods, new_pos[self.row[keep]],
+                                self.col[keep], self.values[keep], self.kind, self.carry[keep])
+
+    def to_frame(self):
+        # Dense frame in the old pivot layout (NaN where the sheet shows NoData)
+        dense = np.full((len(self.keys), len(self.periods)), self.before)
+        for i, vals, _ in self.iter_dense_rows():
+            dense[i] = vals
+        return pd.concat([self.keys, pd.DataFrame(dense, columns=self.periods)], axis=1)
+
+def sparse_from_long(long_df, id_cols, period_col, value_col, periods, kind, dropna_keys=True, labels=None):
+    # long_df holds one row per observed (key, period); rows come out sorted by key like pivot_table
+    grouped = long_df.groupby(id_cols, sort=True, dropna=dropna_keys)
+    row = grouped.ngroup().to_numpy()
+    keep = row >= 0
+    keys = grouped.size().index.to_frame(index=False)
+    col = pd.Index(periods).get_indexer(long_df[period_col])
+    keep &= col >= 0
+    return SparseMonthTable(keys, periods if labels is None else labels, row[keep], col[keep],
+                            long_df[value_col].to_numpy(dtype=np.float64)[keep], kind)
+
+def sparse_pct_change(table):
+    # pct_change of the forward-filled rows, computed on the observed points only
+    same_row = np.r_[False, table.row[1:] == table.row[:-1]]
+    prev = np.r_[np.nan, table.values[:-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(same_row, table.values / prev - 1, np.nan)
+    pct[np.isinf(pct)] = np.nan
+    # between observations the level is flat: 0% change, or 0/0 when the level is 0
+    carry = np.where(table.values != 0, 0.0, np.nan)
+    return SparseMonthTable(table.keys, table.periods, table.row, table.col, pct, 'pct', carry)
+
+# --- MONTHLY CUBE ---
+# One row per (standard id key x month) holding additive aggregates and the
+# latest posting. Every PHR table is derived from it, so the work after the
+# first pass is proportional to keys x months instead of transactions.
+CUBE_SUM_COLS = ['amount', 'qty', 'count', 'pu_sum', 'pu_count', 'qty_priced']
+CUBE_LAST_COLS = ['last_date', 'last_pu', 'last_priced_date', 'last_priced_pu']
+
+def _last_by_date(gid, n_groups, dates, values):
+    # value at the latest date of each group; on equal dates the later row wins
+    last_dates = np.full(n_groups, np.datetime64('NaT'), dtype='datetime64[ns]')
+    last_values = np.full(n_groups, np.nan)
+    valid = ~np.isnat(dates)
+    g, d, v = gid[valid], dates[valid], values[valid]
+    if len(g):
+        order = np.lexsort((d, g))
+        g, d, v = g[order], d[order], v[order]
+        is_last = np.r_[g[1:] != g[:-1], True]
+        last_dates[g[is_last]] = d[is_last]
+        last_values[g[is_last]] = v[is_last]
+    return last_dates, last_values
+
+def _aggregate_cube(src, by):
+    grouped = src.groupby(by, sort=True, dropna=False)
+    gid, n_groups = grouped.ngroup().to_numpy(), grouped.ngroups
+    _, first = np.unique(gid, return_index=True)
+    out = src[by].iloc[first].reset_index(drop=True)
+    sums = src[CUBE_SUM_COLS].groupby(gid).sum()
+    for col in CUBE_SUM_COLS:
+        out[col] = sums[col].to_numpy()
+    for date_col, value_col in [('last_date', 'last_pu'), ('last_priced_date', 'last_priced_pu')]:
+        out[date_col], out[value_col] = _last_by_date(
+            gid, n_groups,
+            src[date_col].to_numpy(dtype='datetime64[ns]'),
+            src[value_col].to_numpy(dtype=np.float64)
+        )
+    return out
+
+# --- SHARDED CUBE BUILD ---
+# Rows are hash-partitioned by Part Number and each shard is aggregated in its own
+# process. The key columns are factorized (sorted, missing last) so the workers only
+# see numeric arrays, which are shared through multiprocessing.shared_memory instead
+# of being pickled. A group never spans two shards, so sorting the concatenated shard
+# cubes by key code gives back exactly the single-process cube.
+SHARD_MIN_ROWS = 200_000
+
+def _cube_shard(args):
+    shm_name, layout, start, end, by = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = shm.buf
+        src = pd.DataFrame({
+            name: np.ndarray((total,), dtype=dtype, buffer=buf, offset=offset)[start:end].copy()
+            for name, dtype, offset, total in layout
+        })
+        del buf
+        return _aggregate_cube(src, by)
+    finally:
+        shm.close()
+
+def _aggregate_cube_sharded(src, by, workers):
+    part_col = 'Part Number' if 'Part Number' in by else by[0]
+    codes, uniques = {}, {}
+    for col in by:
+        code, uniq = pd.factorize(src[col], sort=True)
+        codes[col] = np.where(code < 0, len(uniq), code).astype(np.int64)  # missing keys sort last
+        uniques[col] = uniq
+    shard = codes[part_col] % workers
+    order = np.argsort(shard, kind='stable')  # keeps row order inside each shard for the tie rules
+    bounds = np.searchsorted(shard[order], np.arange(workers + 1))
+    arrays = {col: codes[col][order] for col in by}
+    for col in CUBE_SUM_COLS + CUBE_LAST_COLS:
+        values = src[col].to_numpy()
+        if values.dtype.kind not in 'ifbM':
+            values = pd.to_numeric(src[col], errors='coerce').to_numpy(dtype=np.float64)
+        arrays[col] = values[order]
+    layout, offset = [], 0
+    for name, values in arrays.items():
+        offset = -(-offset // 8) * 8
+        layout.append((name, values.dtype.str, offset, len(values)))
+        offset += values.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for (name, dtype, off, total) in layout:
+            np.ndarray((total,), dtype=dtype, buffer=shm.buf, offset=off)[:] = arrays[name]
+        del arrays
+        jobs = [(shm.name, layout, int(bounds[i]), int(bounds[i + 1]), list(by))
+                for i in range(workers) if bounds[i + 1] > bounds[i]]
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            parts = list(pool.map(_cube_shard, jobs))
+    finally:
+        shm.close()
+        shm.unlink()
+    cube = pd.concat(parts, ignore_index=True).sort_values(by, kind='stable', ignore_index=True)
+    for col in by:
+        uniq = uniques[col]
+        code = cube[col].to_numpy()
+        decoded = uniq.take(np.minimum(code, max(len(uniq) - 1, 0))) if len(uniq) else np.full(len(code), np.nan)
+        cube[col] = pd.Series(decoded, index=cube.index).where(code < len(uniq), np.nan)
+    for col in ['count', 'pu_count']:
+        cube[col] = cube[col].astype(np.int64)
+    return cube
+
+def build_monthly_cube(df, id_cols, pstng_col, qty_col, workers=None):
+    dated = df[df[pstng_col].notna()]
+    amount_col = find_column(dated, AMOUNT_COLUMN_ALIASES, "amount")
+    pu = dated['P/U']
+    priced = pu.notna()
+    src = dated[id_cols].copy()
+    src['Month'] = dated[pstng_col].dt.to_period('M').dt.to_timestamp()
+    src['amount'] = dated[amount_col] if amount_col else np.nan
+    src['qty'] = dated[qty_col]
+    src['count'] = 1
+    src['pu_sum'] = pu
+    src['pu_count'] = priced.astype(np.int64)
+    src['qty_priced'] = dated[qty_col].where(priced)
+    src['last_date'] = dated[pstng_col]
+    src['last_pu'] = pu
+    src['last_priced_date'] = dated[pstng_col].where(priced)
+    src['last_priced_pu'] = pu
+    by = list(id_cols) + ['Month']
+    if workers and workers > 1 and len(src) >= SHARD_MIN_ROWS:
+        return _aggregate_cube_sharded(src, by, workers)
+    return _aggregate_cube(src, by)
+
+def rollup_cube(cube, id_cols, freq='M', dropna_keys=True):
+    # freq: 'M' per month, 'Y' per calendar year (column 'Year'), None for one row per key
+    src = cube
+    if dropna_keys:
+        src = src.dropna(subset=id_cols)
+    by = list(id_cols)
+    if freq == 'M':
+        by.append('Month')
+    elif freq == 'Y':
+        src = src.assign(Year=src['Month'].dt.year)
+        by.append('Year')
+    cube_id_cols = [c for c in cube.columns if c not in CUBE_SUM_COLS + CUBE_LAST_COLS + ['Month']]
+    if by == cube_id_cols + ['Month']:
+        return src.reset_index(drop=True)
+    return _aggregate_cube(src, by)
+
+def cube_years(cube, priced=True):
+    rows = cube[cube['pu_count'] > 0] if priced else cube
+    return sorted(int(y) for y in rows['Month'].dt.year.unique())
+
+def build_summary_table(cube, price_id_cols):
+    price_long = rollup_cube(cube, price_id_cols)
+    price_long = price_long[price_long['pu_count'] > 0]
+    price_long = price_long.assign(avg_pu=price_long['pu_sum'] / price_long['pu_count'])
+    months = sorted(price_long['Month'].unique())
+    return sparse_from_long(price_long, price_id_cols, 'Month', 'avg_pu', months, 'ffill',
+                            labels=[pd.Timestamp(m).strftime("%m/%d/%Y") for m in months])
+
+def build_volume_table(cube, volume_id_cols):
+    vol_long = rollup_cube(cube, volume_id_cols)
+    vol_months = sorted(vol_long['Month'].unique())
+    return sparse_from_long(vol_long, volume_id_cols, 'Month', 'qty', vol_months, 'sum',
+                            labels=[pd.Timestamp(m).strftime("%m/%d/%Y") for m in vol_months])
+
+def build_last_paid_table(cube, price_id_cols):
+    last = rollup_cube(cube, price_id_cols, freq=None, dropna_keys=False)
+    last = last.sort_values(by='last_date', ascending=False, kind='stable')
+    last_paid_df = last[price_id_cols + ['last_date', 'last_pu']]\
+                    .rename(columns={'last_date': 'Date', 'last_pu': 'LastPaidPrice'})\
+                    .reset_index(drop=True)
+    last_paid_df['Date'] = last_paid_df['Date'].dt.strftime("%m/%d/%Y")
+    return last_paid_df
+
+def generate_analysis_tables(df, id_cols, pstng_col, qty_col, cube=None):
+    if cube is None:
+        cube = build_monthly_cube(df, id_cols, pstng_col, qty_col)
     tables = {}
-    df_for_calcs['Manual Date'] = df_for_calcs[pstng_col].apply(lambda d: d.replace(day=1))
 
     price_id_cols  = id_cols
     volume_id_cols = [c for c in id_cols if c != 'Crcy']
@@ -290,66 +966,90 @@ def generate_analysis_tables(df, id_cols, pstng_col, qty_col):
     tables['volume_id_cols'] = volume_id_cols
 
     # Summary & MoM
-    raw_summary = pd.pivot_table(df_for_calcs, index=price_id_cols,
-                                 columns='Manual Date', values='P/U', aggfunc='mean')
-    missing_before_ffill = raw_summary.isna()
-    summary_ffill = raw_summary.ffill(axis=1)
-    summary_ffill_mask = missing_before_ffill & ~summary_ffill.isna()
-    tables['summary_ffill_mask'] = summary_ffill_mask.reset_index(drop=True)
-    summary_df = summary_ffill.reset_index()
-    summary_df.columns = [
-        c.strftime("%m/%d/%Y") if isinstance(c, pd.Timestamp) else c
-        for c in summary_df.columns
-    ]
-    tables['summary'] = summary_df
-
-    mom = summary_ffill.pct_change(axis=1).replace([np.inf, -np.inf], np.nan)
-    tables['mom_empty_mask'] = mom.isna()
-    mom_df = mom.fillna(0).reset_index()
-    mom_df.columns = [
-        c.strftime("%m/%d/%Y") if isinstance(c, pd.Timestamp) else c
-        for c in mom_df.columns
-    ]
-    tables['mom'] = mom_df
+    tables['summary'] = build_summary_table(cube, price_id_cols)
+    tables['mom'] = sparse_pct_change(tables['summary'])
 
     # Monthly Volume
-    vol_monthly = pd.pivot_table(df_for_calcs, index=volume_id_cols,
-                                 columns='Manual Date', values=qty_col, aggfunc='sum')\
-                    .fillna(0)
-    vol_monthly_df = vol_monthly.reset_index()
-    vol_monthly_df.columns = [
-        c.strftime("%m/%d/%Y") if isinstance(c, pd.Timestamp) else c
-        for c in vol_monthly_df.columns
-    ]
-    tables['vol_monthly'] = vol_monthly_df
+    tables['vol_monthly'] = build_volume_table(cube, volume_id_cols)
 
     # Last Paid Price (overall)
-    df_unique_last = df_for_calcs.sort_values(by=pstng_col, ascending=False)\
-                      .drop_duplicates(subset=price_id_cols)
-    last_paid_df = df_unique_last[price_id_cols + [pstng_col, 'P/U']]\
-                    .rename(columns={pstng_col: 'Date', 'P/U': 'LastPaidPrice'})\
-                    .reset_index(drop=True)
-    last_paid_df['Date'] = last_paid_df['Date'].dt.strftime("%m/%d/%Y")
-    tables['last_paid'] = last_paid_df
+    tables['last_paid'] = build_last_paid_table(cube, price_id_cols)
 
     return tables
 
-def generate_yearly_comparison_tables(df, id_cols, pstng_col, qty_col, parent_window):
-    df_for_calcs = df.dropna(subset=[pstng_col, 'P/U', qty_col]).copy()
-    if df_for_calcs.empty:
-        return {}
-    df_for_calcs['Year'] = pd.to_datetime(df_for_calcs[pstng_col]).dt.year
-    years = sorted(df_for_calcs['Year'].unique())
+def resolve_year_range(spec, years):
+    # saved-profile counterpart of the year dialog: missing bounds mean the full range
     if not years:
-        messagebox.showwarning("Comparison Warning",
-                               "No valid date data for yearly comparison.",
-                               parent=parent_window)
-        return {}
+        return None
+    start = int(spec.get('start', min(years)))
+    end = int(spec.get('end', max(years)))
+    return {'start': start, 'end': end, 'target': int(spec.get('target', end))}
 
+def ask_year_range(years, parent_window, warning_title, warning_text):
+    if not years:
+        messagebox.showwarning(warning_title, warning_text, parent=parent_window)
+        return None
     dialog = YearlyComparisonDialog(parent_window, years)
-    if not dialog.result:
+    return dialog.result
+
+# --- YEARLY CHANGE TENSOR ---
+class YearlyChangeTensor:
+    # change[k, t, r] = price(k, year t) / price(k, year r) - 1 for every key and every pair
+    # of years, on the yearly average price forward-filled across the whole span of the data.
+    # source[k, y] is the index of the year whose price was carried into year y (-1: none yet),
+    # which lets a slice honour a narrower year window without recomputing anything.
+    def __init__(self, keys, years, avg_prices):
+        self.keys  = keys.reset_index(drop=True)
+        self.years = [int(y) for y in years]
+        observed = ~np.isnan(avg_prices)
+        self.source = np.maximum.accumulate(
+            np.where(observed, np.arange(len(self.years)), -1), axis=1
+        ) if avg_prices.size else np.full(avg_prices.shape, -1)
+        prices = np.where(self.source >= 0,
+                          np.take_along_axis(avg_prices, np.maximum(self.source, 0), axis=1), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = prices[:, :, None] / prices[:, None, :] - 1
+        change[~np.isfinite(change)] = np.nan
+        self.change = change
+
+    @property
+    def columns(self):
+        return list(self.keys.columns)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def take(self, rows):
+        part = YearlyChangeTensor.__new__(YearlyChangeTensor)
+        part.keys   = self.keys.iloc[rows].reset_index(drop=True)
+        part.years  = self.years
+        part.source = self.source[rows]
+        part.change = self.change[rows]
+        return part
+
+    def pair(self, target, ref, since=None):
+        # since: first year of the window the prices were forward-filled from
+        t, r = self.years.index(target), self.years.index(ref)
+        values = self.change[:, t, r].copy()
+        if since is not None:
+            first = np.searchsorted(self.years, since)
+            values[(self.source[:, t] < first) | (self.source[:, r] < first)] = np.nan
+        return values
+
+    def comparison_frame(self, target, refs, since=None):
+        data = {f'Price Change % vs {target} [{y}]': self.pair(target, y, since) for y in refs}
+        return pd.concat([self.keys, pd.DataFrame(data, index=self.keys.index)], axis=1)
+
+def generate_yearly_comparison_tables(df, id_cols, pstng_col, qty_col, parent_window, params=None, cube=None):
+    if cube is None:
+        cube = build_monthly_cube(df, id_cols, pstng_col, qty_col)
+    if params is None:
+        params = ask_year_range(cube_years(cube), parent_window, "Comparison Warning",
+                                "No valid date data for yearly comparison.")
+        if not params:
+            return {}
+    if not (cube['pu_count'] > 0).any():
         return {}
-    params = dialog.result
     start_y, end_y, target_y = params['start'], params['end'], params['target']
     years_in_range = list(range(start_y, end_y + 1))
     all_years_needed = sorted(set(years_in_range + [target_y]))
@@ -357,11 +1057,19 @@ def generate_yearly_comparison_tables(df, id_cols, pstng_col, qty_col, parent_wi
     price_id_cols  = id_cols
     volume_id_cols = [c for c in id_cols if c != 'Crcy']
 
-    yearly_avg_pivot = pd.pivot_table(df_for_calcs, index=price_id_cols,
-                                      columns='Year', values='P/U', aggfunc='mean')
-    yearly_vol_pivot = pd.pivot_table(df_for_calcs, index=volume_id_cols,
-                                      columns='Year', values=qty_col, aggfunc='sum')\
-                         .fillna(0)
+    yearly_price = rollup_cube(cube[cube['pu_count'] > 0], price_id_cols, freq='Y')
+    yearly_avg_all = yearly_price.assign(avg_pu=yearly_price['pu_sum'] / yearly_price['pu_count'])\
+                                 .set_index(price_id_cols + ['Year'])['avg_pu'].unstack('Year')
+    # every year pair at once; the sheet below is the target row of this tensor
+    span = sorted(set(yearly_avg_all.columns) | set(all_years_needed))
+    span = list(range(int(span[0]), int(span[-1]) + 1))
+    yearly_avg_all = yearly_avg_all.reindex(columns=span)
+    tensor = YearlyChangeTensor(yearly_avg_all.index.to_frame(index=False), span,
+                                yearly_avg_all.to_numpy(dtype=np.float64))
+    yearly_avg_pivot = yearly_avg_all[all_years_needed].copy()
+    yearly_vol = rollup_cube(cube[cube['pu_count'] > 0], volume_id_cols, freq='Y')
+    yearly_vol_pivot = yearly_vol.set_index(volume_id_cols + ['Year'])['qty_priced']\
+                                 .unstack('Year').fillna(0)
 
     for y in all_years_needed:
         if y not in yearly_avg_pivot.columns:
@@ -371,53 +1079,42 @@ def generate_yearly_comparison_tables(df, id_cols, pstng_col, qty_col, parent_wi
 
     yearly_avg_pivot = yearly_avg_pivot[all_years_needed]
     yearly_vol_pivot = yearly_vol_pivot[all_years_needed]
+    yearly_avg_pivot.columns.name = yearly_vol_pivot.columns.name = 'Year'
 
     missing_before_ffill = yearly_avg_pivot.isna()
     yearly_avg_pivot_ffill = yearly_avg_pivot.ffill(axis=1)
     forward_filled_mask = missing_before_ffill & ~yearly_avg_pivot_ffill.isna()
 
-    comparison_dfs = {}
-    if target_y in yearly_avg_pivot_ffill.columns:
-        for y in years_in_range:
-            if y in yearly_avg_pivot_ffill.columns:
-                comparison_dfs[f'Price Change % vs {target_y} [{y}]'] = (
-                    yearly_avg_pivot_ffill[target_y] /
-                    yearly_avg_pivot_ffill[y] - 1
-                ).replace([np.inf, -np.inf], np.nan)
-
     yearly_prices_df  = yearly_avg_pivot_ffill.reset_index()
     yearly_volumes_df = yearly_vol_pivot.reset_index()
-    yearly_comparison_df = pd.DataFrame(comparison_dfs,
-                                        index=yearly_avg_pivot.index)\
-                                .reset_index()
+    if all_years_needed == list(range(all_years_needed[0], all_years_needed[-1] + 1)):
+        yearly_comparison_df = tensor.comparison_frame(target_y, years_in_range, since=all_years_needed[0])
+    else:
+        # target outside the range with a gap: the sheet forward-fills across the chosen years only
+        window = YearlyChangeTensor(tensor.keys, all_years_needed, yearly_avg_pivot.to_numpy(dtype=np.float64))
+        yearly_comparison_df = window.comparison_frame(target_y, years_in_range)
 
     return {
         'yearly_prices': yearly_prices_df,
         'yearly_volumes': yearly_volumes_df,
         'yearly_comparison': yearly_comparison_df,
         'yearly_ffill_mask': forward_filled_mask.reset_index(drop=True),
+        'yearly_change': tensor,
     }
 
-def generate_last_paid_period_tables(df, id_cols, pstng_col, parent_window, gen_options):
-    df2 = df.dropna(subset=[pstng_col, 'P/U']).copy()
-    df2[pstng_col] = pd.to_datetime(df2[pstng_col], errors='coerce')
-    df2['Year'] = df2[pstng_col].dt.year
-    years = sorted(df2['Year'].dropna().unique())
-    if not years:
-        messagebox.showwarning(
-            "Last-Paid Period Warning",
-            "No valid date data for Last-Paid-Period tables.",
-            parent=parent_window
-        )
-        return {}
-
-    dialog = YearlyComparisonDialog(parent_window, years)
-    if not dialog.result:
-        return {}
-    start_y, end_y = dialog.result['start'], dialog.result['end']
-
-    df_range = df2[(df2['Year'] >= start_y) & (df2['Year'] <= end_y)].copy()
-    if df_range.empty:
+def generate_last_paid_period_tables(df, id_cols, pstng_col, parent_window, gen_options, params=None, cube=None):
+    if cube is None:
+        cube = build_monthly_cube(df, id_cols, pstng_col, find_column(df, QTY_COLUMN_ALIASES, "quantity"))
+    if params is None:
+        params = ask_year_range(cube_years(cube), parent_window, "Last-Paid Period Warning",
+                                "No valid date data for Last-Paid-Period tables.")
+        if not params:
+            return {}
+    start_y, end_y = params['start'], params['end']
+
+    priced = cube[cube['last_priced_date'].notna()]
+    in_range = priced[(priced['Month'].dt.year >= start_y) & (priced['Month'].dt.year <= end_y)]
+    if in_range.empty:
         return {}
 
     price_id_cols = id_cols
@@ -425,49 +1122,143 @@ def generate_last_paid_period_tables(df, id_cols, pstng_col, parent_window, gen_
 
     # --- Yearly pivoted ---
     if gen_options.get('last_paid_year'):
-        dfy = df_range.sort_values(by=pstng_col, ascending=False)
-        subset_year = price_id_cols + ['Year']
-        dfy = dfy.drop_duplicates(subset=subset_year)
-        raw_year = dfy.set_index(price_id_cols + ['Year'])['P/U'] \
-                      .unstack(level='Year', fill_value=np.nan)
+        dfy = rollup_cube(in_range, price_id_cols, freq='Y', dropna_keys=False)
         all_years = list(range(start_y, end_y + 1))
-        for y in all_years:
-            if y not in raw_year.columns:
-                raw_year[y] = np.nan
-        raw_year = raw_year[all_years]
-        missing = raw_year.isna()
-        ffill  = raw_year.ffill(axis=1)
-        mask_filled = missing & ~ffill.isna()
-        df_year = ffill.reset_index()
-        df_year.columns = price_id_cols + [str(y) for y in all_years]
-        out['last_paid_yearly']       = df_year
-        out['last_paid_yearly_mask']  = mask_filled.reset_index(drop=True)
+        out['last_paid_yearly'] = sparse_from_long(dfy, price_id_cols, 'Year', 'last_priced_pu', all_years,
+                                                   'ffill', dropna_keys=False)
 
     # --- Monthly pivoted ---
     if gen_options.get('last_paid_month'):
-        dfm = df_range.sort_values(by=pstng_col, ascending=False)
-        dfm['YearMonth'] = dfm[pstng_col].dt.to_period('M').astype(str)
-        subset_month = price_id_cols + ['YearMonth']
-        dfm = dfm.drop_duplicates(subset=subset_month)
-        raw_month = dfm.set_index(price_id_cols + ['YearMonth'])['P/U'] \
-                       .unstack(level='YearMonth', fill_value=np.nan)
+        dfm = rollup_cube(in_range, price_id_cols, dropna_keys=False)
+        dfm['YearMonth'] = dfm['Month'].dt.to_period('M').astype(str)
         all_months = pd.period_range(
             start=f"{start_y}-01", end=f"{end_y}-12", freq='M'
         ).astype(str).tolist()
-        for m in all_months:
-            if m not in raw_month.columns:
-                raw_month[m] = np.nan
-        raw_month = raw_month[all_months]
-        missing_m = raw_month.isna()
-        ffill_m   = raw_month.ffill(axis=1)
-        mask_filled_m = missing_m & ~ffill_m.isna()
-        df_month = ffill_m.reset_index()
-        df_month.columns = price_id_cols + all_months
-        out['last_paid_monthly']      = df_month
-        out['last_paid_monthly_mask'] = mask_filled_m.reset_index(drop=True)
+        out['last_paid_monthly'] = sparse_from_long(dfm, price_id_cols, 'YearMonth', 'last_priced_pu', all_months,
+                                                    'ffill', dropna_keys=False)
 
     return out
 
+# shown instead of the vendor / currency of a CIP part that is not in the extract
+SWAT_NOT_FOUND = "Part number not found"
+
+def generate_swat_table(raw_df, pstng_col, qty_col, cip_path, swat_params, parts=None):
+    start_date = swat_params['start_date']
+    end_date = swat_params['end_date']
+
+    # --- Load CIP cost master with new columns ---
+    p = Path(cip_path)
+    if p.suffix.lower() == '.csv':
+        cip_df = pd.read_csv(cip_path, keep_default_na=False, dtype=str)
+    else:
+        cip_df = pd.read_excel(cip_path, keep_default_na=False, dtype=str)
+    cip_df.columns = [str(c).strip() for c in cip_df.columns]
+    
+    part_col    = find_column(cip_df, ["Part Number", "Material", "Part#"], "part number")
+    newcost_col = find_column(cip_df, ["New Cost", "Cost"], "new cost")
+    pv_col      = find_column(cip_df, ["PV", "Planning Value"], "PV")
+    desc_col    = find_column(cip_df, ["Description", "Desc"], "Description")
+    
+    required_cols = {'Part Number': part_col, 'New Cost': newcost_col}
+    if not all(required_cols.values()):
+        missing = [k for k,v in required_cols.items() if not v]
+        raise ValueError(f"CIP master: missing {', '.join(missing)} column(s)")
+
+    # Build the dataframe with all available columns
+    swat_base_cols = {part_col: "Part Number", newcost_col: "New Cost"}
+    final_cip_cols = ["Part Number", "New Cost"]
+    if pv_col:
+        swat_base_cols[pv_col] = "PV"
+        final_cip_cols.append("PV")
+    if desc_col:
+        swat_base_cols[desc_col] = "Description"
+        final_cip_cols.append("Description")
+    
+    cip_df = cip_df[list(swat_base_cols.keys())].copy()
+    cip_df.rename(columns=swat_base_cols, inplace=True)
+    
+    cip_df["New Cost"] = (cip_df["New Cost"].astype(str)
+                          .str.replace(r'[$,]','',regex=True))
+    cip_df["New Cost"] = pd.to_numeric(cip_df["New Cost"], errors='coerce')
+    if parts:
+        # targeted report: only list the CIP parts that were asked for
+        cip_df = cip_df[_key_strings(cip_df["Part Number"]).isin(parts)]
+
+    # --- Find Last Paid Price and Universal Data in separate steps ---
+    if "Tr./ev.type" not in raw_df.columns:
+        raise ValueError("SWAT requires 'Tr./ev.type' column")
+    
+    df2 = raw_df.copy()
+    df2[pstng_col] = pd.to_datetime(df2[pstng_col], errors='coerce')
+
+    # STEP 1: Get Last Paid Price from WITHIN the specified date range
+    df_period = df2[
+        (df2["Tr./ev.type"].astype(str).str.strip() == "2") &
+        (df2[pstng_col].notna()) &
+        (df2[pstng_col] >= start_date) &
+        (df2[pstng_col] <= end_date)
+    ].copy()
+    
+    df_period_sorted = df_period.sort_values(by=pstng_col, ascending=False)
+    last_paid_in_period = df_period_sorted.drop_duplicates(subset=["Part Number"])
+    last_paid_price_df = last_paid_in_period[["Part Number", "P/U"]].rename(columns={"P/U": "Last Paid Price"})
+
+    # NEW STEP 1b: Calculate total volume from WITHIN the specified date range
+    volume_df = df_period.groupby('Part Number')[qty_col].sum().reset_index()
+    volume_df.rename(columns={qty_col: 'Fiscal Month Volume'}, inplace=True)
+
+    # STEP 2: Get the most recent UNIVERSAL data from the ENTIRE dataset
+    df_all_time = df2[(df2["Tr./ev.type"].astype(str).str.strip() == "2") & (df2[pstng_col].notna())].copy()
+    df_all_time_sorted = df_all_time.sort_values(by=pstng_col, ascending=False)
+    latest_universal_data = df_all_time_sorted.drop_duplicates(subset=["Part Number"])
+    
+    universal_cols = ["Part Number", "Vendor", "Vendor Number", "Aggregated OUn", "Crcy"]
+    for col in universal_cols:
+        if col not in latest_universal_data.columns:
+            latest_universal_data[col] = 'N/A'
+    universal_df = latest_universal_data[universal_cols]
+
+    # STEP 3: Merge everything together
+    swat = pd.merge(cip_df[final_cip_cols], universal_df, on="Part Number", how="left")
+    swat = pd.merge(swat, last_paid_price_df, on="Part Number", how="left")
+    swat = pd.merge(swat, volume_df, on="Part Number", how="left") # Merge new volume data
+
+    # STEP 4: Perform all numeric calculations
+    swat["PPV"] = swat["Last Paid Price"] - swat["New Cost"]
+    swat["% Difference"] = (swat["PPV"] / swat["New Cost"]).replace([np.inf, -np.inf], np.nan)
+    # Note: Fiscal Month Volume NaN values are now preserved for formatting
+    swat['Extended PPV'] = swat['PPV'] * swat['Fiscal Month Volume'] # NEW: Calculate Extended PPV
+
+
+    # STEP 5: Replace NaNs with informative text labels
+    universal_cols_to_fill = ["Vendor", "Vendor Number", "Aggregated OUn", "Crcy"]
+    mask_not_found = swat['Vendor'].isnull()
+    for col in universal_cols_to_fill:
+        if col in swat.columns:
+            swat.loc[mask_not_found, col] = SWAT_NOT_FOUND
+
+    mask_no_transactions = swat['Last Paid Price'].isnull() & ~mask_not_found
+    swat.loc[mask_no_transactions, 'Last Paid Price'] = "No transactions"
+    
+    # NEW STEP 6: Re-order columns to the desired final layout
+    final_column_order = ['Part Number']
+    if 'Description' in swat.columns: final_column_order.append('Description')
+    if 'PV' in swat.columns: final_column_order.append('PV')
+    
+    final_column_order.extend(['Vendor', 'Vendor Number', 'Aggregated OUn', 'Crcy'])
+    final_column_order.extend(['Last Paid Price', 'New Cost', 'PPV', 'Fiscal Month Volume', 'Extended PPV', '% Difference'])
+    
+    # Filter list to only include columns that actually exist, preventing errors
+    final_column_order = [col for col in final_column_order if col in swat.columns]
+    swat = swat[final_column_order]
+    
+    # --- Set dynamic sheet name AND STORE THE DATA ---
+    sheet_name = "SWAT Cost analysis"
+    if swat_params['name']:
+        safe_name = swat_params['name'].replace('/','-').replace('\\','-')[:20] # Clean name
+        sheet_name = f"SWAT - {safe_name}"
+    return {sheet_name: swat}
+
 def write_formatted_excel_report(output_path, tables, gen_options):
     with pd.ExcelWriter(output_path, engine="xlsxwriter",
                         engine_kwargs={'options': {'nan_inf_to_errors': True}}) as writer:
@@ -489,13 +1280,16 @@ def write_formatted_excel_report(output_path, tables, gen_options):
         fmt_green_money  = wb.add_format({'num_format': '$#,##0.0000', 'font_color': 'green', 'bold': True, **align_left})
     
         # --- Write raw data and other sheets ---
-        tables['raw_data'].to_excel(writer, sheet_name='Data', index=False)
+        if 'raw_data' in tables:
+            tables['raw_data'].to_excel(writer, sheet_name='Data', index=False)
+        # month tables are sparse: only their key columns go through to_excel,
+        # the period cells are densified row by row in the formatting pass below
         if gen_options.get('summary') and 'summary' in tables:
-            tables['summary'].to_excel(writer, sheet_name='Summary', index=False)
+            tables['summary'].keys.to_excel(writer, sheet_name='Summary', index=False)
         if gen_options.get('mom') and 'mom' in tables:
-            tables['mom'].to_excel(writer, sheet_name='MoM Change', index=False)
+            tables['mom'].keys.to_excel(writer, sheet_name='MoM Change', index=False)
         if 'vol_monthly' in tables:
-            tables['vol_monthly'].to_excel(writer, sheet_name='Monthly Volume', index=False)
+            tables['vol_monthly'].keys.to_excel(writer, sheet_name='Monthly Volume', index=False)
         if gen_options.get('last_paid') and 'last_paid' in tables:
             tables['last_paid'].to_excel(writer, sheet_name='Last Paid Price', index=False)
         if 'yearly_prices' in tables:
@@ -505,9 +1299,9 @@ def write_formatted_excel_report(output_path, tables, gen_options):
         if 'yearly_comparison' in tables:
             tables['yearly_comparison'].to_excel(writer, sheet_name='Yearly Comparison', index=False)
         if 'last_paid_yearly' in tables:
-            tables['last_paid_yearly'].to_excel(writer, sheet_name='Last Paid Yearly', index=False)
+            tables['last_paid_yearly'].keys.to_excel(writer, sheet_name='Last Paid Yearly', index=False)
         if 'last_paid_monthly' in tables:
-            tables['last_paid_monthly'].to_excel(writer, sheet_name='Last Paid Monthly', index=False)
+            tables['last_paid_monthly'].keys.to_excel(writer, sheet_name='Last Paid Monthly', index=False)
 
         # SWAT (with dynamic sheet name)
         swat_sheet_name_to_write = None
@@ -536,66 +1330,79 @@ def write_formatted_excel_report(output_path, tables, gen_options):
                 'columns': [{'header': str(h)} for h in df.columns]
             }
             ws.add_table(0, 0, n_rows, n_cols-1, opts)
+
+        # helper to write a SparseMonthTable: dense rows are built one at a time
+        def _write_month_table(ws, table, table_name, write_cell, style='Table Style Medium 2', nan_shown_as=np.nan):
+            id_len = len(table.id_cols)
+            for j, header in enumerate(table.periods):
+                ws.write_string(0, id_len+j, header)
+            widths = np.array([len(p) for p in table.periods], dtype=np.int64)
+            for r, vals, carried in table.iter_dense_rows():
+                shown = np.where(np.isnan(vals), nan_shown_as, vals)
+                widths = np.maximum(widths, np.char.str_len(shown.astype(str)))
+                for j, (val, is_carried) in enumerate(zip(vals.tolist(), carried.tolist())):
+                    write_cell(ws, r+1, id_len+j, val, is_carried)
+            if table.empty:
+                return
+            for i, col in enumerate(table.id_cols):
+                max_len = table.keys[col].astype(str).str.len().max()
+                if pd.isna(max_len):
+                    max_len = 0
+                ws.set_column(i, i, max(len(str(col)), int(max_len)) + 2)
+            for j, width in enumerate(widths.tolist()):
+                ws.set_column(id_len+j, id_len+j, width + 2)
+            n_rows, n_cols = table.shape
+            ws.add_table(0, 0, n_rows, n_cols-1, {
+                'name': table_name,
+                'style': style,
+                'columns': [{'header': str(h)} for h in table.columns]
+            })
+
+        def _write_price_cell(ws, r, c, val, carried):
+            if np.isnan(val):
+                ws.write_string(r, c, 'NoData', fmt_light_text)
+            elif carried:
+                ws.write_number(r, c, val, fmt_light_ffill)
+            else:
+                ws.write_number(r, c, val, fmt_money)
+
+        def _write_pct_cell(ws, r, c, val, carried):
+            if np.isnan(val):
+                ws.write_string(r, c, 'NoData', fmt_light_text)
+            else:
+                fmt = fmt_red_pct if val>0 and abs(val)>=0.01 else fmt_green_pct if val<0 and abs(val)>=0.01 else fmt_light_percent
+                ws.write_number(r, c, val, fmt)
+
+        def _write_volume_cell(ws, r, c, val, carried):
+            ws.write_number(r, c, val, fmt_light_volume if val==0 else fmt_volume)
     
         # --- Format "Data" sheet ---
-        ws_data = writer.sheets['Data']
-        raw_df = tables['raw_data']
-        # apply date format
-        dt_cols = [c for c in raw_df.columns if pd.api.types.is_datetime64_any_dtype(raw_df[c])]
-        fmt_date = wb.add_format({'num_format': 'mm/dd/yyyy', **align_left})
-        for col in dt_cols:
-            idx = raw_df.columns.get_loc(col)
-            ws_data.set_column(idx, idx, 12, fmt_date)
-        _autofit_and_add_table(ws_data, raw_df, 'DataTbl')
-        if 'P/U' in raw_df.columns:
-            pu_idx = raw_df.columns.get_loc('P/U')
-            ws_data.set_column(pu_idx, pu_idx, None, fmt_money)
+        if 'Data' in writer.sheets:
+            ws_data = writer.sheets['Data']
+            raw_df = tables['raw_data']
+            # apply date format
+            dt_cols = [c for c in raw_df.columns if pd.api.types.is_datetime64_any_dtype(raw_df[c])]
+            fmt_date = wb.add_format({'num_format': 'mm/dd/yyyy', **align_left})
+            for col in dt_cols:
+                idx = raw_df.columns.get_loc(col)
+                ws_data.set_column(idx, idx, 12, fmt_date)
+            _autofit_and_add_table(ws_data, raw_df, 'DataTbl')
+            if 'P/U' in raw_df.columns:
+                pu_idx = raw_df.columns.get_loc('P/U')
+                ws_data.set_column(pu_idx, pu_idx, None, fmt_money)
     
         # --- Format Summary ---
         if gen_options.get('summary') and 'Summary' in writer.sheets:
-            ws = writer.sheets['Summary']
-            df = tables['summary']
-            mask = tables['summary_ffill_mask']
-            id_len = len(tables['price_id_cols'])
-            _autofit_and_add_table(ws, df, 'SummaryTbl')
-            for r in range(len(df)):
-                for c in range(id_len, df.shape[1]):
-                    val = df.iat[r, c]
-                    ffill = mask.iat[r, c-id_len]
-                    if pd.isna(val):
-                        ws.write_string(r+1, c, 'NoData', fmt_light_text)
-                    elif ffill:
-                        ws.write_number(r+1, c, val, fmt_light_ffill)
-                    else:
-                        ws.write_number(r+1, c, val, fmt_money)
+            _write_month_table(writer.sheets['Summary'], tables['summary'], 'SummaryTbl', _write_price_cell)
     
         # --- Format MoM Change ---
         if gen_options.get('mom') and 'MoM Change' in writer.sheets:
-            ws = writer.sheets['MoM Change']
-            df = tables['mom']
-            mask = tables['mom_empty_mask']
-            id_len = len(tables['price_id_cols'])
-            _autofit_and_add_table(ws, df, 'MoMTbl')
-            for r in range(len(df)):
-                for c in range(id_len, df.shape[1]):
-                    val = df.iat[r, c]
-                    if mask.iat[r, c-id_len]:
-                        ws.write_string(r+1, c, 'NoData', fmt_light_text)
-                    else:
-                        fmt = fmt_red_pct if val>0 and abs(val)>=0.01 else fmt_green_pct if val<0 and abs(val)>=0.01 else fmt_light_percent
-                        ws.write_number(r+1, c, val, fmt)
+            _write_month_table(writer.sheets['MoM Change'], tables['mom'], 'MoMTbl', _write_pct_cell, nan_shown_as=0.0)
     
         # --- Format Monthly Volume ---
         if 'Monthly Volume' in writer.sheets:
-            ws = writer.sheets['Monthly Volume']
-            df = tables['vol_monthly']
-            id_len = len(tables['volume_id_cols'])
-            _autofit_and_add_table(ws, df, 'MonthlyVolTbl', style='Table Style Medium 3')
-            for r in range(len(df)):
-                for c in range(id_len, df.shape[1]):
-                    val = df.iat[r, c]
-                    fmt = fmt_light_volume if pd.notna(val) and val==0 else fmt_volume
-                    ws.write_number(r+1, c, val, fmt)
+            _write_month_table(writer.sheets['Monthly Volume'], tables['vol_monthly'], 'MonthlyVolTbl',
+                               _write_volume_cell, style='Table Style Medium 3')
     
         # --- Format Yearly Avg Price ---
         if 'Yearly Avg Price' in writer.sheets:
@@ -667,35 +1474,13 @@ def write_formatted_excel_report(output_path, tables, gen_options):
     
         # --- Format Last Paid Yearly ---
         if 'Last Paid Yearly' in writer.sheets:
-            ws = writer.sheets['Last Paid Yearly']
-            df = tables['last_paid_yearly']; mask = tables['last_paid_yearly_mask']
-            id_len = len(tables['price_id_cols'])
-            _autofit_and_add_table(ws, df, 'LastPaidYearlyTbl')
-            for r in range(len(df)):
-                for c in range(id_len, df.shape[1]):
-                    val=df.iat[r,c]; cell=(r+1, c)
-                    if pd.isna(val):
-                        ws.write_string(*cell,'NoData',fmt_light_text)
-                    elif mask.iat[r,c-id_len]:
-                        ws.write_number(*cell,val,fmt_light_ffill)
-                    else:
-                        ws.write_number(*cell,val,fmt_money)
+            _write_month_table(writer.sheets['Last Paid Yearly'], tables['last_paid_yearly'],
+                               'LastPaidYearlyTbl', _write_price_cell)
     
         # --- Format Last Paid Monthly ---
         if 'Last Paid Monthly' in writer.sheets:
-            ws = writer.sheets['Last Paid Monthly']
-            df = tables['last_paid_monthly']; mask = tables['last_paid_monthly_mask']
-            id_len = len(tables['price_id_cols'])
-            _autofit_and_add_table(ws, df, 'LastPaidMonthlyTbl')
-            for r in range(len(df)):
-                for c in range(id_len, df.shape[1]):
-                    val=df.iat[r,c]; cell=(r+1,c)
-                    if pd.isna(val):
-                        ws.write_string(*cell,'NoData',fmt_light_text)
-                    elif mask.iat[r,c-id_len]:
-                        ws.write_number(*cell,val,fmt_light_ffill)
-                    else:
-                        ws.write_number(*cell,val,fmt_money)
+            _write_month_table(writer.sheets['Last Paid Monthly'], tables['last_paid_monthly'],
+                               'LastPaidMonthlyTbl', _write_price_cell)
     
         # --- Format SWAT Cost analysis (with dynamic sheet name and conditional coloring) ---
         swat_sheet_name = None
@@ -717,7 +1502,7 @@ def write_formatted_excel_report(output_path, tables, gen_options):
                 for col_name in ["Vendor", "Vendor Number", "Aggregated OUn", "Crcy"]:
                     if col_name in col_idx:
                         val = df.iat[r, col_idx[col_name]]
-                        if val == "Part number not found":
+                        if val == SWAT_NOT_FOUND:
                             ws.write_string(r + 1, col_idx[col_name], val, fmt_light_text)
 
                 # Format Last Paid Price & New Cost
@@ -773,180 +1558,560 @@ def write_formatted_excel_report(output_path, tables, gen_options):
                     else: # If value is NaN
                         ws.write_string(*cell, "NoData", fmt_light_text)
                     
-def process_file_in_background(file_path, gen_options, view_mode, parent_window, result_queue):
-    try:
-        raw_df, standard_id_cols, pstng_col, qty_col = read_and_prepare_data(file_path)
+# --- PARALLEL WORKBOOK WRITER ---
+# Each sheet is rendered by write_formatted_excel_report into its own one-sheet workbook
+# in a worker process, then the parts are stitched into one package: the cell formats
+# are merged into one styles.xml, the shared string tables are concatenated (string
+# cells are shifted by their part's offset) and tables get workbook-wide ids.
+# The Data part comes first, so the largest sheet is copied through unchanged.
+REPORT_SHEET_PARTS = [
+    (['raw_data'], None), (['summary'], 'summary'), (['mom'], 'mom'), (['vol_monthly'], None),
+    (['last_paid'], 'last_paid'), (['yearly_prices', 'yearly_ffill_mask'], None),
+    (['yearly_volumes'], None), (['yearly_comparison'], None),
+    (['last_paid_yearly'], None), (['last_paid_monthly'], None),
+]
+_XF_ID_ATTRS = re.compile(r' (numFmtId|fontId|fillId|borderId)="(\d+)"')
+_CELL_TAG    = re.compile(r'<c r="([A-Z]+\d+)"(?: s="(\d+)")?(?: t="(\w+)")?(/?>)(?:<v>(\d+)</v>)?')
+_XML_PARTS = {
+    'worksheet': 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml',
+    'table':     'application/vnd.openxmlformats-officedocument.spreadsheetml.table+xml',
+    'sst':       'application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml',
+}
+_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+def _sheet_parts(tables, gen_options):
+    shared = {k: v for k, v in tables.items() if not hasattr(v, 'columns')}
+    swat = [k for k in tables if str(k).startswith('SWAT')][:1]
+    parts = []
+    for keys, option in REPORT_SHEET_PARTS + [(swat, 'swat_cost')]:
+        if keys and keys[0] in tables and (option is None or gen_options.get(option)):
+            parts.append({**shared, **{k: tables[k] for k in keys if k in tables}})
+    return parts
+
+def _xml_items(xml, section, tag):
+    m = re.search(rf'<{section}\b[^>]*?(?:/>|>(.*?)</{section}>)', xml, re.S)
+    body = (m.group(1) or '') if m else ''
+    return re.findall(rf'<{tag}\b(?:[^>]*?/>|.*?</{tag}>)', body, re.S)
+
+def _replace_xml_section(xml, section, items, before=None):
+    m = re.search(rf'<{section}\b([^>]*?)(?:/>|>.*?</{section}>)', xml, re.S)
+    attrs = re.sub(r' count="\d+"', '', m.group(1).rstrip('/')) if m else ''
+    new = f'<{section} count="{len(items)}"{attrs}>' + ''.join(items) + f'</{section}>' if items else ''
+    if m:
+        return xml[:m.start()] + new + xml[m.end():]
+    at = xml.index(f'<{before}')
+    return xml[:at] + new + xml[at:]
+
+class _StyleMerger:
+    # cell formats are compared by content (number format code, font, fill, border, alignment)
+    def __init__(self):
+        self.num_fmts, self.fonts, self.fills, self.borders, self.xfs = [], [], [], [], []
+        self.xf_index = {}
+
+    @staticmethod
+    def _slot(items, item):
+        if item not in items:
+            items.append(item)
+        return items.index(item)
+
+    def add(self, styles_xml):
+        if not re.search(r'<dxfs count="0"/>', styles_xml):
+            raise ValueError("differential formats are not merged")
+        num_fmts = dict(re.findall(r'<numFmt numFmtId="(\d+)" formatCode="([^"]*)"/>', styles_xml))
+        fonts, fills = _xml_items(styles_xml, 'fonts', 'font'), _xml_items(styles_xml, 'fills', 'fill')
+        borders = _xml_items(styles_xml, 'borders', 'border')
+        mapping = []
+        for xf in _xml_items(styles_xml, 'cellXfs', 'xf'):
+            ids = dict(_XF_ID_ATTRS.findall(xf))
+            num = ids.get('numFmtId', '0')
+            key = (num_fmts.get(num, int(num)), fonts[int(ids.get('fontId', 0))],
+                   fills[int(ids.get('fillId', 0))], borders[int(ids.get('borderId', 0))],
+                   _XF_ID_ATTRS.sub('', xf))
+            if key not in self.xf_index:
+                self.xf_index[key] = len(self.xfs)
+                self.xfs.append(key)
+            mapping.append(self.xf_index[key])
+        return mapping
+
+    def styles_xml(self, base_xml):
+        xfs = []
+        for num, font, fill, border, rest in self.xfs:
+            num_id = num if isinstance(num, int) else 164 + self._slot(self.num_fmts, num)
+            xfs.append(f'<xf numFmtId="{num_id}" fontId="{self._slot(self.fonts, font)}" '
+                       f'fillId="{self._slot(self.fills, fill)}" borderId="{self._slot(self.borders, border)}"'
+                       + rest[len('<xf'):])
+        xml = _replace_xml_section(base_xml, 'cellXfs', xfs)
+        xml = _replace_xml_section(xml, 'fonts', self.fonts)
+        xml = _replace_xml_section(xml, 'fills', self.fills)
+        xml = _replace_xml_section(xml, 'borders', self.borders)
+        return _replace_xml_section(
+            xml, 'numFmts',
+            [f'<numFmt numFmtId="{164 + i}" formatCode="{code}"/>' for i, code in enumerate(self.num_fmts)],
+            before='fonts'
+        )
+
+def _part_sheets(zf):
+    # [(sheet element from workbook.xml, path of the sheet xml)] in tab order
+    rels = dict(re.findall(r'<Relationship Id="(\w+)" Type="[^"]*/worksheet" Target="([^"]+)"/>',
+                           zf.read('xl/_rels/workbook.xml.rels').decode('utf-8')))
+    sheets = re.findall(r'(<sheet [^>]*?r:id="(\w+)"/>)', zf.read('xl/workbook.xml').decode('utf-8'))
+    return [(element, 'xl/' + rels[rid]) for element, rid in sheets]
+
+def _rewrite_part(args):
+    # worker: shift style and shared-string indices of one part's sheets into the merged book
+    part_path, style_map, sst_offset, keep_selected, out_dir = args
+    identity = sst_offset == 0 and style_map == list(range(len(style_map)))
+    out = []
+    with zipfile.ZipFile(part_path) as zf:
+        names = set(zf.namelist())
+        for j, (element, sheet_path) in enumerate(_part_sheets(zf)):
+            xml = zf.read(sheet_path).decode('utf-8')
+            if not identity:
+                def cell(m):
+                    ref, style, kind, close, value = m.groups()
+                    tag = f'<c r="{ref}"'
+                    if style is not None:
+                        tag += f' s="{style_map[int(style)]}"'
+                    if kind is not None:
+                        tag += f' t="{kind}"'
+                    tag += close
+                    if value is not None:
+                        tag += f'<v>{int(value) + sst_offset if kind == "s" else value}</v>'
+                    return tag
+                xml = _CELL_TAG.sub(cell, xml)
+                xml = re.sub(r'(<(?:col|row) [^>]*?\b(?:style|s)=")(\d+)"',
+                             lambda m: f'{m.group(1)}{style_map[int(m.group(2))]}"', xml)
+            if not (keep_selected and j == 0):
+                xml = xml.replace(' tabSelected="1"', '')
+            sheet_file = Path(out_dir) / f"{Path(part_path).stem}_{j}.xml"
+            sheet_file.write_text(xml, encoding='utf-8')
+            tables = []
+            rels_path = sheet_path.replace('worksheets/', 'worksheets/_rels/') + '.rels'
+            if rels_path in names:
+                rels = zf.read(rels_path).decode('utf-8')
+                targets = re.findall(r'<Relationship Id="\w+" Type="([^"]+)" Target="([^"]+)"/>', rels)
+                if any(not kind.endswith('/table') for kind, _ in targets):
+                    raise ValueError(f"{sheet_path} links parts other than tables")
+                tables = [zf.read('xl/tables/' + Path(target).name).decode('utf-8') for _, target in targets]
+            out.append((element, str(sheet_file), tables))
+    return out
+
+def _write_zip_text(zout, name, text):
+    zout.writestr(name, text.encode('utf-8'))
+
+def write_report_parallel(output_path, tables, gen_options, max_workers=None):
+    parts = _sheet_parts(tables, gen_options)
+    if len(parts) < 2:
+        return write_formatted_excel_report(output_path, tables, gen_options)
+    workers = min(len(parts), max_workers or os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory(prefix='phr_parts_') as tmp, \
+         ProcessPoolExecutor(max_workers=workers) as pool:
+        part_paths = [str(Path(tmp) / f"part{i:02d}.xlsx") for i in range(len(parts))]
+        list(pool.map(_write_partition, [(path, part, gen_options) for path, part in zip(part_paths, parts)]))
+
+        # styles and shared strings are small: merge them here, rewrite the sheets in the workers
+        merger, jobs, sst_bodies, sst_count, sst_unique = _StyleMerger(), [], [], 0, 0
+        for i, path in enumerate(part_paths):
+            with zipfile.ZipFile(path) as zf:
+                style_map = merger.add(zf.read('xl/styles.xml').decode('utf-8'))
+                if 'xl/sharedStrings.xml' in zf.namelist():
+                    sst = zf.read('xl/sharedStrings.xml').decode('utf-8')
+                    head = re.search(r'<sst [^>]*?count="(\d+)" uniqueCount="(\d+)"(/?)>', sst)
+                    jobs.append((path, style_map, sst_unique, i == 0, tmp))
+                    if not head.group(3):
+                        sst_bodies.append(sst[head.end():sst.rindex('</sst>')])
+                    sst_count += int(head.group(1))
+                    sst_unique += int(head.group(2))
+                else:
+                    jobs.append((path, style_map, sst_unique, i == 0, tmp))
+        sheets = [sheet for part in pool.map(_rewrite_part, jobs) for sheet in part]
+
+        with zipfile.ZipFile(part_paths[0]) as first, \
+             zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+            base = {name: first.read(name).decode('utf-8') for name in
+                    ['[Content_Types].xml', '_rels/.rels', 'docProps/app.xml', 'docProps/core.xml',
+                     'xl/workbook.xml', 'xl/styles.xml', 'xl/theme/theme1.xml']}
+            overrides = re.findall(r'<Override PartName="/(?:docProps|xl/styles|xl/theme|xl/workbook)[^>]*/>',
+                                   base['[Content_Types].xml'])
+            sheet_elements, wb_rels, n_tables = [], [], 0
+            for n, (element, sheet_file, sheet_tables) in enumerate(sheets, start=1):
+                element = re.sub(r'sheetId="\d+"', f'sheetId="{n}"', element)
+                sheet_elements.append(re.sub(r'r:id="\w+"', f'r:id="rId{n}"', element))
+                wb_rels.append(f'<Relationship Id="rId{n}" Type="{_REL_TYPE}/worksheet" '
+                               f'Target="worksheets/sheet{n}.xml"/>')
+                overrides.append(f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                                 f'ContentType="{_XML_PARTS["worksheet"]}"/>')
+                zout.write(sheet_file, f'xl/worksheets/sheet{n}.xml')
+                if sheet_tables:
+                    links = []
+                    for k, table_xml in enumerate(sheet_tables, start=1):
+                        n_tables += 1
+                        table_xml = re.sub(r'(<table [^>]*?\bid=")\d+"', rf'\g<1>{n_tables}"', table_xml, count=1)
+                        _write_zip_text(zout, f'xl/tables/table{n_tables}.xml', table_xml)
+                        links.append(f'<Relationship Id="rId{k}" Type="{_REL_TYPE}/table" '
+                                     f'Target="../tables/table{n_tables}.xml"/>')
+                        overrides.append(f'<Override PartName="/xl/tables/table{n_tables}.xml" '
+                                         f'ContentType="{_XML_PARTS["table"]}"/>')
+                    _write_zip_text(zout, f'xl/worksheets/_rels/sheet{n}.xml.rels',
+                                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                                    + ''.join(links) + '</Relationships>')
+            n_sheets = len(sheets)
+            wb_rels.append(f'<Relationship Id="rId{n_sheets + 1}" Type="{_REL_TYPE}/theme" Target="theme/theme1.xml"/>')
+            wb_rels.append(f'<Relationship Id="rId{n_sheets + 2}" Type="{_REL_TYPE}/styles" Target="styles.xml"/>')
+            if sst_unique:
+                wb_rels.append(f'<Relationship Id="rId{n_sheets + 3}" Type="{_REL_TYPE}/sharedStrings" '
+                               f'Target="sharedStrings.xml"/>')
+                overrides.append(f'<Override PartName="/xl/sharedStrings.xml" ContentType="{_XML_PARTS["sst"]}"/>')
+                _write_zip_text(zout, 'xl/sharedStrings.xml',
+                                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                                f'count="{sst_count}" uniqueCount="{sst_unique}">' + ''.join(sst_bodies) + '</sst>')
+
+            content_types = base['[Content_Types].xml']
+            _write_zip_text(zout, '[Content_Types].xml',
+                            content_types[:content_types.index('<Override')] + ''.join(overrides) + '</Types>')
+            _write_zip_text(zout, '_rels/.rels', base['_rels/.rels'])
+            titles = ''.join(re.findall(r'name="([^"]*)"', e)[0].join(['<vt:lpstr>', '</vt:lpstr>'])
+                             for e in sheet_elements)
+            app = re.sub(r'<vt:i4>\d+</vt:i4>', f'<vt:i4>{n_sheets}</vt:i4>', base['docProps/app.xml'], count=1)
+            app = re.sub(r'<TitlesOfParts>.*?</TitlesOfParts>',
+                         f'<TitlesOfParts><vt:vector size="{n_sheets}" baseType="lpstr">{titles}</vt:vector></TitlesOfParts>',
+                         app, flags=re.S)
+            _write_zip_text(zout, 'docProps/app.xml', app)
+            _write_zip_text(zout, 'docProps/core.xml', base['docProps/core.xml'])
+            _write_zip_text(zout, 'xl/workbook.xml',
+                            re.sub(r'<sheets>.*?</sheets>', lambda m: '<sheets>' + ''.join(sheet_elements) + '</sheets>',
+                                   base['xl/workbook.xml'], flags=re.S))
+            _write_zip_text(zout, 'xl/_rels/workbook.xml.rels',
+                            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                            + ''.join(wb_rels) + '</Relationships>')
+            _write_zip_text(zout, 'xl/styles.xml', merger.styles_xml(base['xl/styles.xml']))
+            _write_zip_text(zout, 'xl/theme/theme1.xml', base['xl/theme/theme1.xml'])
+    return output_path
+
+# --- SPLIT OUTPUT: one workbook per vendor / plant / ... ---
+# masks that are row-aligned with another table and must be split the same way
+ROW_ALIGNED_MASKS = {'yearly_ffill_mask': 'yearly_prices'}
+# partition of the SWAT rows whose part is not in the extract, so they have no vendor / plant to go to
+UNASSIGNED = None
+
+def _partition_rows(keys, split_col):
+    values = keys[split_col].astype(str).str.strip()
+    parts = {value: np.asarray(idx) for value, idx in values.groupby(values, sort=True).indices.items()}
+    if SWAT_NOT_FOUND in parts:
+        parts[UNASSIGNED] = parts.pop(SWAT_NOT_FOUND)
+    return parts
+
+def partition_tables(tables, split_col):
+    # Splits every computed table by the value of split_col. Tables without that
+    # column are left out of the partitions rather than leaking other buyers' rows.
+    parts = {}
+    for name, table in tables.items():
+        if name in ROW_ALIGNED_MASKS or not hasattr(table, 'columns'):
+            continue
+        keys = table.keys if isinstance(table, (SparseMonthTable, YearlyChangeTensor)) else table
+        if split_col not in keys.columns:
+            logging.warning(f"Table '{name}' has no '{split_col}' column; left out of split workbooks")
+            continue
+        for value, rows in _partition_rows(keys, split_col).items():
+            part = parts.setdefault(value, {})
+            if isinstance(table, (SparseMonthTable, YearlyChangeTensor)):
+                part[name] = table.take(rows)
+            else:
+                part[name] = table.iloc[rows].reset_index(drop=True)
+            for mask_name, owner in ROW_ALIGNED_MASKS.items():
+                if owner == name and mask_name in tables:
+                    part[mask_name] = tables[mask_name].iloc[rows].reset_index(drop=True)
+    shared = {name: value for name, value in tables.items() if not hasattr(value, 'columns')}
+    for part in parts.values():
+        part.update(shared)
+    return parts
+
+def _safe_file_stem(value):
+    stem = re.sub(r'[^\w.-]+', '_', str(value)).strip('._')
+    return stem[:60] or 'blank'
+
+def _write_partition(args):
+    out_path, tables, gen_options = args
+    write_formatted_excel_report(out_path, tables, gen_options)
+    return out_path
+
+def write_split_reports(out_dir, stem, tables, gen_options, split_col, max_workers=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs, used = [], set()
+    # real values first so a vendor that happens to be called "unassigned" keeps its name
+    parts = sorted(partition_tables(tables, split_col).items(), key=lambda item: item[0] is UNASSIGNED)
+    for value, part in parts:
+        name = 'unassigned' if value is UNASSIGNED else _safe_file_stem(value)
+        while name.lower() in used:
+            name += '_'
+        used.add(name.lower())
+        jobs.append((out_dir / f"{stem}_{name}.xlsx", part, gen_options))
+    if not jobs:
+        raise ValueError(f"No rows to split by '{split_col}'.")
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if workers == 1:
+        return [_write_partition(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_write_partition, jobs))
+
+# --- REPORT GRAPH ---
+# The report is a DAG of table nodes. Only the nodes the selected sheets need are
+# evaluated; independent nodes run concurrently and every node is timed.
+# Interactive nodes (dialogs) always run one at a time on the calling thread.
+class ReportGraph:
+    def __init__(self):
+        self.nodes = {}
+        self.results = {}
+        self.timings = {}
+
+    def add(self, name, func, deps=(), interactive=False):
+        self.nodes[name] = (func, tuple(deps), interactive)
+
+    def _needed(self, targets):
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.nodes[name][1])
+        return needed
+
+    def _run(self, name):
+        func, deps, _ = self.nodes[name]
+        start = datetime.now()
+        result = func(*[self.results[d] for d in deps])
+        return result, (datetime.now() - start).total_seconds()
+
+    def evaluate(self, targets, max_workers=None):
+        pending = {n for n in self._needed(targets) if n not in self.results}
+        with ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1)) as pool:
+            running = {}
+            while pending or running:
+                ready = [n for n in sorted(pending) if all(d in self.results for d in self.nodes[n][1])]
+                for name in ready:
+                    if not self.nodes[name][2]:
+                        pending.discard(name)
+                        running[pool.submit(self._run, name)] = name
+                interactive = [n for n in ready if self.nodes[n][2]]
+                if interactive:
+                    name = interactive[0]
+                    pending.discard(name)
+                    self.results[name], self.timings[name] = self._run(name)
+                    continue
+                if not running:
+                    raise RuntimeError(f"Report graph cannot make progress on: {sorted(pending)}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self.results[name], self.timings[name] = future.result()
+        return {name: self.results[name] for name in targets}
+
+def format_timings(timings, limit=6):
+    slowest = sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return ", ".join(f"{name} {secs:.1f}s" for name, secs in slowest)
+
+def compute_report_tables(file_path, gen_options, view_mode, parent_window):
+    # Returns (tables, out_path, split_col); nothing is written yet
+    cache = TableCache(enabled=gen_options.get('use_cache', True))
+    filters = normalise_filters(gen_options.get('filters'))
+    input_fp = file_fingerprint(file_path)
+    if filters:
+        input_fp = (input_fp, filters_cache_key(filters))
+    split_col = gen_options.get('split_by') or None
+    preset = gen_options.get('params') or {}  # answers for the dialogs, e.g. from a watch profile
+    graph = ReportGraph()
+
+    def prepared():
+        return cache.get_or_compute('prepared', (input_fp,), lambda: read_and_prepare_data(file_path, filters))
+
+    def id_columns(prep):
+        raw_df, standard_id_cols, _, _ = prep
         simple_id_cols = ['Part Number', 'Vendor', 'Vendor Number', 'Aggregated OUn', 'Crcy']
         id_cols = (simple_id_cols if view_mode=='simple' else standard_id_cols)
         id_cols = [c for c in id_cols if c in raw_df.columns and c!='N/A']
-
-        # 1) Prepare raw_data sheet
+        if split_col:
+            if split_col not in raw_df.columns:
+                raise ValueError(f"Split column '{split_col}' not found in the file.")
+            if split_col not in id_cols:
+                # tables must carry the split key to be partitioned
+                id_cols = id_cols + [split_col]
+        return id_cols
+
+    def table_key(id_cols):
+        return (input_fp, view_mode, tuple(id_cols))
+
+    def raw_data(prep):
+        raw_df, _, pstng_col, _ = prep
         raw_df_out = raw_df.copy()
         audit_col = f"{pstng_col} (dt)"
         raw_df_out[audit_col] = raw_df[pstng_col]
         if pd.api.types.is_datetime64_any_dtype(raw_df_out[pstng_col]):
             raw_df_out[pstng_col] = raw_df_out[pstng_col].dt.strftime("%m/%d/%Y").fillna("Invalid Date")
+        return raw_df_out
+
+    def monthly_cube(prep, id_cols):
+        # detailed granularity; the simple view rolls it up
+        raw_df, standard_id_cols, pstng_col, qty_col = prep
+        cube_id_cols = standard_id_cols + [c for c in id_cols if c not in standard_id_cols]
+        # kept in the table cache, never next to the input: a shared drop folder is no place to unpickle from
+        return cache.get_or_compute(
+            'cube', (input_fp, tuple(cube_id_cols)),
+            lambda: build_monthly_cube(raw_df, cube_id_cols, pstng_col, qty_col,
+                                       workers=gen_options.get('cube_workers'))
+        )
 
-        # 2) analysis tables
-        analysis_tables = generate_analysis_tables(raw_df, id_cols, pstng_col, qty_col)
-
-        # 3) yearly comparison
-        yearly_tables = {}
-        if gen_options.get('yearly_comp'):
-            yearly_tables = generate_yearly_comparison_tables(
-                raw_df, id_cols, pstng_col, qty_col, parent_window
+    def volume_id_cols(id_cols):
+        return [c for c in id_cols if c != 'Crcy']
+
+    def cached_table(name, build):
+        return lambda cube, id_cols: cache.get_or_compute(name, table_key(id_cols), lambda: build(cube, id_cols))
+
+    def yearly_params(cube):
+        if 'yearly' in preset:
+            return resolve_year_range(preset['yearly'], cube_years(cube))
+        return ask_year_range(cube_years(cube), parent_window, "Comparison Warning",
+                              "No valid date data for yearly comparison.")
+
+    def yearly(prep, cube, id_cols, params):
+        if not params:
+            return {}
+        raw_df, _, pstng_col, qty_col = prep
+        return cache.get_or_compute(
+            'yearly', table_key(id_cols) + (params['start'], params['end'], params['target']),
+            lambda: generate_yearly_comparison_tables(
+                raw_df, id_cols, pstng_col, qty_col, parent_window, params=params, cube=cube
             )
+        )
 
-        # 4) last-paid period tables
-        period_tables = {}
-        if gen_options.get('last_paid_year') or gen_options.get('last_paid_month'):
-            period_tables = generate_last_paid_period_tables(
-                raw_df, id_cols, pstng_col, parent_window, gen_options
+    def period_params(cube):
+        if 'last_paid_period' in preset:
+            return resolve_year_range(preset['last_paid_period'], cube_years(cube))
+        return ask_year_range(cube_years(cube), parent_window, "Last-Paid Period Warning",
+                              "No valid date data for Last-Paid-Period tables.")
+
+    def last_paid_period(prep, cube, id_cols, params):
+        if not params:
+            return {}
+        raw_df, _, pstng_col, _ = prep
+        return cache.get_or_compute(
+            'last_paid_period',
+            table_key(id_cols) + (params['start'], params['end'],
+                                  bool(gen_options.get('last_paid_year')), bool(gen_options.get('last_paid_month'))),
+            lambda: generate_last_paid_period_tables(
+                raw_df, id_cols, pstng_col, parent_window, gen_options, params=params, cube=cube
             )
+        )
 
-        # 5) SWAT Cost analysis
-        swat_tbl = {}
-        if gen_options.get('swat_cost'):
-            # --- Get user input for date range ---
-            dialog = FiscalMonthDialog(parent_window)
-            if not dialog.result:
-                # User cancelled, so we skip the rest of SWAT analysis
-                gen_options['swat_cost'] = False # Prevents writing an empty sheet
-            else:
-                swat_params = dialog.result
-                start_date = swat_params['start_date']
-                end_date = swat_params['end_date']
-
-                # --- Load CIP cost master with new columns ---
-                cip_path = gen_options['cip_file']
-                p = Path(cip_path)
-                if p.suffix.lower() == '.csv':
-                    cip_df = pd.read_csv(cip_path, keep_default_na=False, dtype=str)
-                else:
-                    cip_df = pd.read_excel(cip_path, keep_default_na=False, dtype=str)
-                cip_df.columns = [str(c).strip() for c in cip_df.columns]
-                
-                part_col    = find_column(cip_df, ["Part Number", "Material", "Part#"], "part number")
-                newcost_col = find_column(cip_df, ["New Cost", "Cost"], "new cost")
-                pv_col      = find_column(cip_df, ["PV", "Planning Value"], "PV")
-                desc_col    = find_column(cip_df, ["Description", "Desc"], "Description")
-                
-                required_cols = {'Part Number': part_col, 'New Cost': newcost_col}
-                if not all(required_cols.values()):
-                    missing = [k for k,v in required_cols.items() if not v]
-                    raise ValueError(f"CIP master: missing {', '.join(missing)} column(s)")
-
-                # Build the dataframe with all available columns
-                swat_base_cols = {part_col: "Part Number", newcost_col: "New Cost"}
-                final_cip_cols = ["Part Number", "New Cost"]
-                if pv_col:
-                    swat_base_cols[pv_col] = "PV"
-                    final_cip_cols.append("PV")
-                if desc_col:
-                    swat_base_cols[desc_col] = "Description"
-                    final_cip_cols.append("Description")
-                
-                cip_df = cip_df[list(swat_base_cols.keys())].copy()
-                cip_df.rename(columns=swat_base_cols, inplace=True)
-                
-                cip_df["New Cost"] = (cip_df["New Cost"].astype(str)
-                                      .str.replace(r'[$,]','',regex=True))
-                cip_df["New Cost"] = pd.to_numeric(cip_df["New Cost"], errors='coerce')
+    def swat_params():
+        if 'swat' in preset:
+            return preset['swat']
+        return FiscalMonthDialog(parent_window).result
+
+    def swat(prep, params):
+        # needs day-level dates, so it still reads the transactions
+        if not params:
+            gen_options['swat_cost'] = False # Prevents writing an empty sheet
+            return {}
+        raw_df, _, pstng_col, qty_col = prep
+        cip_path = gen_options['cip_file']
+        cip_fp = file_fingerprint(cip_path) if cache.enabled else None
+        return cache.get_or_compute(
+            'swat',
+            (input_fp, cip_fp, params['start_date'], params['end_date'], params['name']),
+            lambda: generate_swat_table(raw_df, pstng_col, qty_col, cip_path, params,
+                                        parts=filters.get('parts'))
+        )
 
-                # --- Find Last Paid Price and Universal Data in separate steps ---
-                if "Tr./ev.type" not in raw_df.columns:
-                    raise ValueError("SWAT requires 'Tr./ev.type' column")
-                
-                df2 = raw_df.copy()
-                df2[pstng_col] = pd.to_datetime(df2[pstng_col], errors='coerce')
-
-                # STEP 1: Get Last Paid Price from WITHIN the specified date range
-                df_period = df2[
-                    (df2["Tr./ev.type"].astype(str).str.strip() == "2") &
-                    (df2[pstng_col].notna()) &
-                    (df2[pstng_col] >= start_date) &
-                    (df2[pstng_col] <= end_date)
-                ].copy()
-                
-                df_period_sorted = df_period.sort_values(by=pstng_col, ascending=False)
-                last_paid_in_period = df_period_sorted.drop_duplicates(subset=["Part Number"])
-                last_paid_price_df = last_paid_in_period[["Part Number", "P/U"]].rename(columns={"P/U": "Last Paid Price"})
-
-                # NEW STEP 1b: Calculate total volume from WITHIN the specified date range
-                volume_df = df_period.groupby('Part Number')[qty_col].sum().reset_index()
-                volume_df.rename(columns={qty_col: 'Fiscal Month Volume'}, inplace=True)
-
-                # STEP 2: Get the most recent UNIVERSAL data from the ENTIRE dataset
-                df_all_time = df2[(df2["Tr./ev.type"].astype(str).str.strip() == "2") & (df2[pstng_col].notna())].copy()
-                df_all_time_sorted = df_all_time.sort_values(by=pstng_col, ascending=False)
-                latest_universal_data = df_all_time_sorted.drop_duplicates(subset=["Part Number"])
-                
-                universal_cols = ["Part Number", "Vendor", "Vendor Number", "Aggregated OUn", "Crcy"]
-                for col in universal_cols:
-                    if col not in latest_universal_data.columns:
-                        latest_universal_data[col] = 'N/A'
-                universal_df = latest_universal_data[universal_cols]
-
-                # STEP 3: Merge everything together
-                swat = pd.merge(cip_df[final_cip_cols], universal_df, on="Part Number", how="left")
-                swat = pd.merge(swat, last_paid_price_df, on="Part Number", how="left")
-                swat = pd.merge(swat, volume_df, on="Part Number", how="left") # Merge new volume data
-
-                # STEP 4: Perform all numeric calculations
-                swat["PPV"] = swat["Last Paid Price"] - swat["New Cost"]
-                swat["% Difference"] = (swat["PPV"] / swat["New Cost"]).replace([np.inf, -np.inf], np.nan)
-                # Note: Fiscal Month Volume NaN values are now preserved for formatting
-                swat['Extended PPV'] = swat['PPV'] * swat['Fiscal Month Volume'] # NEW: Calculate Extended PPV
-
-
-                # STEP 5: Replace NaNs with informative text labels
-                universal_cols_to_fill = ["Vendor", "Vendor Number", "Aggregated OUn", "Crcy"]
-                mask_not_found = swat['Vendor'].isnull()
-                for col in universal_cols_to_fill:
-                    if col in swat.columns:
-                        swat.loc[mask_not_found, col] = "Part number not found"
-
-                mask_no_transactions = swat['Last Paid Price'].isnull() & ~mask_not_found
-                swat.loc[mask_no_transactions, 'Last Paid Price'] = "No transactions"
-                
-                # NEW STEP 6: Re-order columns to the desired final layout
-                final_column_order = ['Part Number']
-                if 'Description' in swat.columns: final_column_order.append('Description')
-                if 'PV' in swat.columns: final_column_order.append('PV')
-                
-                final_column_order.extend(['Vendor', 'Vendor Number', 'Aggregated OUn', 'Crcy'])
-                final_column_order.extend(['Last Paid Price', 'New Cost', 'PPV', 'Fiscal Month Volume', 'Extended PPV', '% Difference'])
-                
-                # Filter list to only include columns that actually exist, preventing errors
-                final_column_order = [col for col in final_column_order if col in swat.columns]
-                swat = swat[final_column_order]
-                
-               # --- Set dynamic sheet name AND STORE THE DATA ---
-                sheet_name = "SWAT Cost analysis"
-                if swat_params['name']:
-                    safe_name = swat_params['name'].replace('/','-').replace('\\','-')[:20] # Clean name
-                    sheet_name = f"SWAT - {safe_name}"
-                swat_tbl[sheet_name] = swat
-
-        # combine all
-        all_tables = {
-            'raw_data': raw_df_out,
-            **analysis_tables,
-            **yearly_tables,
-            **period_tables,
-            **swat_tbl
-        }
+    graph.add('prepared', prepared)
+    graph.add('price_id_cols', id_columns, ['prepared'])
+    graph.add('volume_id_cols', volume_id_cols, ['price_id_cols'])
+    graph.add('raw_data', raw_data, ['prepared'])
+    graph.add('cube', monthly_cube, ['prepared', 'price_id_cols'])
+    graph.add('summary', cached_table('summary', build_summary_table), ['cube', 'price_id_cols'])
+    graph.add('mom', sparse_pct_change, ['summary'])
+    graph.add('vol_monthly', cached_table('vol_monthly', build_volume_table), ['cube', 'volume_id_cols'])
+    graph.add('last_paid', cached_table('last_paid', build_last_paid_table), ['cube', 'price_id_cols'])
+    graph.add('yearly_params', yearly_params, ['cube'], interactive=True)
+    graph.add('yearly', yearly, ['prepared', 'cube', 'price_id_cols', 'yearly_params'])
+    graph.add('period_params', period_params, ['cube'], interactive=True)
+    graph.add('last_paid_period', last_paid_period, ['prepared', 'cube', 'price_id_cols', 'period_params'])
+    graph.add('swat_params', swat_params, interactive=True)
+    graph.add('swat', swat, ['prepared', 'swat_params'])
+
+    # sheets -> graph nodes they need
+    targets = ['price_id_cols', 'volume_id_cols']
+    if gen_options.get('raw_data', True):
+        targets.append('raw_data')
+    if gen_options.get('summary'):
+        targets += ['summary', 'vol_monthly']
+    if gen_options.get('mom'):
+        targets.append('mom')
+    if gen_options.get('last_paid'):
+        targets.append('last_paid')
+    if gen_options.get('yearly_comp'):
+        targets.append('yearly')
+    if gen_options.get('last_paid_year') or gen_options.get('last_paid_month'):
+        targets.append('last_paid_period')
+    if gen_options.get('swat_cost'):
+        targets.append('swat')
+
+    results = graph.evaluate(targets)
+    all_tables = {}
+    for name in targets:
+        if name in ('yearly', 'last_paid_period', 'swat'):
+            all_tables.update(results[name])
+        else:
+            all_tables[name] = results[name]
+    all_tables['node_timings'] = dict(graph.timings)
+    logging.info(f"Report node timings: {format_timings(graph.timings, limit=len(graph.timings))}")
+
+    return all_tables, report_output_path(file_path, view_mode, filters, split_col), split_col
+
+def report_output_path(file_path, view_mode, filters=None, split_col=None):
+    p = Path(file_path)
+    suffix = "_filtered" if filters else ""
+    if split_col:
+        return p.parent / f"{p.stem}_processed_{view_mode}{suffix}_by_{_safe_file_stem(split_col)}"
+    return p.parent / f"{p.stem}_processed_{view_mode}{suffix}.xlsx"
+
+def write_report_output(out_path, tables, gen_options, split_col=None):
+    if split_col:
+        write_split_reports(out_path, Path(out_path).name.rsplit('_processed_', 1)[0], tables, gen_options, split_col)
+    elif (gen_options.get('write_workers') or 0) > 1:
+        try:
+            write_report_parallel(out_path, tables, gen_options, gen_options['write_workers'])
+        except Exception:
+            logging.warning(f"Parallel write failed, writing sheet by sheet: {traceback.format_exc()}")
+            write_formatted_excel_report(out_path, tables, gen_options)
+    else:
+        write_formatted_excel_report(out_path, tables, gen_options)
+    return out_path
 
-        # 6) write output
-        p = Path(file_path)
-        out_path = p.parent / f"{p.stem}_processed_{view_mode}.xlsx"
-        write_formatted_excel_report(out_path, all_tables, gen_options)
+def process_file_in_background(file_path, gen_options, view_mode, parent_window, result_queue):
+    try:
+        tables, out_path, split_col = compute_report_tables(file_path, gen_options, view_mode, parent_window)
+        if gen_options.get('preview'):
+            # the preview window exports on demand
+            result_queue.put(('preview', (tables, out_path, split_col, gen_options)))
+            return
+        write_report_output(out_path, tables, gen_options, split_col)
+        result_queue.put(('success', out_path, tables.get('node_timings')))
+    except Exception:
+        logging.error("process_file failed: %s", traceback.format_exc())
+        result_queue.put(('error', str(traceback.format_exc())))
 
+def export_tables_in_background(out_path, tables, gen_options, split_col, result_queue):
+    try:
+        write_report_output(out_path, tables, gen_options, split_col)
         result_queue.put(('success', out_path))
     except Exception:
-        logging.error("process_file failed: %s", traceback.format_exc())
+        logging.error("export failed: %s", traceback.format_exc())
         result_queue.put(('error', str(traceback.format_exc())))
-        
+
 class ExcelProcessorApp:
     def __init__(self, root):
         self.root = root
@@ -978,6 +2143,9 @@ class ExcelProcessorApp:
         self.gen_last_paid_year_var = tk.BooleanVar(value=False)
         self.gen_last_paid_month_var= tk.BooleanVar(value=False)
         self.gen_swat_var           = tk.BooleanVar(value=False)
+        self.gen_raw_data_var       = tk.BooleanVar(value=True)
+        self.use_cache_var          = tk.BooleanVar(value=True)
+        self.all_cores_var          = tk.BooleanVar(value=False)
 
         ttk.Checkbutton(options_frame, text="Summary & Monthly Volume", variable=self.gen_summary_var).grid(row=0, column=0, sticky='w', columnspan=2)
         ttk.Checkbutton(options_frame, text="MoM Change",                 variable=self.gen_mom_var).grid(row=1, column=0, sticky='w')
@@ -986,11 +2154,39 @@ class ExcelProcessorApp:
         ttk.Checkbutton(options_frame, text="Last Paid by Year",          variable=self.gen_last_paid_year_var).grid(row=3, column=0, sticky='w', columnspan=2)
         ttk.Checkbutton(options_frame, text="Last Paid by Month",         variable=self.gen_last_paid_month_var).grid(row=4, column=0, sticky='w', columnspan=2)
         ttk.Checkbutton(options_frame, text="SWAT Cost Analysis",         variable=self.gen_swat_var).grid(row=5, column=0, sticky='w', columnspan=2)
+        ttk.Checkbutton(options_frame, text="Data (prepared rows)",       variable=self.gen_raw_data_var).grid(row=6, column=0, sticky='w', columnspan=2)
+        ttk.Checkbutton(options_frame, text="Reuse cached tables from earlier runs", variable=self.use_cache_var).grid(row=7, column=0, sticky='w', columnspan=2)
+        ttk.Checkbutton(options_frame, text="Use all CPU cores for large extracts", variable=self.all_cores_var).grid(row=8, column=0, sticky='w', columnspan=2)
+
+        # Output
+        output_frame = ttk.LabelFrame(main_frame, text="Output", padding=10)
+        output_frame.grid(row=2, column=0, columnspan=2, sticky="ew", pady=5)
+        ttk.Label(output_frame, text="One workbook per:").grid(row=0, column=0, sticky='w', padx=(0, 5))
+        self.split_by_var = tk.StringVar(value="")
+        ttk.Combobox(output_frame, textvariable=self.split_by_var, width=27,
+                     values=["", "Vendor", "Vendor Number", "Plnt"]).grid(row=0, column=1, sticky='ew')
+        self.preview_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(output_frame, text="Preview tables first (export to Excel on demand)",
+                        variable=self.preview_var).grid(row=1, column=0, columnspan=2, sticky='w', pady=(5, 0))
+
+        # Filters (optional, applied while reading the file)
+        filter_frame = ttk.LabelFrame(main_frame, text="Filters (optional, comma separated)", padding=10)
+        filter_frame.grid(row=3, column=0, columnspan=2, sticky="ew", pady=5)
+        self.filter_vars = {}
+        filter_fields = [
+            ('parts', "Part Numbers:"), ('vendor_numbers', "Vendor Numbers:"),
+            ('plants', "Plants:"), ('event_types', "Event Types:"),
+            ('date_from', "From (MM/DD/YYYY):"), ('date_to', "To (MM/DD/YYYY):"),
+        ]
+        for row, (key, label) in enumerate(filter_fields):
+            ttk.Label(filter_frame, text=label).grid(row=row, column=0, sticky='w', padx=(0, 5), pady=1)
+            self.filter_vars[key] = tk.StringVar()
+            ttk.Entry(filter_frame, textvariable=self.filter_vars[key], width=30).grid(row=row, column=1, sticky='ew', pady=1)
 
         # Buttons
         self.process_button = ttk.Button(main_frame, text="Select Excel / CSV File...", command=self.start_processing)
-        self.process_button.grid(row=2, column=0, sticky="ew", padx=5, pady=10)
-        ttk.Button(main_frame, text="Quit", command=self.root.destroy).grid(row=2, column=1, sticky="ew", padx=5, pady=10)
+        self.process_button.grid(row=4, column=0, sticky="ew", padx=5, pady=10)
+        ttk.Button(main_frame, text="Quit", command=self.root.destroy).grid(row=4, column=1, sticky="ew", padx=5, pady=10)
         main_frame.columnconfigure((0,1), weight=1)
 
     def _center_window(self):
@@ -999,7 +2195,24 @@ class ExcelProcessorApp:
         sw,sh = self.root.winfo_screenwidth(), self.root.winfo_screenheight()
         self.root.geometry(f"{w}x{h}+{sw//2-w//2}+{sh//2-h//2}")
 
+    def _read_filters(self):
+        filters = {}
+        for key in FILTER_COLUMN_ALIASES:
+            text = self.filter_vars[key].get()
+            filters[key] = [v.strip() for v in text.replace(';', ',').replace('\n', ',').split(',') if v.strip()]
+        for key in ('date_from', 'date_to'):
+            text = self.filter_vars[key].get().strip()
+            filters[key] = datetime.strptime(text, "%m/%d/%Y") if text else None
+        if filters['date_from'] and filters['date_to'] and filters['date_from'] > filters['date_to']:
+            raise ValueError("'From' date cannot be after the 'To' date.")
+        return filters
+
     def start_processing(self):
+        try:
+            filters = self._read_filters()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid filter value.\nDetails: {e}", parent=self.root)
+            return
         gen_options = {
             'summary':         self.gen_summary_var.get(),
             'mom':             self.gen_mom_var.get(),
@@ -1008,6 +2221,13 @@ class ExcelProcessorApp:
             'last_paid_year':  self.gen_last_paid_year_var.get(),
             'last_paid_month': self.gen_last_paid_month_var.get(),
             'swat_cost':       self.gen_swat_var.get(),
+            'raw_data':        self.gen_raw_data_var.get(),
+            'use_cache':       self.use_cache_var.get(),
+            'cube_workers':    os.cpu_count() if self.all_cores_var.get() else None,
+            'write_workers':   os.cpu_count() if self.all_cores_var.get() else None,
+            'filters':         filters,
+            'split_by':        self.split_by_var.get().strip(),
+            'preview':         self.preview_var.get(),
         }
         view_mode = self.view_mode_var.get()
 
@@ -1045,12 +2265,15 @@ class ExcelProcessorApp:
 
     def check_queue(self):
         try:
-            status, data = self.result_queue.get_nowait()
+            status, data, *extra = self.result_queue.get_nowait()
             self._hide_loading_window()
             self.process_button.config(state="normal")
-            if status=='success':
+            if status=='preview':
+                self._open_preview(*data)
+            elif status=='success':
+                timings = f"\nSlowest steps: {format_timings(extra[0])}\n" if extra and extra[0] else ""
                 if messagebox.askyesno("Success!",
-                                       f"Process finished.\nOutput file:\n{data}\n\nOpen now?",
+                                       f"Process finished.\nOutput:\n{data}\n{timings}\nOpen now?",
                                        parent=self.root):
                     open_file(data)
             else:
@@ -1060,6 +2283,29 @@ class ExcelProcessorApp:
         except queue.Empty:
             self.root.after(100, self.check_queue)
 
+    def _open_preview(self, tables, out_path, split_col, gen_options):
+        def export(window):
+            if split_col:
+                folder = filedialog.askdirectory(parent=window, title="Export split workbooks into",
+                                                 initialdir=str(out_path.parent))
+                target = Path(folder) / out_path.name if folder else None
+            else:
+                chosen = filedialog.asksaveasfilename(parent=window, title="Export report",
+                                                      initialdir=str(out_path.parent), initialfile=out_path.name,
+                                                      defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx")])
+                target = Path(chosen) if chosen else None
+            if not target:
+                return
+            self._show_loading_window()
+            self.process_button.config(state="disabled")
+            threading.Thread(
+                target=export_tables_in_background,
+                args=(target, tables, gen_options, split_col, self.result_queue),
+                daemon=True
+            ).start()
+            self.root.after(100, self.check_queue)
+        TablePreviewWindow(self.root, tables, export)
+
     def _show_loading_window(self):
         self.loading_window = tk.Toplevel(self.root)
         self.loading_window.title("Please wait…")
@@ -1079,7 +2325,485 @@ class ExcelProcessorApp:
             self.loading_window.destroy()
             self.loading_window = None
 
+# --- WATCH FOLDER ---
+# Headless mode for the SAP drop folder: python PHR_SWAT_V1_A8.py --watch DIR --profile profile.json
+# New or changed extracts are processed with the saved profile once they stop growing.
+WATCH_EXTENSIONS   = {'.xlsx', '.xlsb', '.csv'}
+WATCH_SETTLE_SECS  = 5.0
+WATCH_POLL_SECS    = 2.0
+PROFILE_OPTION_KEYS = ['summary', 'mom', 'last_paid', 'yearly_comp', 'last_paid_year', 'last_paid_month',
+                       'swat_cost', 'raw_data', 'use_cache', 'cip_file', 'filters', 'split_by', 'cube_workers',
+                       'write_workers']
+
+def load_profile(profile_path):
+    # {"view_mode": "detailed", "options": {...same keys as the GUI...},
+    #  "yearly": {"start": 2021, "end": 2024, "target": 2024}, "last_paid_period": {},
+    #  "swat": {"start_date": "2024-01-01", "end_date": "2024-06-30", "name": "H1"}}
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        return parse_profile(json.load(f), profile_path)
+
+def parse_profile(profile, source='profile'):
+    if not isinstance(profile, dict):
+        raise ValueError(f"The {source} must be a JSON object.")
+    for section in ('options', 'yearly', 'last_paid_period', 'swat'):
+        if not isinstance(profile.get(section) or {}, dict):
+            raise ValueError(f"'{section}' in {source} must be a JSON object.")
+    view_mode = profile.get('view_mode', 'detailed')
+    if view_mode not in ('detailed', 'simple'):
+        raise ValueError(f"Unknown view_mode '{view_mode}' in {source}")
+    options = profile.get('options', {})
+    unknown = set(options) - set(PROFILE_OPTION_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown options in {source}: {sorted(unknown)}")
+    gen_options = {'summary': True, 'mom': True, 'last_paid': True, 'yearly_comp': True,
+                   'last_paid_year': False, 'last_paid_month': False, 'swat_cost': False}
+    gen_options.update(options)
+    gen_options['filters'] = normalise_filters(gen_options.get('filters'))
+    params = {'yearly': profile.get('yearly', {}), 'last_paid_period': profile.get('last_paid_period', {})}
+    if gen_options['swat_cost']:
+        swat = profile.get('swat')
+        if not swat or not gen_options.get('cip_file'):
+            raise ValueError("swat_cost needs a 'swat' period and options.cip_file in the profile.")
+        params['swat'] = {'start_date': datetime.fromisoformat(swat['start_date']),
+                          'end_date': datetime.fromisoformat(swat['end_date']),
+                          'name': swat.get('name', '')}
+        if params['swat']['start_date'] > params['swat']['end_date']:
+            raise ValueError("SWAT start_date cannot be after end_date.")
+    gen_options['params'] = params
+    return view_mode, gen_options
+
+def run_profile_job(file_path, view_mode, gen_options):
+    # worker-process entry point; gen_options is copied because swat_cost may be switched off
+    gen_options = dict(gen_options)
+    tables, out_path, split_col = compute_report_tables(file_path, gen_options, view_mode, None)
+    return write_report_output(out_path, tables, gen_options, split_col)
+
+def is_watch_candidate(path):
+    name = path.name
+    return (path.suffix.lower() in WATCH_EXTENSIONS and '_processed_' not in name
+            and not name.startswith(('~$', '.')))
+
+class _Inotify:
+    # Minimal ctypes binding; only the events that mean "a file appeared or changed".
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x002, 0x008, 0x080, 0x100
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+
+    def read(self, timeout):
+        names = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return names
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        pos = 0
+        while pos + self.EVENT.size <= len(buf):
+            _, _, _, length = self.EVENT.unpack_from(buf, pos)
+            pos += self.EVENT.size
+            name = buf[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    # Tracks candidate files until their size and mtime stop changing for settle_secs.
+    def __init__(self, folder, settle_secs=WATCH_SETTLE_SECS, poll_secs=WATCH_POLL_SECS, use_inotify=True):
+        self.folder = Path(folder)
+        self.settle_secs = settle_secs
+        self.poll_secs = poll_secs
+        self.pending = {}  # path -> (signature, time the signature was last seen changing)
+        self.done = {}     # path -> signature that was handed out
+        self.inotify = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self.inotify = _Inotify(self.folder)
+            except OSError as e:
+                logging.warning(f"inotify unavailable, polling {self.folder}: {e}")
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def seed(self, is_up_to_date):
+        # files that already have a newer report are not redone after a restart; the others
+        # are queued now, as inotify only reports files that change after the watch starts
+        now = time.monotonic()
+        for entry in os.scandir(self.folder):
+            path = Path(entry.path)
+            if entry.is_file() and is_watch_candidate(path):
+                sig = self._signature(path)
+                if not sig:
+                    continue
+                if is_up_to_date(path):
+                    self.done[path] = sig
+                else:
+                    self.pending[path] = (sig, now)
+
+    def _touch(self, path, now):
+        sig = self._signature(path)
+        if sig is None:
+            self.pending.pop(path, None)
+        elif sig != self.done.get(path) and (path not in self.pending or self.pending[path][0] != sig):
+            self.pending[path] = (sig, now)
+
+    def poll(self):
+        # blocks up to poll_secs; returns the files that are complete and not yet handed out
+        now = time.monotonic()
+        if self.inotify is not None:
+            for name in self.inotify.read(self.poll_secs):
+                path = self.folder / name
+                if is_watch_candidate(path):
+                    self._touch(path, now)
+        else:
+            time.sleep(self.poll_secs)
+        now = time.monotonic()
+        if self.inotify is None:
+            for entry in os.scandir(self.folder):
+                path = Path(entry.path)
+                if entry.is_file() and is_watch_candidate(path):
+                    self._touch(path, now)
+        ready = []
+        for path, (sig, since) in list(self.pending.items()):
+            current = self._signature(path)
+            if current is None:
+                del self.pending[path]
+            elif current != sig:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle_secs and sig[0] > 0 and self._readable(path):
+                del self.pending[path]
+                self.done[path] = sig
+                ready.append(path)
+        return sorted(ready)
+
+    @staticmethod
+    def _readable(path):
+        # Excel on a share keeps the file locked while it is still saving
+        try:
+            with open(path, 'rb'):
+                return True
+        except OSError:
+            return False
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+def watch_folder(folder, profile_path, max_workers=None, settle_secs=WATCH_SETTLE_SECS,
+                 poll_secs=WATCH_POLL_SECS, use_inotify=True, stop_event=None):
+    view_mode, gen_options = load_profile(profile_path)
+    stop_event = stop_event or threading.Event()
+    workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+    watcher = FolderWatcher(folder, settle_secs, poll_secs, use_inotify)
+
+    def is_up_to_date(path):
+        out = report_output_path(path, view_mode, gen_options['filters'], gen_options.get('split_by') or None)
+        return out.exists() and out.stat().st_mtime >= path.stat().st_mtime
+
+    watcher.seed(is_up_to_date)
+    print(f"Watching {watcher.folder} ({'inotify' if watcher.inotify else 'polling'}, {workers} workers)", flush=True)
+    backlog, running = [], {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while not stop_event.is_set():
+                for path in watcher.poll():
+                    if path not in backlog:
+                        backlog.append(path)
+                # keep at most one job per worker queued so a burst stays in order on disk
+                while backlog and len(running) < workers:
+                    path = backlog.pop(0)
+                    running[pool.submit(run_profile_job, str(path), view_mode, gen_options)] = path
+                    print(f"{datetime.now():%H:%M:%S} queued {path.name}", flush=True)
+                for future in [f for f in running if f.done()]:
+                    path = running.pop(future)
+                    try:
+                        print(f"{datetime.now():%H:%M:%S} done {path.name} -> {future.result()}", flush=True)
+                    except Exception:
+                        logging.error("watch job failed for %s: %s", path, traceback.format_exc())
+                        print(f"{datetime.now():%H:%M:%S} FAILED {path.name} (see error_log.txt)", flush=True)
+    finally:
+        watcher.close()
+
+# --- REPORT SERVICE ---
+# Local HTTP mode: python PHR_SWAT_V1_A8.py --serve 8765 --profile default.json
+#   POST /jobs              {"path": "..."} or {"filename": "x.csv", "content_b64": "..."},
+#                           optional "profile" overriding the default profile
+#   GET  /jobs/<id>         status as JSON
+#   GET  /jobs/<id>/result  the workbook (a .zip for split output)
+# Results are kept under SERVICE_DIR keyed by input hash + options, so a repeated
+# request is answered from disk without running the pipeline.
+SERVICE_DIR       = CACHE_DIR / 'service'
+SERVICE_QUEUE_MAX = 16
+SERVICE_JOB_TTL   = 3600  # seconds a finished job stays listed; its result stays cached on disk
+SERVICE_JOBS_KEPT = 1000  # finished jobs listed at most
+
+def profile_cache_key(input_fp, view_mode, gen_options):
+    options = {}
+    for key, value in gen_options.items():
+        if key in ('cube_workers', 'write_workers'):
+            continue  # same workbook either way
+        if key == 'filters':
+            value = filters_cache_key(value)
+        elif key == 'cip_file' and value and gen_options.get('swat_cost'):
+            value = file_fingerprint(value)  # the cost master's content, not its name
+        options[key] = value
+    payload = json.dumps([CACHE_VERSION, input_fp, view_mode, options], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class ReportJob:
+    def __init__(self, job_id, key, input_path, view_mode, gen_options):
+        self.id = job_id
+        self.key = key
+        self.input_path = input_path
+        self.view_mode = view_mode
+        self.gen_options = gen_options
+        self.status = 'queued'
+        self.cached = False
+        self.result_path = None
+        self.error = None
+        self.submitted = datetime.now()
+        self.finished = None
+
+    def to_dict(self):
+        return {'id': self.id, 'status': self.status, 'cached': self.cached, 'error': self.error,
+                'result': Path(self.result_path).name if self.result_path else None,
+                'submitted': self.submitted.isoformat(timespec='seconds'),
+                'finished': self.finished.isoformat(timespec='seconds') if self.finished else None}
+
+class ReportService:
+    def __init__(self, default_profile, service_dir=SERVICE_DIR, max_workers=None, queue_size=SERVICE_QUEUE_MAX):
+        self.default_profile = default_profile
+        self.service_dir = Path(service_dir)
+        self.service_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs = {}
+        self.by_key = {}  # result key -> job that is queued/running for it
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _result_file(self, key):
+        marker = self.service_dir / key / 'result.json'
+        if not marker.exists():
+            return None
+        with open(marker, 'r', encoding='utf-8') as f:
+            result = self.service_dir / key / json.load(f)['result']
+        return result if result.exists() else None
+
+    def submit(self, request):
+        # returns (job, accepted); accepted is False when the queue is full
+        if not isinstance(request, dict):
+            raise ValueError("The request body must be a JSON object.")
+        profile = request.get('profile') or self.default_profile
+        view_mode, gen_options = parse_profile(profile, 'request profile')
+        if request.get('path'):
+            src = Path(request['path'])
+            if not src.is_file():
+                raise ValueError(f"File not found: {src}")
+            input_fp, content, filename = file_fingerprint(src), None, src.name
+        elif request.get('content_b64') and request.get('filename'):
+            try:
+                content = base64.b64decode(request['content_b64'], validate=True)
+            except (ValueError, TypeError):  # binascii.Error is a ValueError
+                raise ValueError("'content_b64' is not valid base64.")
+            if not content:
+                raise ValueError("'content_b64' is empty.")
+            input_fp, filename = hashlib.sha1(content).hexdigest(), Path(request['filename']).name
+        else:
+            raise ValueError("Send either 'path' or 'filename' + 'content_b64'.")
+        if Path(filename).suffix.lower() not in WATCH_EXTENSIONS | {'.xls', '.xlsm', '.ods'}:
+            raise ValueError(f"Unsupported file type: {filename}")
+        key = profile_cache_key(input_fp, view_mode, gen_options)
+        with self.lock:
+            self._prune()
+            if key in self.by_key:
+                return self.by_key[key], True
+            job = ReportJob(uuid.uuid4().hex[:12], key, None, view_mode, gen_options)
+            cached = self._result_file(key)
+            if cached is not None:
+                job.status, job.cached, job.result_path, job.finished = 'done', True, cached, datetime.now()
+                self.jobs[job.id] = job
+                return job, True
+            if self.queue.full():
+                return None, False
+            work_dir = self.service_dir / key
+            work_dir.mkdir(parents=True, exist_ok=True)
+            job.input_path = work_dir / filename
+            # the job reads the copy, so a later edit of the original does not change a cached result
+            if content is None:
+                shutil.copyfile(src, job.input_path)
+            else:
+                job.input_path.write_bytes(content)
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+            self.by_key[key] = job
+        return job, True
+
+    def forget_result(self, job):
+        # the result file went away (cleaned up by hand): drop the marker so a resubmit rebuilds it
+        (self.service_dir / job.key / 'result.json').unlink(missing_ok=True)
+        job.status, job.cached, job.result_path = 'expired', False, None
+        job.error = 'The result file is gone, submit the job again'
+
+    def _prune(self):
+        # called with the lock held; a pruned job id answers 404 from then on
+        now = datetime.now()
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished)
+        excess = len(finished) - SERVICE_JOBS_KEPT
+        for i, job in enumerate(finished):
+            if i < excess or (now - job.finished).total_seconds() > SERVICE_JOB_TTL:
+                del self.jobs[job.id]
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            job.status = 'running'
+            try:
+                out = self.pool.submit(run_profile_job, str(job.input_path), job.view_mode, job.gen_options).result()
+                out = Path(out)
+                if out.is_dir():
+                    out = Path(shutil.make_archive(str(out), 'zip', out))
+                with open(job.input_path.parent / 'result.json', 'w', encoding='utf-8') as f:
+                    json.dump({'result': out.name}, f)
+                job.result_path, job.status = out, 'done'
+            except Exception:
+                logging.error("service job %s failed: %s", job.id, traceback.format_exc())
+                job.status, job.error = 'failed', traceback.format_exc(limit=1).strip().splitlines()[-1]
+            finally:
+                job.finished = datetime.now()
+                with self.lock:
+                    self.by_key.pop(job.key, None)
+                self.queue.task_done()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class _ReportRequestHandler(BaseHTTPRequestHandler):
+    service = None  # set by serve_reports
+
+    def _send_json(self, code, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job(self, job_id):
+        job = self.service.jobs.get(job_id)
+        if job is None:
+            self._send_json(404, {'error': f"Unknown job '{job_id}'"})
+        return job
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job, accepted = self.service.submit(json.loads(self.rfile.read(length) or b'{}'))
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send_json(400, {'error': str(e)})
+        except OSError as e:
+            logging.error("service submit failed: %s", traceback.format_exc())
+            return self._send_json(500, {'error': f"Could not submit the job: {e}"})
+        if not accepted:
+            return self._send_json(503, {'error': 'Job queue is full, try again later'})
+        self._send_json(200 if job.status == 'done' else 202, job.to_dict())
+
+    def do_GET(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job(parts[1])
+            if job:
+                self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+            job = self._job(parts[1])
+            if not job:
+                return
+            if job.status != 'done':
+                return self._send_json(409, job.to_dict())
+            try:
+                f = open(job.result_path, 'rb')
+            except OSError:
+                with self.service.lock:
+                    self.service.forget_result(job)
+                return self._send_json(410, job.to_dict())
+            with f:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Disposition', f'attachment; filename="{job.result_path.name}"')
+                self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_reports(port, profile_path=None, host='127.0.0.1', max_workers=None, service_dir=SERVICE_DIR,
+                  started=None):
+    default_profile = {}
+    if profile_path:
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            default_profile = json.load(f)
+    parse_profile(default_profile, profile_path or 'default profile')  # fail fast on a bad profile
+    service = ReportService(default_profile, service_dir, max_workers)
+    handler = type('ReportRequestHandler', (_ReportRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving reports on http://{host}:{server.server_port} ({service.workers} workers)", flush=True)
+    if started:
+        started(server)  # gets the bound server, e.g. to read the port or call shutdown()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
+    return server
+
 def main():
+    multiprocessing.freeze_support()  # split workbooks use worker processes, also in the frozen .exe
+    parser = argparse.ArgumentParser(description="PHR / SWAT report builder")
+    parser.add_argument('--watch', metavar='DIR', help="process new extracts dropped into DIR (no GUI)")
+    parser.add_argument('--serve', metavar='PORT', type=int, help="run the local report service (no GUI)")
+    parser.add_argument('--profile', metavar='JSON', help="saved options used by --watch / --serve")
+    parser.add_argument('--workers', type=int, default=None, help="reports built at the same time")
+    parser.add_argument('--poll', action='store_true', help="poll the folder instead of using inotify")
+    args = parser.parse_args()
+    if args.serve is not None:
+        try:
+            serve_reports(args.serve, args.profile, max_workers=args.workers)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.watch:
+        if not args.profile:
+            parser.error("--watch needs --profile")
+        try:
+            watch_folder(args.watch, args.profile, max_workers=args.workers, use_inotify=not args.poll)
+        except KeyboardInterrupt:
+            pass
+        return
     root = tk.Tk()
     ExcelProcessorApp(root)
     root.mainloop()
@@ -1,9 +1,26 @@
 import os
+import sys
 import shutil
 import re
+import time
+import json
+import hashlib
+import sqlite3
+import argparse
+import zipfile
 import threading
-import tkinter as tk
-from tkinter import filedialog, scrolledtext
+import queue
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import tkinter as tk
+    from tkinter import filedialog, scrolledtext
+except ImportError:
+    tk = None  # servers without Tk can still use the command line
 
 def parse_pasted_list(pasted_text):
     if not pasted_text.strip():
@@ -20,118 +37,950 @@ def parse_pasted_list(pasted_text):
         items = [item.strip() for item in text.split(',') if item.strip()]
     return items
 
-def bulk_copy_files(source_dir, dest_dir, phrases, logger, mode="folders"):
-    dumped_files = set()
-    for phrase in phrases:
-        file_found = False
+class PhraseMatcher:
+    # Aho-Corasick automaton: finds every phrase contained in a name in one pass over it
+    def __init__(self, phrases):
+        self.phrases = list(dict.fromkeys(phrases))
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        self.always = [i for i, p in enumerate(self.phrases) if not p]
+        for i, phrase in enumerate(self.phrases):
+            node = 0
+            for ch in phrase:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            if phrase:
+                self.out[node].append(i)
+        pending = list(self.goto[0].values())
+        for node in pending:
+            for ch, nxt in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+                pending.append(nxt)
+
+    def find(self, text):
+        found = set(self.always)
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            found.update(self.out[node])
+        return found
+
+def index_phrase_matches(source_dir, dest_dir, phrases, mode, source_index=None, dest_index=None,
+                         zip_cache=None, max_workers=8):
+    # zip members that match are listed after the files on disk, as (ZipMember, member file name)
+    matcher = PhraseMatcher(phrases)
+    archives = []
+    if source_index is not None:
+        files_by_phrase = {p: source_index.find(p, source_dir) for p in matcher.phrases}
+        if zip_cache is not None:
+            archives = [os.path.join(root, name) for root, name in source_index.find_extension('.zip', source_dir)]
+    else:
+        files_by_phrase = {p: [] for p in matcher.phrases}
         for root, dirs, files in os.walk(source_dir):
             for filename in files:
-                if phrase in filename:
-                    file_found = True
-                    source_file_path = os.path.join(root, filename)
-                    if mode == "folders":
-                        # Copy to all matching destination folders
-                        for dest_root, dest_dirs, dest_files in os.walk(dest_dir):
-                            for dest_folder in dest_dirs:
-                                if phrase in dest_folder:
-                                    dest_folder_path = os.path.join(dest_root, dest_folder)
-                                    dest_file_path = os.path.join(dest_folder_path, filename)
-                                    try:
-                                        shutil.copy(source_file_path, dest_file_path)
-                                        logger(f"Copied '{filename}' to '{dest_folder_path}'")
-                                    except Exception as e:
-                                        logger(f"Failed to copy '{filename}': {e}")
-                                    break
-                    elif mode == "dump":
-                        dest_file_path = os.path.join(dest_dir, filename)
-                        if dest_file_path in dumped_files:
-                            continue
-                        try:
-                            shutil.copy(source_file_path, dest_file_path)
-                            logger(f"Copied '{filename}' to '{dest_dir}'")
-                            dumped_files.add(dest_file_path)
-                        except Exception as e:
-                            logger(f"Failed to copy '{filename}': {e}")
-        if not file_found:
-            logger(f"No file found containing the phrase '{phrase}'")
-
-def rename_files_in_folder(folder_path, logger):
-    for root, dirs, files in os.walk(folder_path):
-        files.sort()
-        files = [file for file in files if not file.endswith('.ini')]
-        current_folder_name = os.path.basename(root)
-        for index, file_name in enumerate(files, start=1):
-            old_file_path = os.path.join(root, file_name)
-            new_file_name = f"{current_folder_name}_{index}{os.path.splitext(file_name)[1]}"
-            new_file_path = os.path.join(root, new_file_name)
-            if os.path.exists(new_file_path):
-                logger(f"File {new_file_name} already exists. Skipping...")
-                continue
-            os.rename(old_file_path, new_file_path)
-            logger(f"Renamed '{old_file_path}' to '{new_file_path}'")
+                for i in matcher.find(filename):
+                    files_by_phrase[matcher.phrases[i]].append((root, filename))
+                if zip_cache is not None and filename.lower().endswith('.zip'):
+                    archives.append(os.path.join(root, filename))
+    if archives:
+        for archive, members in zip_cache.members(archives, max_workers).items():
+            for member in members:
+                filename = member.member.rsplit('/', 1)[-1]
+                for i in matcher.find(filename):
+                    files_by_phrase[matcher.phrases[i]].append((member, filename))
+    folders_by_phrase = {p: [] for p in matcher.phrases}
+    if mode == "folders" and dest_index is not None:
+        for phrase in matcher.phrases:
+            first_match = {}
+            for dest_root, dest_folder in dest_index.find(phrase, dest_dir, folders=True):
+                first_match.setdefault(dest_root, dest_folder)
+            folders_by_phrase[phrase] = [os.path.join(r, d) for r, d in first_match.items()]
+    elif mode == "folders":
+        for dest_root, dest_dirs, dest_files in os.walk(dest_dir):
+            first_match = {}
+            for dest_folder in dest_dirs:
+                for i in matcher.find(dest_folder):
+                    first_match.setdefault(i, dest_folder)
+            for i, dest_folder in first_match.items():
+                folders_by_phrase[matcher.phrases[i]].append(os.path.join(dest_root, dest_folder))
+    return files_by_phrase, folders_by_phrase
 
-def create_folders(path, folders, logger):
-    os.makedirs(path, exist_ok=True)
-    for folder in folders:
+INDEX_DIR = os.environ.get('FILEHUNTER_INDEX_DIR', os.path.join(os.path.expanduser('~'), '.filehunter', 'index'))
+
+def _state_path(root, suffix):
+    # where the tools keep what they know about a folder: outside it, so its contents stay the user's
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(root)).encode('utf-8')).hexdigest()
+    return os.path.join(INDEX_DIR, digest + suffix)
+
+def _dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _index_scan(path):
+    # (name, kind, size, mtime_ns) rows; kind 0 file, 1 folder, 2 linked folder (listed, not descended)
+    rows = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                    size, mtime = st.st_size, st.st_mtime_ns
+                except OSError:
+                    size = mtime = None
+                kind = (2 if entry.is_symlink() else 1) if entry.is_dir() else 0
+                rows.append((entry.name, kind, size, mtime))
+    except OSError:
+        pass
+    return rows
+
+class LibraryIndex:
+    # Names, sizes and mtimes of everything under root, kept in SQLite outside the library.
+    # refresh() only rescans folders whose mtime changed, which is when entries were added,
+    # removed or renamed in them; files edited in place keep their old size and mtime here.
+    def __init__(self, root, path=None):
+        self.root = os.path.abspath(root)
+        self.db = sqlite3.connect(path or _state_path(self.root, '.sqlite'))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER);
+            CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, parent TEXT, name TEXT,
+                                                kind INTEGER, size INTEGER, mtime_ns INTEGER);
+            CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+        """)
+        try:
+            self.db.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(
+                    name, content='entries', content_rowid='id', tokenize='trigram case_sensitive 1');
+                CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                    INSERT INTO names (rowid, name) VALUES (new.id, new.name); END;
+                CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+                    INSERT INTO names (names, rowid, name) VALUES ('delete', old.id, old.name); END;
+            """)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False  # SQLite without FTS5 trigrams: substring search scans the names
+
+    def close(self):
+        self.db.close()
+
+    def covers(self, path):
+        path = os.path.abspath(path)
+        return path == self.root or path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def refresh(self, max_workers=8):
+        known = dict(self.db.execute("SELECT path, mtime_ns FROM dirs"))
+        seen, scanned = set(), 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool, self.db:
+            level = [self.root]
+            while level:
+                # stat first, then list: a change made during the scan shows up on the next refresh
+                mtimes = list(pool.map(_dir_mtime, level))
+                changed = [d for d, m in zip(level, mtimes) if m is not None and known.get(d) != m]
+                listings = dict(zip(changed, pool.map(_index_scan, changed)))
+                next_level = []
+                for d, mtime in zip(level, mtimes):
+                    if mtime is None:
+                        continue
+                    seen.add(d)
+                    if d in listings:
+                        scanned += 1
+                        self.db.execute("DELETE FROM entries WHERE parent = ?", (d,))
+                        self.db.executemany("INSERT INTO entries (parent, name, kind, size, mtime_ns) "
+                                            "VALUES (?, ?, ?, ?, ?)", [(d,) + row for row in listings[d]])
+                        self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (d, mtime))
+                        subdirs = [name for name, kind, size, m in listings[d] if kind == 1]
+                    else:
+                        subdirs = [name for name, in self.db.execute(
+                            "SELECT name FROM entries WHERE parent = ? AND kind = 1 ORDER BY id", (d,))]
+                    next_level.extend(os.path.join(d, name) for name in subdirs)
+                level = next_level
+            gone = [(d,) for d in known if d not in seen]
+            self.db.executemany("DELETE FROM entries WHERE parent = ?", gone)
+            self.db.executemany("DELETE FROM dirs WHERE path = ?", gone)
+        return scanned
+
+    def listdir(self, path):
+        # [(name, is_folder)] in scan order
+        return [(name, kind > 0) for name, kind in self.db.execute(
+            "SELECT name, kind FROM entries WHERE parent = ? ORDER BY id", (os.path.abspath(path),))]
+
+    def walk(self, top):
+        # os.walk(top) from the index; trees outside it are walked on disk
+        if not self.covers(top):
+            yield from os.walk(top)
+            return
+        stack = [top]
+        while stack:
+            root = stack.pop()
+            rows = self.db.execute("SELECT name, kind FROM entries WHERE parent = ? ORDER BY id",
+                                   (os.path.abspath(root),)).fetchall()
+            dirs = [name for name, kind in rows if kind > 0]
+            yield root, dirs, [name for name, kind in rows if kind == 0]
+            linked = {name for name, kind in rows if kind == 2}
+            stack.extend(os.path.join(root, name) for name in reversed(dirs) if name not in linked)
+
+    def _walk_key(self, path, keys):
+        # position of path in os.walk order: the scan position of each folder on the way down
+        if path not in keys:
+            parent, name = os.path.split(path)
+            row = self.db.execute("SELECT id FROM entries WHERE parent = ? AND name = ?", (parent, name)).fetchone()
+            keys[path] = self._walk_key(parent, keys) + (row[0] if row else 0,)
+        return keys[path]
+
+    def find(self, phrase, top, folders=False):
+        # (parent, name) of every file (or folder) under top whose name contains phrase, in os.walk order;
+        # parents start with top as given, the way os.walk(top) spells them
+        if self.fts and len(phrase) >= 3:
+            sql = "SELECT e.id, e.parent, e.name FROM names JOIN entries e ON e.id = names.rowid WHERE names MATCH ? AND "
+            match = '"' + phrase.replace('"', '""') + '"'
+        else:
+            sql = "SELECT e.id, e.parent, e.name FROM entries e WHERE instr(e.name, ?) > 0 AND "
+            match = phrase
+        return self._select(sql, match, top, folders, lambda name: phrase in name)
+
+    def find_extension(self, ext, top):
+        # files under top whose name ends with ext in any case, as name.lower().endswith(ext) on disk
+        ext = ext.lower()
+        sql = "SELECT e.id, e.parent, e.name FROM entries e WHERE instr(lower(e.name), ?) > 0 AND "
+        return self._select(sql, ext, top, False, lambda name: name.lower().endswith(ext))
+
+    def _select(self, sql, match, top, folders, keep):
+        given, top = top, os.path.abspath(top)
+        prefix = top.rstrip(os.sep) + os.sep
+        where = "(e.parent = ? OR substr(e.parent, 1, ?) = ?) AND " + ("e.kind > 0" if folders else "e.kind = 0")
+        keys = {top: ()}
+        rows = sorted((self._walk_key(parent, keys), id_, parent, name)
+                      for id_, parent, name in self.db.execute(sql + where, [match, top, len(prefix), prefix])
+                      if keep(name))
+        return [(given if parent == top else os.path.join(given, os.path.relpath(parent, top)), name)
+                for key, id_, parent, name in rows]
+
+def open_library_index(root, logger, max_workers=8):
+    started = time.perf_counter()
+    index = LibraryIndex(root)
+    scanned = index.refresh(max_workers)
+    logger(f"Library index for {root}: {scanned} folders rescanned in {time.perf_counter() - started:.1f}s")
+    return index
+
+class ZipMember(namedtuple('ZipMember', 'archive member size crc')):
+    # a file inside a .zip in the source tree; shown as if the archive were a folder
+    def __str__(self):
+        return os.path.join(self.archive, *self.member.split('/'))
+
+def _stat_or_none(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+def _read_zip_listing(archive):
+    # (name, size, crc) of every file member, from the central directory only
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            return [(info.filename, info.file_size, info.CRC) for info in zf.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile):
+        return []
+
+class ZipListingCache:
+    # member listings of the archives File Hunter has seen, reused while an archive's size and mtime stay the same
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            path = os.path.join(INDEX_DIR, 'zip_listings.sqlite')
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS archives (path TEXT PRIMARY KEY, size INTEGER, "
+                        "mtime_ns INTEGER, members TEXT)")
+
+    def close(self):
+        self.db.close()
+
+    def members(self, archives, max_workers=8):
+        # {archive: [ZipMember]}; archives that changed or are new are read concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            stats = dict(zip(archives, pool.map(_stat_or_none, archives)))
+            listings, stale = {}, []
+            for archive, st in stats.items():
+                if st is None:
+                    continue
+                row = self.db.execute("SELECT size, mtime_ns, members FROM archives WHERE path = ?",
+                                      (os.path.abspath(archive),)).fetchone()
+                if row and row[:2] == (st.st_size, st.st_mtime_ns):
+                    listings[archive] = json.loads(row[2])
+                else:
+                    stale.append(archive)
+            for archive, listing in zip(stale, pool.map(_read_zip_listing, stale)):
+                listings[archive] = listing
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?)",
+                                [(os.path.abspath(a), stats[a].st_size, stats[a].st_mtime_ns, json.dumps(listings[a]))
+                                 for a in stale])
+        return {archive: [ZipMember(archive, *item) for item in listings[archive]]
+                for archive in archives if archive in listings}
+
+def _open_source(src):
+    if isinstance(src, ZipMember):
+        # the member stream keeps the archive file open after the ZipFile is closed
+        with zipfile.ZipFile(src.archive) as zf:
+            return zf.open(src.member)
+    return open(src, 'rb')
+
+def extract_member(src, dst):
+    # streams one member straight into dst, nothing else in the archive is read
+    with _open_source(src) as fsrc, open(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    return src.size
+
+FICLONE = 0x40049409  # linux/fs.h: share the source's extents (btrfs, xfs, ...)
+
+def _kernel_copy(src_fd, dst_fd, size):
+    # returns how many bytes the kernel copied; the caller finishes the rest itself
+    if size and fcntl is not None and sys.platform.startswith('linux'):
         try:
-            os.makedirs(os.path.join(path, folder), exist_ok=True)
-            logger(f"Created folder: {folder}")
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return size
+        except OSError:
+            pass
+    offset = 0
+    for name in ('copy_file_range', 'sendfile'):
+        if offset >= size or not hasattr(os, name):
+            continue
+        try:
+            if name == 'sendfile':
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+            while offset < size:
+                if name == 'copy_file_range':
+                    n = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if n == 0:
+                    break
+                offset += n
+        except OSError:
+            continue
+    return offset
+
+def fast_copy(src, dst):
+    # shutil.copy for a file destination, using kernel-side copies where available
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        done = _kernel_copy(fsrc.fileno(), fdst.fileno(), size)
+        if done < size:
+            fsrc.seek(done)
+            fdst.seek(done)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copymode(src, dst)
+    return size
+
+def _file_digest(path):
+    h = hashlib.sha1()
+    with _open_source(path) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class CopyManifest:
+    # What was copied where on earlier runs, kept under INDEX_DIR per destination folder.
+    # A copy is skipped when neither its source nor the copy changed since then.
+    def __init__(self, dest_dir, verify_hash=False, path=None):
+        self.dest_dir = dest_dir
+        self.path = path or _state_path(dest_dir, '.copies.json')
+        self.verify_hash = verify_hash
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _key(self, dst):
+        return os.path.relpath(dst, self.dest_dir)
+
+    def unchanged(self, src, dst):
+        # returns (unchanged, source signature to record); a zip member goes by its archive's mtime
+        in_zip = isinstance(src, ZipMember)
+        st = os.stat(src.archive if in_zip else src)
+        sig = [src.size if in_zip else st.st_size, st.st_mtime_ns, None]
+        try:
+            dst_st = os.stat(dst)
+        except OSError:
+            return False, sig
+        if self.verify_hash:
+            sig[2] = _file_digest(src)
+        with self.lock:
+            entry = self.entries.get(self._key(dst))
+        if entry and entry['dst'] == [dst_st.st_size, dst_st.st_mtime_ns]:
+            if entry['from'] != str(src):
+                return False, sig
+            return entry['src'][:2] == sig[:2] or (sig[2] is not None and entry['src'][2] == sig[2]), sig
+        # no record of this copy: fall back to comparing the files themselves
+        if dst_st.st_size != sig[0]:
+            return False, sig
+        if sig[2] is not None:
+            return sig[2] == _file_digest(dst), sig
+        return dst_st.st_mtime_ns >= st.st_mtime_ns, sig
+
+    def record(self, src, dst, sig):
+        dst_st = os.stat(dst)
+        with self.lock:
+            self.entries[self._key(dst)] = {'from': str(src), 'src': sig, 'dst': [dst_st.st_size, dst_st.st_mtime_ns]}
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+class PlannedOp:
+    __slots__ = ('kind', 'src', 'dst', 'done_msg', 'fail_msg', 'chain')
+
+    def __init__(self, kind, src, dst, done_msg, fail_msg, chain=None):
+        self.kind = kind
+        self.src = src
+        self.dst = dst
+        self.done_msg = done_msg
+        self.fail_msg = fail_msg
+        self.chain = chain if chain is not None else dst
+
+class OperationPlan:
+    # Everything a tool is going to do, worked out from one scan before anything is touched.
+    # Steps are operations, messages, or None where all earlier operations must be finished
+    # before later ones start; skipped items are counted by reason.
+    VERBS = {'copy': 'copy', 'unzip': 'extract', 'rename': 'rename', 'mkdir': 'create'}
+
+    def __init__(self):
+        self.steps = []
+        self.counts = {}
+        self.skipped = {}
+        self.keys = set()
+        self.stored_as = {}  # dump mode: matched source -> (stored copy, size, sha1)
+
+    def add(self, kind, src, dst, done_msg, fail_msg, chain=None):
+        # the same operation planned twice is only carried out once
+        key = (kind, src, dst)
+        if key in self.keys:
+            self.skip('duplicate')
+            return False
+        self.keys.add(key)
+        self.steps.append(PlannedOp(kind, src, dst, done_msg, fail_msg, chain))
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return True
+
+    def note(self, message):
+        self.steps.append(message)
+
+    def barrier(self):
+        self.steps.append(None)
+
+    def skip(self, reason, message=None):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        if message:
+            self.note(message)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def describe(self):
+        parts = [f"{n} {self.VERBS[kind]}" for kind, n in self.counts.items()] or ["nothing to do"]
+        skipped = ", ".join(f"{n} {reason}" for reason, n in self.skipped.items())
+        return f"Plan: {len(self)} operations ({', '.join(parts)})" + (f"; skipped {skipped}" if skipped else "")
+
+class OperationEngine:
+    # Runs planned operations on a thread pool; operations sharing a chain run in plan order.
+    def __init__(self, logger, max_workers=8, manifest=None):
+        self.logger = logger
+        self.manifest = manifest
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.chains = {}
+        self.copied = set()
+        self.copies = self.files = self.bytes = self.failed = self.unchanged = 0
+        self.created = self.existing = 0
+        self.started = time.perf_counter()
+
+    def submit(self, op):
+        with self.lock:
+            if op.kind in ('copy', 'unzip'):
+                self.copies += 1
+            if op.chain in self.chains:
+                self.chains[op.chain].append(op)
+                return
+            self.chains[op.chain] = deque([op])
+        self.pool.submit(self._drain, op.chain)
+
+    def _drain(self, chain):
+        while True:
+            with self.lock:
+                if not self.chains[chain]:
+                    del self.chains[chain]
+                    if not self.chains:
+                        self.idle.notify_all()
+                    return
+                op = self.chains[chain].popleft()
+            self._run(op)
+
+    def _run(self, op):
+        size = 0
+        try:
+            if op.kind in ('copy', 'unzip'):
+                if self.manifest is not None:
+                    unchanged, sig = self.manifest.unchanged(op.src, op.dst)
+                    if unchanged:
+                        self.manifest.record(op.src, op.dst, sig)
+                        with self.lock:
+                            self.unchanged += 1
+                            self.copied.add(op.dst)
+                        return
+                size = fast_copy(op.src, op.dst) if op.kind == 'copy' else extract_member(op.src, op.dst)
+                if self.manifest is not None:
+                    self.manifest.record(op.src, op.dst, sig)
+            elif op.kind == 'rename':
+                os.rename(op.src, op.dst)
+            elif op.kind == 'mkdir':
+                # the plan creates parents first, so this is a single call per folder
+                os.mkdir(op.dst)
+        except FileExistsError as e:
+            with self.lock:
+                if op.kind == 'mkdir' and os.path.isdir(op.dst):
+                    self.existing += 1
+                    return
+                self.failed += 1
+            self.logger(f"{op.fail_msg}: {e}")
+            return
         except Exception as e:
-            logger(f"Failed to create {folder}: {e}")
-    logger(f'All {len(folders)} folders processed.')
+            with self.lock:
+                self.failed += 1
+            self.logger(f"{op.fail_msg}: {e}")
+            return
+        with self.lock:
+            if op.kind in ('copy', 'unzip'):
+                self.files += 1
+                self.bytes += size
+                self.copied.add(op.dst)
+            elif op.kind == 'mkdir':
+                self.created += 1
+        if op.done_msg:
+            self.logger(op.done_msg)
 
-def tag_folders_doc_check(base_path, logger):
-    logger("Document check script started")
-    if not os.path.exists(base_path): logger(f"Path does not exist: {base_path}"); return
-    for commodity_category in os.listdir(base_path):
-        commodity_category_path = os.path.join(base_path, commodity_category)
-        if not os.path.isdir(commodity_category_path): continue
-        for part_number in os.listdir(commodity_category_path):
-            part_number_path = os.path.join(commodity_category_path, part_number)
-            if not os.path.isdir(part_number_path): continue
-            base_part_number = part_number.split('_')[0]
-            contains_docs = any(
-                fn.lower().endswith(('.pdf', '.doc', '.docx'))
-                for fn in os.listdir(part_number_path)
-            )
-            suffix = '_r' if contains_docs else '_nfy'
-            new_folder_name = base_part_number + suffix
-            if new_folder_name == part_number: logger(f"No renaming needed for {part_number_path}"); continue
-            new_folder_path = os.path.join(commodity_category_path, new_folder_name)
-            if os.path.exists(new_folder_path): logger(f"Target exists, skipping: {new_folder_path}"); continue
+    def wait(self):
+        with self.lock:
+            while self.chains:
+                self.idle.wait()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.manifest is not None:
             try:
-                os.rename(part_number_path, new_folder_path)
-                logger(f"Renamed {part_number_path} -> {new_folder_path}")
-            except Exception as e:
-                logger(f"Failed to rename {part_number_path}: {e}")
+                self.manifest.save()
+            except OSError as e:
+                self.logger(f"Could not save the copy manifest: {e}")
+        if not self.copies:
+            return
+        secs = max(time.perf_counter() - self.started, 1e-9)
+        mb = self.bytes / (1024 * 1024)
+        self.logger(f"Copied {self.files} files, {mb:.1f} MB in {secs:.1f}s "
+                    f"({mb / secs:.1f} MB/s, {self.files / secs:.1f} files/s)"
+                    + (f", {self.unchanged} unchanged" if self.manifest is not None else "")
+                    + (f", {self.failed} failed" if self.failed else ""))
+
+def execute_plan(plan, logger, dry_run=False, max_workers=8, manifest=None):
+    logger(plan.describe())
+    if dry_run:
+        for step in plan.steps:
+            if step is None:
+                continue
+            if isinstance(step, str):
+                logger(step)
+            elif step.src is None:
+                logger(f"Would {OperationPlan.VERBS[step.kind]} {step.dst}")
+            else:
+                logger(f"Would {OperationPlan.VERBS[step.kind]} {step.src} -> {step.dst}")
+        logger("Dry run: nothing was changed.")
+        return None
+    engine = OperationEngine(logger, max_workers, manifest)
+    for step in plan.steps:
+        if step is None:
+            engine.wait()
+        elif isinstance(step, str):
+            logger(step)
+        else:
+            engine.submit(step)
+    engine.close()
+    return engine
+
+def _file_size(src):
+    if isinstance(src, ZipMember):
+        return src.size
+    try:
+        return os.stat(src).st_size
+    except OSError:
+        return None
+
+def _source_path(root, filename):
+    # matches are (folder, name) on disk and (ZipMember, name) inside archives
+    return root if isinstance(root, ZipMember) else os.path.join(root, filename)
+
+def _copy_kind(src):
+    return 'unzip' if isinstance(src, ZipMember) else 'copy'
+
+def _from_archive(src):
+    return f" from '{os.path.basename(src.archive)}'" if isinstance(src, ZipMember) else ""
+
+def _safe_digest(path):
+    try:
+        return _file_digest(path)
+    except (OSError, zipfile.BadZipFile, RuntimeError):
+        return None
+
+def plan_dump_copies(plan, candidates, dest_dir, max_workers=8):
+    # One copy per distinct file: a file with the same name and content as an earlier one is not
+    # copied again, so every matched name still shows up in the dump folder. Only files sharing a
+    # name and a size are hashed, in parallel. A name already used by other content gets the
+    # first 8 hex digits of its hash appended.
+    names = {src: os.path.normcase(os.path.basename(str(src))) for src in candidates}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sizes = dict(zip(candidates, pool.map(_file_size, candidates)))
+        per_group = {}
+        for src in candidates:
+            per_group[names[src], sizes[src]] = per_group.get((names[src], sizes[src]), 0) + 1
+        shared = [src for src in candidates if sizes[src] is not None and per_group[names[src], sizes[src]] > 1]
+        digests = dict(zip(shared, pool.map(_safe_digest, shared)))
+    stored, used_names = {}, set()
+    for src in candidates:
+        digest = digests.get(src)
+        key = (names[src], sizes[src], digest) if digest is not None else src
+        if key in stored:
+            plan.skip('duplicate content')
+            plan.stored_as[src] = stored[key] + (digest,)
+            continue
+        filename = os.path.basename(str(src))
+        name = filename
+        if os.path.normcase(name) in used_names:
+            digest = digest or _safe_digest(src) or 'unreadable'
+            stem, ext = os.path.splitext(filename)
+            name = f"{stem}_{digest[:8]}{ext}"
+        used_names.add(os.path.normcase(name))
+        dest_file_path = os.path.join(dest_dir, name)
+        stored[key] = (dest_file_path, sizes[src])
+        plan.stored_as[src] = stored[key] + (digest,)
+        done_msg = (f"Copied '{filename}' to '{dest_dir}'" + (f" as '{name}'" if name != filename else "")
+                    + _from_archive(src))
+        plan.add(_copy_kind(src), src, dest_file_path, done_msg, f"Failed to copy '{filename}'")
 
-def tag_folders_image_check(base_path, logger):
-    logger("Image check script started")
+def write_dump_manifest(dest_dir, stored_as, copied):
+    # which stored copy every matched source ended up as; kept under INDEX_DIR so the dump
+    # folder only holds the copies
+    entries = [{'source': str(src), 'stored': os.path.basename(dst), 'size': size, 'sha1': digest,
+                'copied': dst in copied} for src, (dst, size, digest) in stored_as.items()]
+    path = _state_path(dest_dir, '.dump.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=1)
+    os.replace(path + '.tmp', path)
+    return path
+
+def plan_bulk_copy(source_dir, dest_dir, phrases, mode="folders", incremental=False,
+                   source_index=None, dest_index=None, max_workers=8, zip_cache=None):
+    files_by_phrase, folders_by_phrase = index_phrase_matches(source_dir, dest_dir, phrases, mode,
+                                                              source_index, dest_index, zip_cache, max_workers)
+    plan = OperationPlan()
+    candidates = {}
+    final_source = {}
+    if incremental and mode == "folders":
+        # a name copied into the same folder twice ends up as the last copy; skip the overwritten ones
+        for phrase in phrases:
+            for root, filename in files_by_phrase[phrase]:
+                for dest_folder_path in folders_by_phrase[phrase]:
+                    final_source[os.path.join(dest_folder_path, filename)] = _source_path(root, filename)
+    for phrase in phrases:
+        matches = files_by_phrase[phrase]
+        for root, filename in matches:
+            source_file_path = _source_path(root, filename)
+            if mode == "folders":
+                # Copy to all matching destination folders
+                for dest_folder_path in folders_by_phrase[phrase]:
+                    dest_file_path = os.path.join(dest_folder_path, filename)
+                    if final_source and final_source.get(dest_file_path) != source_file_path:
+                        plan.skip('overwritten')
+                        continue
+                    plan.add(_copy_kind(source_file_path), source_file_path, dest_file_path,
+                             f"Copied '{filename}' to '{dest_folder_path}'" + _from_archive(source_file_path),
+                             f"Failed to copy '{filename}'")
+            elif mode == "dump":
+                candidates.setdefault(source_file_path, None)
+        if not matches:
+            plan.skip('no match', f"No file found containing the phrase '{phrase}'")
+    if mode == "dump":
+        plan_dump_copies(plan, list(candidates), dest_dir, max_workers)
+    return plan
+
+def bulk_copy_files(source_dir, dest_dir, phrases, logger, mode="folders", max_workers=8,
+                    incremental=False, verify_hash=False, dry_run=False, use_index=False, search_zips=False):
+    indexes = []
+    zip_cache = ZipListingCache() if search_zips else None
+    try:
+        if use_index:
+            indexes.append(open_library_index(source_dir, logger, max_workers))
+            indexes.append(open_library_index(dest_dir, logger, max_workers) if mode == "folders" else None)
+        indexes += [None] * (2 - len(indexes))
+        plan = plan_bulk_copy(source_dir, dest_dir, phrases, mode, incremental, *indexes, max_workers, zip_cache)
+    finally:
+        for index in indexes + [zip_cache]:
+            if index is not None:
+                index.close()
+    manifest = CopyManifest(dest_dir, verify_hash) if incremental and not dry_run else None
+    engine = execute_plan(plan, logger, dry_run, max_workers, manifest)
+    if engine is not None and plan.stored_as:
+        try:
+            logger(f"Dump manifest saved to {write_dump_manifest(dest_dir, plan.stored_as, engine.copied)}")
+        except OSError as e:
+            logger(f"Could not save the dump manifest: {e}")
+
+def _scan_dir(path):
+    # linked folders are listed with the folders but, like in os.walk, not descended into
+    dirs, files, subdirs = [], [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+    except OSError:
+        pass  # like os.walk, unreadable folders are left out
+    return path, dirs, files, subdirs
+
+def walk_parallel(top, max_workers=8):
+    # os.walk's (root, dirs, files) for the whole tree, folder by folder in breadth-first order,
+    # listing each level's folders concurrently
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        level = [top]
+        while level:
+            scanned = list(pool.map(_scan_dir, level))
+            for root, dirs, files, subdirs in scanned:
+                yield root, dirs, files
+            level = [os.path.join(root, d) for root, dirs, files, subdirs in scanned for d in subdirs]
+
+RENAME_TEMP = "~renaming{}_{}{}"
+
+def _file_name_mapping(folder_name, names, files):
+    # old -> new name for the files of one folder. Files that already carry their own
+    # "<folder>_<n>" name keep it, the others get the lowest free numbers in name order.
+    keep, numbered, rest = {}, set(), []
+    pattern = re.compile(re.escape(os.path.normcase(folder_name)) + r'_([1-9][0-9]*)$')
+    for file_name in sorted(files):
+        stem = os.path.normcase(os.path.splitext(file_name)[0])
+        match = pattern.match(stem)
+        if match and int(match.group(1)) not in numbered:
+            numbered.add(int(match.group(1)))
+            keep[file_name] = file_name
+        else:
+            rest.append(file_name)
+    # a name can only be reused if it belongs to a file that is being renamed
+    blocked = {os.path.normcase(name) for name in names} - {os.path.normcase(name) for name in rest}
+    mapping, index = keep, 0
+    for file_name in rest:
+        ext = os.path.splitext(file_name)[1]
+        while True:
+            index += 1
+            new_file_name = f"{folder_name}_{index}{ext}"
+            if index not in numbered and os.path.normcase(new_file_name) not in blocked:
+                break
+        mapping[file_name] = new_file_name
+    return mapping
+
+def _plan_moves(plan, root, moves, done_msg, fail_msg):
+    # moves maps old -> new names inside root, and every target is free once the renames are done.
+    # An entry whose name is another one's target first moves to a temporary name, which frees
+    # every target before anything is renamed to it (chains and cycles included).
+    targets = {os.path.normcase(new) for new in moves.values()}
+    temp_names = {}
+    for old in moves:
+        if os.path.normcase(old) in targets:
+            temp_names[old] = RENAME_TEMP.format(len(temp_names), os.getpid(), os.path.splitext(old)[1])
+            plan.add('rename', os.path.join(root, old), os.path.join(root, temp_names[old]),
+                     None, fail_msg.format(old=os.path.join(root, old)), chain=root)
+    for old in sorted(moves, key=lambda name: name in temp_names):
+        old_path, new_path = os.path.join(root, old), os.path.join(root, moves[old])
+        plan.add('rename', os.path.join(root, temp_names.get(old, old)), new_path,
+                 done_msg.format(old=old_path, new=new_path), fail_msg.format(old=old_path), chain=root)
+
+def plan_file_renames(folder_path, max_workers=8, index=None):
+    plan = OperationPlan()
+    walk = index.walk(folder_path) if index is not None else walk_parallel(folder_path, max_workers)
+    for root, dirs, files in walk:
+        files = [file for file in files if not file.endswith('.ini')]
+        mapping = _file_name_mapping(os.path.basename(root), dirs + files, files)
+        moves = {old: new for old, new in mapping.items() if old != new}
+        for _ in range(len(mapping) - len(moves)):
+            plan.skip('already named')
+        _plan_moves(plan, root, moves, "Renamed '{old}' to '{new}'", "Failed to rename '{old}'")
+    return plan
+
+def rename_files_in_folder(folder_path, logger, dry_run=False, max_workers=8, use_index=False):
+    index = open_library_index(folder_path, logger, max_workers) if use_index else None
+    try:
+        plan = plan_file_renames(folder_path, max_workers, index)
+    finally:
+        if index is not None:
+            index.close()
+    execute_plan(plan, logger, dry_run, max_workers)
+
+def plan_create_folders(path, folders, template=()):
+    # every folder and its template subfolders, one level at a time so parents exist before children
+    plan = OperationPlan()
+    existing = ({os.path.normcase(name) for name, is_dir in _disk_listdir(path) if is_dir}
+                if os.path.isdir(path) else set())
+    subfolders = [''] + [os.path.normpath(sub) for sub in template]
+    levels, names, planned = {}, set(), set()
+    for folder in folders:
+        key = os.path.normcase(os.path.normpath(folder))
+        if key in names:
+            plan.skip('duplicate', f"Duplicate folder name: {folder}")
+            continue
+        names.add(key)
+        for sub in subfolders:
+            parts = os.path.normpath(os.path.join(folder, sub)).split(os.sep)
+            for depth in range(1, len(parts) + 1):
+                rel = os.path.join(*parts[:depth])
+                if os.path.normcase(rel) in planned:
+                    continue
+                planned.add(os.path.normcase(rel))
+                if depth == 1 and os.path.normcase(rel) in existing:
+                    plan.skip('exists')
+                    continue
+                levels.setdefault(depth, []).append(rel)
+    for depth in sorted(levels):
+        plan.barrier()
+        for rel in levels[depth]:
+            plan.add('mkdir', None, os.path.join(path, rel), None, f"Failed to create {rel}")
+    return plan
+
+def create_folders(path, folders, logger, dry_run=False, max_workers=8, template=()):
+    if not dry_run:
+        os.makedirs(path, exist_ok=True)
+    plan = plan_create_folders(path, folders, template)
+    engine = execute_plan(plan, logger, dry_run, max_workers)
+    # names and template subfolders are counted apart: with a template each name is several folders
+    if engine is None:
+        logger(f'All {len(folders)} names planned, {len(plan)} folders in the plan.')
+        return
+    existing = plan.skipped.get('exists', 0) + engine.existing
+    logger(f'All {len(folders)} names processed: {engine.created} folders created, '
+           f'{existing} already existed, {engine.failed} failed.')
+
+DOC_EXTENSIONS = ('.pdf', '.doc', '.docx')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
+
+def _untagged_name(part_number):
+    # strips every tag earlier runs added, so tagging again gives the same name
+    return re.sub(r'(?:_r|_nfy)+$', '', part_number)
+
+# a part folder is tagged _r when it holds a file of every extension group in its rule set
+TAG_RULE_SETS = {
+    'docs': ("Document check", (DOC_EXTENSIONS,), lambda part: part.split('_')[0]),
+    'images': ("Image check", (IMAGE_EXTENSIONS,), _untagged_name),
+    'both': ("Document and image check", (DOC_EXTENSIONS, IMAGE_EXTENSIONS), _untagged_name),
+}
+
+def _disk_listdir(path):
+    # (name, is_folder) pairs, read lazily so a caller can stop early
+    with os.scandir(path) as it:
+        for entry in it:
+            yield entry.name, entry.is_dir()
+
+def _has_all(listing, groups):
+    missing = list(groups)
+    for name, is_dir in listing:
+        name = name.lower()
+        missing = [group for group in missing if not name.endswith(group)]
+        if not missing:
+            return True
+    return False
+
+def plan_folder_tags(base_path, rule_set='docs', max_workers=8, index=None):
+    title, groups, base_name = TAG_RULE_SETS[rule_set]
+    plan = OperationPlan()
+    listdir = index.listdir if index is not None else _disk_listdir
+    categories = [os.path.join(base_path, name) for name, is_dir in listdir(base_path) if is_dir]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # the disk is listed concurrently, the index answers from its single connection
+        fan_out = map if index is not None else pool.map
+        listings = list(fan_out(lambda path: list(listdir(path)), categories))
+        part_paths = [os.path.join(category, name)
+                      for category, listing in zip(categories, listings) for name, is_dir in listing if is_dir]
+        tagged = iter(list(fan_out(lambda path: _has_all(listdir(path), groups), part_paths)))
+    for commodity_category_path, listing in zip(categories, listings):
+        names = [name for name, is_dir in listing]
+        parts = [name for name, is_dir in listing if is_dir]
+        moves = {}
+        for part_number in parts:
+            new_folder_name = base_name(part_number) + ('_r' if next(tagged) else '_nfy')
+            if new_folder_name == part_number:
+                plan.skip('no change', f"No renaming needed for {os.path.join(commodity_category_path, part_number)}")
+            else:
+                moves[part_number] = new_folder_name
+        # a target is free unless something that stays put has it or another folder claimed it first;
+        # a folder that cannot move keeps its name, which may block others in turn
+        held = {os.path.normcase(name) for name in names} - {os.path.normcase(part) for part in moves}
+        blocked = True
+        while blocked:
+            claimed, blocked = set(), []
+            for part_number, new_folder_name in moves.items():
+                key = os.path.normcase(new_folder_name)
+                if key in held or key in claimed:
+                    blocked.append(part_number)
+                claimed.add(key)
+            for part_number in blocked:
+                held.add(os.path.normcase(part_number))
+                plan.skip('exists', "Target exists, skipping: "
+                          + os.path.join(commodity_category_path, moves.pop(part_number)))
+        _plan_moves(plan, commodity_category_path, moves,
+                    "Renamed {old} -> {new}", "Failed to rename {old}")
+    return plan
+
+def tag_folders(base_path, logger, rule_set='docs', dry_run=False, max_workers=8, use_index=False):
+    logger(f"{TAG_RULE_SETS[rule_set][0]} script started")
     if not os.path.exists(base_path): logger(f"Path does not exist: {base_path}"); return
+    index = None
     try:
-        for commodity_category in os.listdir(base_path):
-            commodity_category_path = os.path.join(base_path, commodity_category)
-            if os.path.isdir(commodity_category_path):
-                for part_number in os.listdir(commodity_category_path):
-                    part_number_path = os.path.join(commodity_category_path, part_number)
-                    if os.path.isdir(part_number_path):
-                        contains_images = any(
-                            file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')) 
-                            for file_name in os.listdir(part_number_path))
-                        if contains_images:
-                            new_folder_name = part_number + '_r'
-                        else:
-                            new_folder_name = part_number + '_nfy'
-                        new_folder_path = os.path.join(commodity_category_path, new_folder_name)
-                        try:
-                            os.rename(part_number_path, new_folder_path)
-                            logger(f"Renamed {part_number_path} to {new_folder_path}")
-                        except Exception as e:
-                            logger(f"Failed to rename {part_number_path}: {e}")
+        index = open_library_index(base_path, logger, max_workers) if use_index else None
+        plan = plan_folder_tags(base_path, rule_set, max_workers, index)
     except Exception as e:
         logger(f"An error occurred: {e}")
+        return
+    finally:
+        if index is not None:
+            index.close()
+    execute_plan(plan, logger, dry_run, max_workers)
+
+def tag_folders_doc_check(base_path, logger, dry_run=False, max_workers=8, use_index=False):
+    tag_folders(base_path, logger, 'docs', dry_run, max_workers, use_index)
+
+def tag_folders_image_check(base_path, logger, dry_run=False, max_workers=8, use_index=False):
+    tag_folders(base_path, logger, 'images', dry_run, max_workers, use_index)
 
 class App:
+    LOG_FLUSH_MS = 100
+    LOG_BATCH = 2000
+    LOG_MAX_LINES = 5000
+
     def __init__(self, root):
         self.root = root
         root.title("File and Folder Management Tool")
@@ -144,6 +993,7 @@ class App:
             "Folder Generator - Create multiple folders",
             "Folder Marker (Document Check) - Tag folders based on document presence",
             "Folder Marker (Image Check) - Tag folders based on image presence",
+            "Folder Marker (Document + Image Check) - Tag folders that have both",
         ]
 
         # --- STATUS LABEL ---
@@ -187,12 +1037,27 @@ class App:
         )
         option_menu.pack(fill=tk.X, padx=8, pady=(0, 8))
 
+        self.dry_run = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            root, text="Dry run - only show the plan, change nothing", variable=self.dry_run, font=("Segoe UI", 10)
+        ).pack(anchor=tk.W, padx=8)
+        self.use_index = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            root, text="Use the library index (first run builds it, later runs only rescan changed folders)",
+            variable=self.use_index, font=("Segoe UI", 10)
+        ).pack(anchor=tk.W, padx=8)
+        self.save_log = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            root, text="Save the full log of each run to a file", variable=self.save_log, font=("Segoe UI", 10)
+        ).pack(anchor=tk.W, padx=8)
+
         self.frames = [
             self._build_filehunter(),
             self._build_renamer(),
             self._build_foldergen(),
-            self._build_doctagger(),
-            self._build_imagetagger()
+            self._build_tagger('docs'),
+            self._build_tagger('images'),
+            self._build_tagger('both')
         ]
         for frame in self.frames:
             frame.pack_forget()
@@ -203,15 +1068,23 @@ class App:
         self.logbox.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
         self.logbox.config(state='disabled')
 
+        # workers only queue their messages; the Tk thread shows them in batches
+        self.log_queue = queue.SimpleQueue()
+        self.log_file = None
+        self.root.after(self.LOG_FLUSH_MS, self.flush_log)
+
         tk.Label(root, text="--- anegrete @ OutlierAI ---", fg="#666").pack(side=tk.BOTTOM, pady=2)
 
     def run_in_thread(self, btn, func):
         self.status_var.set("Working... Please be patient.")
         btn.config(state=tk.DISABLED)
+        if self.save_log.get():
+            self.log_queue.put(('open', time.strftime("pack_log_%Y%m%d_%H%M%S.txt")))
         def thread_target():
             try:
                 func()
             finally:
+                self.log_queue.put(('close', None))
                 self.root.after(0, lambda: [
                     self.status_var.set("Done!"),
                     btn.config(state=tk.NORMAL)
@@ -219,10 +1092,49 @@ class App:
         threading.Thread(target=thread_target, daemon=True).start()
 
     def log(self, txt):
-        self.logbox.config(state='normal')
-        self.logbox.insert(tk.END, txt+'\n')
-        self.logbox.see(tk.END)
-        self.logbox.config(state='disabled')
+        self.log_queue.put(('line', txt))
+
+    def flush_log(self):
+        lines = []
+        try:
+            while len(lines) < self.LOG_BATCH:
+                kind, value = self.log_queue.get_nowait()
+                if kind == 'line':
+                    lines.append(value)
+                    continue
+                self._write_log_file(lines)
+                lines = self._show_log(lines)
+                if self.log_file is not None:
+                    self.log_file.close()
+                    self.log_file = None
+                if kind == 'open':
+                    try:
+                        self.log_file = open(value, 'w', encoding='utf-8')
+                        lines.append(f"Saving the log to {os.path.abspath(value)}")
+                    except OSError as e:
+                        lines.append(f"Could not open the log file {value}: {e}")
+        except queue.Empty:
+            pass
+        self._write_log_file(lines)
+        self._show_log(lines)
+        self.root.after(self.LOG_FLUSH_MS, self.flush_log)
+
+    def _write_log_file(self, lines):
+        if self.log_file is not None and lines:
+            self.log_file.write('\n'.join(lines) + '\n')
+            self.log_file.flush()
+
+    def _show_log(self, lines):
+        if lines:
+            self.logbox.config(state='normal')
+            self.logbox.insert(tk.END, '\n'.join(lines[-self.LOG_MAX_LINES:]) + '\n')
+            # keep only the newest lines in the widget, the log file has all of them
+            excess = int(self.logbox.index('end-1c').split('.')[0]) - 1 - self.LOG_MAX_LINES
+            if excess > 0:
+                self.logbox.delete('1.0', f'{excess + 1}.0')
+            self.logbox.see(tk.END)
+            self.logbox.config(state='disabled')
+        return []
 
     def clearlog(self):
         self.logbox.config(state='normal')
@@ -277,22 +1189,34 @@ class App:
         rb2.pack(side=tk.LEFT, padx=4)
         mode_frame.grid(row=2,column=0,columnspan=3,sticky=tk.W,pady=5)
 
-        tk.Label(f, text="Phrases (paste from Excel, comma or line-separated):", font=("Segoe UI", 10, "bold")).grid(row=3,column=0,sticky=tk.W, pady=(10,0))
+        incremental, verify_hash = tk.BooleanVar(value=False), tk.BooleanVar(value=False)
+        search_zips = tk.BooleanVar(value=False)
+        sync_frame = tk.Frame(f)
+        tk.Checkbutton(sync_frame, text="Only copy new or changed files", variable=incremental, font=("Segoe UI", 10)).pack(side=tk.LEFT)
+        tk.Checkbutton(sync_frame, text="Compare contents (slower)", variable=verify_hash, font=("Segoe UI", 10)).pack(side=tk.LEFT, padx=4)
+        tk.Checkbutton(sync_frame, text="Search inside .zip files", variable=search_zips, font=("Segoe UI", 10)).pack(side=tk.LEFT, padx=4)
+        sync_frame.grid(row=3,column=0,columnspan=3,sticky=tk.W)
+
+        tk.Label(f, text="Phrases (paste from Excel, comma or line-separated):", font=("Segoe UI", 10, "bold")).grid(row=4,column=0,sticky=tk.W, pady=(10,0))
         tbox = tk.Text(f, width=60, height=3)
-        tbox.grid(row=4,column=0,columnspan=3)
+        tbox.grid(row=5,column=0,columnspan=3)
 
         br = tk.Button(f, text="Run")
         def run():
             self.clearlog()
             phrases_list = parse_pasted_list(tbox.get(1.0,tk.END))
             mode_val = copy_mode.get()
+            incremental_val, verify_val, zips_val = incremental.get(), verify_hash.get(), search_zips.get()
+            dry_run, use_index = self.dry_run.get(), self.use_index.get()
             def task():
                 self.log(f"Processing {len(phrases_list)} phrases in mode: {mode_val}")
-                bulk_copy_files(src.get(), dst.get(), phrases_list, self.log, mode_val)
+                bulk_copy_files(src.get(), dst.get(), phrases_list, self.log, mode_val,
+                                incremental=incremental_val, verify_hash=verify_val, dry_run=dry_run, use_index=use_index,
+                                search_zips=zips_val)
                 self.log("Done.")
             self.run_in_thread(br, task)
         br.config(command=run)
-        br.grid(row=5, column=2, sticky=tk.E, pady=10)
+        br.grid(row=6, column=2, sticky=tk.E, pady=10)
         self.style_button(br)
         return f
 
@@ -308,8 +1232,9 @@ class App:
         br = tk.Button(f, text="Run")
         def run():
             self.clearlog()
+            dry_run, use_index = self.dry_run.get(), self.use_index.get()
             def task():
-                rename_files_in_folder(folder.get(), self.log)
+                rename_files_in_folder(folder.get(), self.log, dry_run, use_index=use_index)
                 self.log("Done.")
             self.run_in_thread(br, task)
         br.config(command=run)
@@ -330,20 +1255,26 @@ class App:
         tbox = tk.Text(f, width=56, height=3)
         tbox.grid(row=2,column=0,columnspan=3)
 
+        tk.Label(f, text="Subfolders inside each (optional, e.g. Drawings, Specs, Drawings/2D):", font=("Segoe UI", 10, "bold")).grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=(10,0))
+        template_box = tk.Text(f, width=56, height=2)
+        template_box.grid(row=4,column=0,columnspan=3)
+
         br = tk.Button(f, text="Run")
         def run():
             self.clearlog()
             names = parse_pasted_list(tbox.get(1.0,tk.END))
+            template = parse_pasted_list(template_box.get(1.0,tk.END))
+            dry_run = self.dry_run.get()
             def task():
-                create_folders(path.get(), names, self.log)
+                create_folders(path.get(), names, self.log, dry_run, template=template)
                 self.log("Done.")
             self.run_in_thread(br, task)
         br.config(command=run)
-        br.grid(row=3,column=2,pady=7,sticky=tk.E)
+        br.grid(row=5,column=2,pady=7,sticky=tk.E)
         self.style_button(br)
         return f
 
-    def _build_doctagger(self):
+    def _build_tagger(self, rule_set):
         f = tk.Frame(self.root, bd=2, relief=tk.RIDGE)
         folder = tk.StringVar()
         tk.Label(f, text="Commodity Library Base Path:", font=("Segoe UI", 10, "bold")).grid(row=0,column=0,sticky=tk.W, padx=2, pady=2)
@@ -355,8 +1286,9 @@ class App:
         br = tk.Button(f, text="Run")
         def run():
             self.clearlog()
+            dry_run, use_index = self.dry_run.get(), self.use_index.get()
             def task():
-                tag_folders_doc_check(folder.get(), self.log)
+                tag_folders(folder.get(), self.log, rule_set, dry_run, use_index=use_index)
                 self.log("Done.")
             self.run_in_thread(br, task)
         br.config(command=run)
@@ -364,28 +1296,117 @@ class App:
         self.style_button(br)
         return f
 
-    def _build_imagetagger(self):
-        f = tk.Frame(self.root, bd=2, relief=tk.RIDGE)
-        folder = tk.StringVar()
-        tk.Label(f, text="Commodity Library Base Path:", font=("Segoe UI", 10, "bold")).grid(row=0,column=0,sticky=tk.W, padx=2, pady=2)
-        tk.Entry(f, textvariable=folder, width=52).grid(row=0,column=1)
-        b_folder = tk.Button(f, text="...", command=lambda: folder.set(filedialog.askdirectory()))
-        b_folder.grid(row=0,column=2)
-        self.style_button(b_folder)
+# --- COMMAND LINE ---
+# messages the tools log when something went wrong; the others are progress
+FAILURE_PREFIXES = ('Failed', 'An error occurred', 'Path does not exist', 'Could not')
 
-        br = tk.Button(f, text="Run")
-        def run():
-            self.clearlog()
-            def task():
-                tag_folders_image_check(folder.get(), self.log)
-                self.log("Done.")
-            self.run_in_thread(br, task)
-        br.config(command=run)
-        br.grid(row=1,column=2,pady=7,sticky=tk.E)
-        self.style_button(br)
-        return f
+class JsonLinesLogger:
+    # logger for the command line: one JSON object per message on stdout
+    def __init__(self, tool, stream=None):
+        self.tool = tool
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.started = time.perf_counter()
 
-if __name__ == "__main__":
+    def emit(self, **fields):
+        line = json.dumps(dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'), tool=self.tool, **fields))
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def __call__(self, message):
+        if message.startswith(FAILURE_PREFIXES):
+            self.failures += 1
+            self.emit(level='error', message=message)
+        else:
+            self.emit(level='info', message=message)
+
+    def finish(self):
+        self.emit(level='info', status='done', failures=self.failures,
+                  seconds=round(time.perf_counter() - self.started, 3))
+
+def _read_list(items, path):
+    # items given on the command line plus a pasted-style list from a file ('-' reads stdin)
+    items = list(items)
+    if path == '-':
+        items += parse_pasted_list(sys.stdin.read())
+    elif path:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            items += parse_pasted_list(f.read())
+    return items
+
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(description="File and folder management tools (JSON lines on stdout)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--dry-run', action='store_true', help="only print the plan, change nothing")
+    common.add_argument('--workers', type=int, default=8, help="operations run at the same time")
+    indexed = argparse.ArgumentParser(add_help=False)
+    indexed.add_argument('--index', action='store_true', help="use (and refresh) the library index")
+
+    hunt = commands.add_parser('hunt', parents=[common, indexed], help="copy files whose names contain a phrase")
+    hunt.add_argument('source')
+    hunt.add_argument('dest')
+    hunt.add_argument('phrases', nargs='*')
+    hunt.add_argument('--phrases-from', metavar='FILE', help="phrase list file, '-' for stdin")
+    hunt.add_argument('--mode', choices=('folders', 'dump'), default='folders')
+    hunt.add_argument('--incremental', action='store_true', help="only copy new or changed files")
+    hunt.add_argument('--verify-hash', action='store_true', help="compare contents when checking for changes")
+    hunt.add_argument('--zips', action='store_true', help="also match files inside .zip archives")
+
+    rename = commands.add_parser('rename', parents=[common, indexed], help="rename files after their folder")
+    rename.add_argument('folder')
+
+    mkdirs = commands.add_parser('mkdirs', parents=[common], help="create folders")
+    mkdirs.add_argument('parent')
+    mkdirs.add_argument('names', nargs='*')
+    mkdirs.add_argument('--names-from', metavar='FILE', help="folder name list file, '-' for stdin")
+    mkdirs.add_argument('--template', default='', help="subfolders inside each, e.g. 'Drawings,Specs,Drawings/2D'")
+
+    for name, rule_set in (('tag-docs', 'docs'), ('tag-images', 'images'), ('tag-both', 'both')):
+        tag = commands.add_parser(name, parents=[common, indexed],
+                                  help=f"tag part folders _r/_nfy ({TAG_RULE_SETS[rule_set][0].lower()})")
+        tag.add_argument('base')
+        tag.set_defaults(rule_set=rule_set)
+
+    args = parser.parse_args(argv)
+    logger = JsonLinesLogger(args.command)
+    folder = {'hunt': getattr(args, 'source', None), 'rename': getattr(args, 'folder', None)}.get(args.command)
+    try:
+        if folder is not None and not os.path.isdir(folder):
+            logger(f"Path does not exist: {folder}")
+        elif args.command == 'hunt':
+            phrases = _read_list(args.phrases, args.phrases_from)
+            logger(f"Processing {len(phrases)} phrases in mode: {args.mode}")
+            bulk_copy_files(args.source, args.dest, phrases, logger, args.mode, args.workers,
+                            incremental=args.incremental, verify_hash=args.verify_hash,
+                            dry_run=args.dry_run, use_index=args.index, search_zips=args.zips)
+        elif args.command == 'rename':
+            rename_files_in_folder(args.folder, logger, args.dry_run, args.workers, use_index=args.index)
+        elif args.command == 'mkdirs':
+            create_folders(args.parent, _read_list(args.names, args.names_from), logger, args.dry_run,
+                           args.workers, template=parse_pasted_list(args.template))
+        else:
+            tag_folders(args.base, logger, args.rule_set, args.dry_run, args.workers, use_index=args.index)
+    except BrokenPipeError:
+        raise
+    except Exception as e:
+        logger(f"An error occurred: {e}")
+    logger.finish()
+    return 1 if logger.failures else 0
+
+def main():
+    if len(sys.argv) > 1:
+        try:
+            sys.exit(run_cli())
+        except BrokenPipeError:
+            # whatever read our output has gone away (e.g. | head); stop quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
     root = tk.Tk()
-    app = App(root)
-    root.mainloop()
\ No newline at end of file
+    App(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import inspect
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import importlib.util
+
+# --- SYNTHETIC LIBRARY ---
+def parse_ext_mix(text):
+    # "pdf:3,png:2,txt:5" -> [('.pdf', 3.0), ('.png', 2.0), ('.txt', 5.0)]
+    mix = []
+    for item in text.split(','):
+        ext, _, weight = item.strip().partition(':')
+        mix.append(('.' + ext.lstrip('.'), float(weight or 1)))
+    return mix
+
+def part_numbers_for(categories, parts):
+    return [f"P{100000 + n}" for n in range(categories * parts)]
+
+def make_library(root, categories, parts, depth, files, ext_mix, source_files, seed):
+    # root/library/C<i>/G<..>/.../P<n>/<files>  commodity library (hunt destination, tag and rename target)
+    # root/source/S<k>/P<n>_<j><ext>             loose files named after part numbers (hunt source)
+    rnd = random.Random(seed)
+    exts, weights = zip(*ext_mix)
+    part_numbers = part_numbers_for(categories, parts)
+    os.makedirs(os.path.join(root, 'dump'), exist_ok=True)
+    for c in range(categories):
+        for p in range(parts):
+            number = part_numbers[c * parts + p]
+            groups = [f"G{rnd.randrange(4)}" for _ in range(depth)]
+            folder = os.path.join(root, 'library', f"C{c}", *groups, number)
+            os.makedirs(folder, exist_ok=True)
+            for i in range(files):
+                ext = rnd.choices(exts, weights)[0]
+                with open(os.path.join(folder, f"file{i}{ext}"), 'wb') as f:
+                    f.write(b'x' * rnd.randint(100, 4096))
+    for k in range(source_files):
+        folder = os.path.join(root, 'source', f"S{k % 50}")
+        os.makedirs(folder, exist_ok=True)
+        ext = rnd.choices(exts, weights)[0]
+        with open(os.path.join(folder, f"{rnd.choice(part_numbers)}_{k}{ext}"), 'wb') as f:
+            f.write(b'y' * rnd.randint(100, 65536))
+
+def count_entries(path):
+    return sum(len(dirs) + len(files) for root, dirs, files in os.walk(path))
+
+# --- LATENCY AND CALL COUNTING ---
+PATCHED_OS = ('stat', 'lstat', 'scandir', 'listdir', 'mkdir', 'rename', 'replace',
+              'copy_file_range', 'sendfile', 'utime', 'chmod')
+
+class SyscallMeter:
+    # Wraps the os calls the tools make (and open() inside the tool module) to count them and,
+    # optionally, sleep before each one like a round-trip to a file share. os.walk, os.path.exists
+    # and friends go through the wrapped functions too. DirEntry.is_dir()/stat() are not seen.
+    def __init__(self, module, latency=0.0):
+        self.module = module
+        self.latency = latency
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.saved = {}
+
+    def _wrap(self, name, func):
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                self.counts[name] = self.counts.get(name, 0) + 1
+            if self.latency:
+                time.sleep(self.latency)
+            return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        self.counts = {}
+        for name in PATCHED_OS:
+            if hasattr(os, name):
+                self.saved[name] = getattr(os, name)
+                setattr(os, name, self._wrap(name, self.saved[name]))
+        self.module.open = self._wrap('open', open)
+        return self
+
+    def __exit__(self, *exc):
+        for name, func in self.saved.items():
+            setattr(os, name, func)
+        del self.module.open
+        return False
+
+# --- TOOLS ---
+def load_pack(path):
+    spec = importlib.util.spec_from_file_location('python_pack_bench_target', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _supports(func, name):
+    return name in inspect.signature(func).parameters
+
+def bench_jobs(pack, args, phrases, names):
+    # (tool name, needs a fresh library, call(root, logger)); index runs only where the module has one
+    jobs = [
+        ('hunt', True, lambda root, log: pack.bulk_copy_files(
+            os.path.join(root, 'source'), os.path.join(root, 'library'), phrases, log, 'folders')),
+        ('hunt-dump', True, lambda root, log: pack.bulk_copy_files(
+            os.path.join(root, 'source'), os.path.join(root, 'dump'), phrases, log, 'dump')),
+        ('rename', True, lambda root, log: pack.rename_files_in_folder(os.path.join(root, 'library'), log)),
+        ('tag-docs', True, lambda root, log: pack.tag_folders_doc_check(os.path.join(root, 'library'), log)),
+        ('tag-images', True, lambda root, log: pack.tag_folders_image_check(os.path.join(root, 'library'), log)),
+    ]
+    if _supports(pack.create_folders, 'template'):
+        jobs.append(('mkdirs', True, lambda root, log: pack.create_folders(
+            os.path.join(root, 'new'), names, log, template=args.template)))
+    else:
+        jobs.append(('mkdirs', True, lambda root, log: pack.create_folders(os.path.join(root, 'new'), names, log)))
+    if args.index and hasattr(pack, 'LibraryIndex'):
+        # same library twice in a row: the first run builds the index, the second only refreshes it
+        for label in ('hunt-index-cold', 'hunt-index-warm'):
+            jobs.append((label, label.endswith('cold'), lambda root, log: pack.bulk_copy_files(
+                os.path.join(root, 'source'), os.path.join(root, 'library'), phrases, log, 'folders',
+                use_index=True)))
+    return [job for job in jobs if not args.tools or job[0] in args.tools]
+
+def run_benchmarks(args):
+    pack = load_pack(args.module)
+    work = tempfile.mkdtemp(prefix='pack_bench_', dir=args.workdir)
+    root = os.path.join(work, 'tree')
+    if hasattr(pack, 'INDEX_DIR'):
+        pack.INDEX_DIR = os.path.join(work, 'index')
+    ext_mix = parse_ext_mix(args.ext_mix)
+    part_numbers = part_numbers_for(args.categories, args.parts)
+    phrases = random.Random(args.seed).sample(part_numbers, min(args.phrases, len(part_numbers)))
+    names = [f"N{i}" for i in range(args.new_folders)]
+    failure_prefixes = getattr(pack, 'FAILURE_PREFIXES', ('Failed', 'An error occurred'))
+    results = []
+    try:
+        for tool, fresh, call in bench_jobs(pack, args, phrases, names):
+            if fresh or not os.path.isdir(root):
+                shutil.rmtree(work, ignore_errors=True)
+                make_library(root, args.categories, args.parts, args.depth, args.files,
+                             ext_mix, args.source_files, args.seed)
+            entries = count_entries(root)
+            messages = []
+            with SyscallMeter(pack, args.latency) as meter:
+                started = time.perf_counter()
+                call(root, messages.append)
+                seconds = time.perf_counter() - started
+            if tool == 'mkdirs':
+                operations = count_entries(os.path.join(root, 'new'))
+            else:
+                operations = sum(1 for m in messages if m.startswith(("Copied '", "Renamed ")))
+            calls = dict(sorted(meter.counts.items()))
+            result = {
+                'tool': tool,
+                'seconds': round(seconds, 4),
+                'entries': entries,
+                'operations': operations,
+                'calls': calls,
+                'total_calls': sum(calls.values()),
+                'entries_per_s': round(entries / seconds, 1) if seconds else None,
+                'operations_per_s': round(operations / seconds, 1) if seconds else None,
+                'failures': sum(1 for m in messages if m.startswith(failure_prefixes)),
+            }
+            results.append(result)
+            print(f"{tool:16} {seconds:9.3f}s {result['total_calls']:9d} calls {operations:8d} ops "
+                  f"{result['operations_per_s'] or 0:10.1f} ops/s", file=sys.stderr)
+    finally:
+        if args.keep:
+            print(f"Benchmark tree kept in {work}", file=sys.stderr)
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+    return results
+
+def module_version(path):
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(path)),
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['tool']: r for r in json.load(f)['results']}
+    print(f"{'tool':16} {'baseline':>10} {'now':>10} {'ratio':>7} {'calls':>12}", file=sys.stderr)
+    for r in results:
+        old = baseline.get(r['tool'])
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        print(f"{r['tool']:16} {old['seconds']:9.3f}s {r['seconds']:9.3f}s {ratio:6.2f}x "
+              f"{old['total_calls']:>5} -> {r['total_calls']:<5}", file=sys.stderr)
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Benchmark the Python_PackV1 tools on a synthetic commodity library")
+    parser.add_argument('--module', default=os.path.join(here, 'Python_PackV1.py'),
+                        help="Python_PackV1.py to benchmark (e.g. from an older checkout)")
+    parser.add_argument('--categories', type=int, default=5)
+    parser.add_argument('--parts', type=int, default=200, help="part folders per category")
+    parser.add_argument('--depth', type=int, default=0, help="group folder levels between category and part (taggers expect 0)")
+    parser.add_argument('--files', type=int, default=3, help="files per part folder")
+    parser.add_argument('--ext-mix', default='pdf:3,png:2,docx:1,txt:4', help="extension:weight list")
+    parser.add_argument('--source-files', type=int, default=500, help="loose files for the hunt source")
+    parser.add_argument('--phrases', type=int, default=200, help="phrases passed to the hunt")
+    parser.add_argument('--new-folders', type=int, default=500, help="folders made by mkdirs")
+    parser.add_argument('--template', default='Drawings,Specs,Images', help="subfolders made inside each new folder")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every file system call")
+    parser.add_argument('--tools', nargs='*', help="only these tools")
+    parser.add_argument('--index', action='store_true', help="also time the hunt with the library index")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', default=None, help="where to build the trees (default: temp folder)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated trees")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="earlier JSON results to compare against")
+    args = parser.parse_args()
+    args.template = [item.strip() for item in args.template.split(',') if item.strip()]
+
+    results = run_benchmarks(args)
+    report = {
+        'module': os.path.abspath(args.module),
+        'version': module_version(args.module),
+        'when': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'module', 'keep')},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
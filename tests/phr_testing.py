@@ -0,0 +1,61 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['CSV', 'HOME', 'phr', 'make_extract', 'write_extract']
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The report module logs to ./error_log.txt and caches under PHR_CACHE_DIR from import on;
+# keep both out of the checkout and the user's home.
+HOME = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, HOME, True)
+os.environ['PHR_CACHE_DIR'] = os.path.join(HOME, 'cache')
+_cwd = os.getcwd()
+os.chdir(HOME)
+try:
+    import PHR_SWAT_V1_A8 as phr
+finally:
+    os.chdir(_cwd)
+
+CSV = """Pstng Date,Part Number,Vendor,Vendor Number,Plant,OUn,Crcy,Amount in PO currency,Net Qty in BUoM
+01/15/2023,P1,Acme,100,PL1,EA,USD,100,10
+03/10/2023,P1,Acme,100,PL1,EA,USD,120,10
+02/01/2024,P1,Acme,100,PL1,EA,USD,130,10
+05/20/2023,P2,Bolt,200,PL2,EA,USD,50,5
+06/20/2024,P2,Bolt,200,PL2,EA,USD,60,5
+"""
+
+
+def make_extract(rows=400, seed=0):
+    # SAP-like extract: few parts over four years, unique posting days so "latest" is never a tie,
+    # some zero quantities (no unit price) and some missing posting dates
+    rng = np.random.default_rng(seed)
+    days = rng.choice(4 * 365, rows, replace=False)
+    qty = rng.integers(0, 20, rows)
+    df = pd.DataFrame({
+        'Pstng Date': pd.Timestamp('2021-01-01') + pd.to_timedelta(days, unit='D'),
+        'Part Number': rng.choice([f'P{i:02d}' for i in range(8)], rows),
+        'Vendor': rng.choice(['Acme', 'Bolt', 'Cogs'], rows),
+        'Plant': rng.choice(['PL1', 'PL2'], rows),
+        'Tr./ev.type': rng.choice(['RE', 'WE'], rows),
+        'OUn': rng.choice(['EA', 'BOX'], rows, p=[0.9, 0.1]),
+        'Crcy': rng.choice(['USD', 'EUR'], rows, p=[0.8, 0.2]),
+        'Amount in PO currency': (qty * rng.uniform(5, 50, rows)).round(2),
+        'Net Qty in BUoM': qty,
+    })
+    df['Vendor Number'] = df['Vendor'].map({'Acme': 100, 'Bolt': 200, 'Cogs': 300})
+    df.loc[::50, 'Pstng Date'] = pd.NaT
+    return df
+
+def write_extract(df, path):
+    if str(path).endswith('.csv'):
+        df.to_csv(path, index=False, date_format='%m/%d/%Y')
+    else:
+        df.to_excel(path, index=False)
+    return str(path)
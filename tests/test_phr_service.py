@@ -0,0 +1,104 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from phr_testing import CSV, phr
+
+
+class ReportServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.csv = os.path.join(self.tmp, 'extract.csv')
+        with open(self.csv, 'w') as f:
+            f.write(CSV)
+        started = threading.Event()
+
+        def on_start(server):
+            self.server = server
+            started.set()
+
+        thread = threading.Thread(target=phr.serve_reports, args=(0,), daemon=True, kwargs={
+            'max_workers': 1, 'service_dir': os.path.join(self.tmp, 'service'), 'started': on_start})
+        thread.start()
+        self.assertTrue(started.wait(10))
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def request(self, path, body=None):
+        data = None if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url + path, data=data), timeout=60) as r:
+                return r.status, r.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def submit(self, body):
+        code, payload = self.request('/jobs', body)
+        return code, json.loads(payload)
+
+    def wait_done(self, job_id):
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            code, payload = self.request(f'/jobs/{job_id}')
+            job = json.loads(payload)
+            if job['status'] not in ('queued', 'running'):
+                return job
+            time.sleep(0.2)
+        self.fail(f"job {job_id} did not finish")
+
+    def test_submit_poll_result_then_cached(self):
+        body = {'filename': 'extract.csv', 'content_b64': base64.b64encode(CSV.encode()).decode(),
+                'profile': {'options': {'use_cache': False}}}
+        code, job = self.submit(body)
+        self.assertEqual(code, 202)
+        self.assertEqual(self.wait_done(job['id'])['status'], 'done')
+        code, data = self.request(f"/jobs/{job['id']}/result")
+        self.assertEqual(code, 200)
+        self.assertTrue(data.startswith(b'PK'))  # an xlsx is a zip
+
+        code, again = self.submit(body)
+        self.assertEqual(code, 200)
+        self.assertTrue(again['cached'])
+        self.assertEqual(self.request(f"/jobs/{again['id']}/result"), (200, data))
+
+    def test_missing_result_answers_410_and_is_rebuilt(self):
+        body = {'path': self.csv, 'profile': {'options': {'use_cache': False}}}
+        code, job = self.submit(body)
+        job = self.wait_done(job['id'])
+        result = os.path.join(self.tmp, 'service')
+        for root, _, files in os.walk(result):
+            for name in files:
+                if name == job['result']:
+                    os.remove(os.path.join(root, name))
+        code, payload = self.request(f"/jobs/{job['id']}/result")
+        self.assertEqual(code, 410)
+        self.assertEqual(json.loads(payload)['status'], 'expired')
+        code, job = self.submit(body)
+        self.assertEqual(code, 202)
+        self.assertEqual(self.wait_done(job['id'])['status'], 'done')
+
+    def test_bad_requests_answer_400(self):
+        for body in (b'[1, 2]', b'"text"', {'path': self.csv, 'profile': ['simple']},
+                     {'path': self.csv, 'profile': {'options': ['summary']}},
+                     {'filename': 'a.csv', 'content_b64': 'not base64!'},
+                     {'filename': 'a.csv'}):
+            with self.subTest(body=body):
+                code, payload = self.submit(body)
+                self.assertEqual(code, 400)
+                self.assertIn('error', payload)
+
+    def test_unknown_job_answers_404(self):
+        self.assertEqual(self.request('/jobs/nope')[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,564 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from phr_testing import make_extract, phr, write_extract
+
+
+class TempDirTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def path(self, *parts):
+        return os.path.join(self.tmp, *parts)
+
+
+class ExtractTest(unittest.TestCase):
+    # one prepared synthetic extract per class, as read_and_prepare_data returns it
+    @classmethod
+    def setUpClass(cls):
+        tmp = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, tmp, True)
+        cls.extract = write_extract(make_extract(), os.path.join(tmp, 'extract.csv'))
+        cls.df, cls.standard_id_cols, cls.pstng_col, cls.qty_col = phr.read_and_prepare_data(cls.extract)
+
+
+def month_labels(frame):
+    frame = frame.reset_index()
+    frame.columns = [c.strftime("%m/%d/%Y") if isinstance(c, pd.Timestamp) else c for c in frame.columns]
+    return frame
+
+
+def baseline_monthly(df, id_cols, pstng_col, qty_col):
+    # the month pivots as the report built them before the sparse tables and the cube
+    dated = df.dropna(subset=[pstng_col]).copy()
+    dated['Manual Date'] = dated[pstng_col].apply(lambda d: d.replace(day=1))
+    raw = pd.pivot_table(dated, index=id_cols, columns='Manual Date', values='P/U', aggfunc='mean')
+    summary = raw.ffill(axis=1)
+    mom = summary.pct_change(axis=1, fill_method=None).replace([np.inf, -np.inf], np.nan)
+    vol = pd.pivot_table(dated, index=[c for c in id_cols if c != 'Crcy'], columns='Manual Date',
+                         values=qty_col, aggfunc='sum').fillna(0)
+    return {'summary': month_labels(summary), 'summary_ffill_mask': (raw.isna() & summary.notna()).to_numpy(),
+            'mom': month_labels(mom), 'vol_monthly': month_labels(vol)}
+
+
+def baseline_last_paid(df, id_cols, pstng_col):
+    last = df.dropna(subset=[pstng_col]).sort_values(by=pstng_col, ascending=False).drop_duplicates(subset=id_cols)
+    last = last[id_cols + [pstng_col, 'P/U']].rename(columns={pstng_col: 'Date', 'P/U': 'LastPaidPrice'})
+    return last.assign(Date=last['Date'].dt.strftime("%m/%d/%Y")).reset_index(drop=True)
+
+
+def baseline_last_paid_periods(df, id_cols, pstng_col, start_y, end_y):
+    priced = df.dropna(subset=[pstng_col, 'P/U'])
+    priced = priced.assign(Year=priced[pstng_col].dt.year, YearMonth=priced[pstng_col].dt.to_period('M').astype(str))
+    priced = priced[(priced['Year'] >= start_y) & (priced['Year'] <= end_y)].sort_values(by=pstng_col, ascending=False)
+    out = {}
+    for name, period_col, periods in [
+        ('last_paid_yearly', 'Year', list(range(start_y, end_y + 1))),
+        ('last_paid_monthly', 'YearMonth',
+         pd.period_range(f"{start_y}-01", f"{end_y}-12", freq='M').astype(str).tolist()),
+    ]:
+        latest = priced.drop_duplicates(subset=id_cols + [period_col])
+        wide = latest.set_index(id_cols + [period_col])['P/U'].unstack(level=period_col)
+        wide = wide.reindex(columns=periods).ffill(axis=1).reset_index()
+        wide.columns = id_cols + [str(p) for p in periods]
+        out[name] = wide
+    return out
+
+
+def baseline_yearly(df, id_cols, pstng_col, qty_col, start_y, end_y, target_y):
+    priced = df.dropna(subset=[pstng_col, 'P/U', qty_col])
+    priced = priced.assign(Year=priced[pstng_col].dt.year)
+    years_in_range = list(range(start_y, end_y + 1))
+    all_years = sorted(set(years_in_range + [target_y]))
+    avg = pd.pivot_table(priced, index=id_cols, columns='Year', values='P/U', aggfunc='mean')
+    vol = pd.pivot_table(priced, index=[c for c in id_cols if c != 'Crcy'], columns='Year',
+                         values=qty_col, aggfunc='sum').fillna(0)
+    avg, vol = avg.reindex(columns=all_years), vol.reindex(columns=all_years, fill_value=0)
+    ffill = avg.ffill(axis=1)
+    comparison = pd.DataFrame({
+        f'Price Change % vs {target_y} [{y}]': (ffill[target_y] / ffill[y] - 1).replace([np.inf, -np.inf], np.nan)
+        for y in years_in_range
+    }, index=avg.index)
+    return {'yearly_prices': ffill.reset_index(), 'yearly_volumes': vol.reset_index(),
+            'yearly_comparison': comparison.reset_index(),
+            'yearly_ffill_mask': (avg.isna() & ffill.notna()).reset_index(drop=True)}
+
+
+class TableCacheTest(TempDirTest):
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+    def compute(self, value=None):
+        self.calls.append(value)
+        return pd.DataFrame({'a': [len(self.calls)]}) if value is None else value
+
+    def test_each_name_and_key_is_computed_once(self):
+        cache = phr.TableCache(self.path('cache'))
+        first = cache.get_or_compute('summary', ('fp', 'detailed'), self.compute)
+        assert_frame_equal(cache.get_or_compute('summary', ('fp', 'detailed'), self.compute), first)
+        self.assertEqual(len(self.calls), 1)
+        cache.get_or_compute('summary', ('fp', 'simple'), self.compute)
+        cache.get_or_compute('mom', ('fp', 'detailed'), self.compute)
+        cache.get_or_compute('summary', ('other fp', 'detailed'), self.compute)
+        self.assertEqual(len(self.calls), 4)
+        with mock.patch.object(phr, 'CACHE_VERSION', phr.CACHE_VERSION + 1):
+            cache.get_or_compute('summary', ('fp', 'detailed'), self.compute)
+        self.assertEqual(len(self.calls), 5)
+
+    def test_disabled_cache_always_computes(self):
+        cache = phr.TableCache(self.path('cache'), enabled=False)
+        cache.get_or_compute('summary', ('fp',), self.compute)
+        cache.get_or_compute('summary', ('fp',), self.compute)
+        self.assertEqual(len(self.calls), 2)
+        self.assertFalse(os.path.exists(self.path('cache')))
+
+    def test_unreadable_entry_is_recomputed(self):
+        cache = phr.TableCache(self.path('cache'))
+        cache.get_or_compute('summary', ('fp',), self.compute)
+        with open(cache._entry_path('summary', ('fp',)), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertEqual(cache.get_or_compute('summary', ('fp',), lambda: 'fresh'), 'fresh')
+        with open(cache._entry_path('summary', ('fp',)), 'rb') as f:
+            self.assertEqual(pickle.load(f), 'fresh')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        blob = b'x' * 1000
+        cache = phr.TableCache(self.path('cache'), max_bytes=2500)
+        paths = {}
+        for name in 'ab':
+            cache.get_or_compute(name, ('fp',), lambda: blob)
+            paths[name] = cache._entry_path(name, ('fp',))
+        os.utime(paths['a'], (1_000_000, 1_000_000))
+        os.utime(paths['b'], (2_000_000, 2_000_000))
+        cache.get_or_compute('a', ('fp',), self.compute)  # a hit marks 'a' as recently used
+        cache.get_or_compute('c', ('fp',), lambda: blob)
+        self.assertEqual(self.calls, [])
+        self.assertTrue(paths['a'].exists())
+        self.assertFalse(paths['b'].exists())
+        self.assertTrue(cache._entry_path('c', ('fp',)).exists())
+
+    def test_fingerprint_follows_content_not_name(self):
+        for name, content in [('a.csv', b'1,2'), ('b.csv', b'1,2'), ('c.csv', b'1,3')]:
+            with open(self.path(name), 'wb') as f:
+                f.write(content)
+        a, b, c = (phr.file_fingerprint(self.path(n)) for n in ('a.csv', 'b.csv', 'c.csv'))
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+
+class FilterPushdownTest(TempDirTest):
+    # reading with filters must give what reading a pre-filtered extract gives
+    FILTERS = [
+        {'parts': ['P01', 'P03']},
+        {'vendor_numbers': [100, '300.0'], 'plants': ['PL2']},
+        {'event_types': ['WE'], 'date_from': '2022-03-01', 'date_to': '2023-06-30'},
+    ]
+
+    def expected_rows(self, df, filters):
+        mask = pd.Series(True, index=df.index)
+        columns = {'parts': 'Part Number', 'vendor_numbers': 'Vendor Number',
+                   'plants': 'Plant', 'event_types': 'Tr./ev.type'}
+        for key, col in columns.items():
+            if key in filters:
+                mask &= df[col].astype(str).isin({phr._key_string(v) for v in filters[key]})
+        if 'date_from' in filters:
+            mask &= df['Pstng Date'] >= pd.Timestamp(filters['date_from'])
+        if 'date_to' in filters:
+            mask &= df['Pstng Date'] <= pd.Timestamp(filters['date_to'])
+        return df[mask]
+
+    def check(self, suffix):
+        df = make_extract()
+        full = write_extract(df, self.path('full' + suffix))
+        for i, filters in enumerate(self.FILTERS):
+            with self.subTest(filters=filters):
+                subset = write_extract(self.expected_rows(df, filters), self.path(f'subset{i}{suffix}'))
+                got = phr.read_and_prepare_data(full, filters)
+                want = phr.read_and_prepare_data(subset)
+                self.assertEqual(got[1:], want[1:])
+                self.assertTrue(0 < len(want[0]) < len(df))
+                assert_frame_equal(got[0].reset_index(drop=True), want[0].reset_index(drop=True))
+
+    def test_csv(self):
+        self.check('.csv')
+
+    def test_csv_across_chunks(self):
+        with mock.patch.object(phr, 'CSV_CHUNK_ROWS', 37):
+            self.check('.csv')
+
+    def test_xlsx(self):
+        self.check('.xlsx')
+
+    def test_no_match_and_unknown_column(self):
+        full = write_extract(make_extract(), self.path('full.csv'))
+        with self.assertRaisesRegex(ValueError, 'No rows match'):
+            phr.read_and_prepare_data(full, {'parts': ['nope']})
+        df = make_extract().drop(columns='Plant')
+        with self.assertRaisesRegex(ValueError, 'column not found'):
+            phr.read_and_prepare_data(write_extract(df, self.path('noplant.csv')), {'plants': ['PL1']})
+
+
+class SparseMonthTableTest(ExtractTest):
+    ID_COLS = ['Part Number', 'Vendor', 'Plnt', 'Crcy']
+
+    def sparse(self, value_col, aggfunc, kind, id_cols):
+        dated = self.df.dropna(subset=[self.pstng_col, value_col])
+        dated = dated.assign(Month=dated[self.pstng_col].dt.to_period('M').dt.to_timestamp())
+        long = dated.groupby(id_cols + ['Month'], as_index=False)[value_col].agg(aggfunc)
+        months = sorted(long['Month'].unique())
+        return phr.sparse_from_long(long, id_cols, 'Month', value_col, months, kind,
+                                    labels=[pd.Timestamp(m).strftime("%m/%d/%Y") for m in months])
+
+    def setUp(self):
+        self.baseline = baseline_monthly(self.df, self.ID_COLS, self.pstng_col, self.qty_col)
+        self.summary = self.sparse('P/U', 'mean', 'ffill', self.ID_COLS)
+
+    def test_ffill_matches_pivot(self):
+        assert_frame_equal(self.summary.to_frame(), self.baseline['summary'], check_names=False)
+        carried = np.array([carried for _, _, carried in self.summary.iter_dense_rows()])
+        np.testing.assert_array_equal(carried, self.baseline['summary_ffill_mask'])
+
+    def test_pct_matches_pivot(self):
+        mom = phr.sparse_pct_change(self.summary).to_frame()
+        want = self.baseline['mom']
+        assert_frame_equal(mom.fillna(0), want.fillna(0), check_names=False)
+        np.testing.assert_array_equal(mom.isna().to_numpy(), want.isna().to_numpy())
+
+    def test_sum_matches_pivot(self):
+        vol = self.sparse(self.qty_col, 'sum', 'sum', [c for c in self.ID_COLS if c != 'Crcy'])
+        assert_frame_equal(vol.to_frame(), self.baseline['vol_monthly'], check_names=False, check_dtype=False)
+
+    def test_column_values_and_take(self):
+        frame = self.summary.to_frame()
+        for j, period in enumerate(self.summary.periods):
+            np.testing.assert_array_equal(self.summary.column_values(j), frame[period].to_numpy())
+        rows = np.array([5, 0, 3, len(frame) - 1])
+        part = self.summary.take(rows)
+        assert_frame_equal(part.to_frame(), frame.iloc[rows].reset_index(drop=True))
+
+
+class MonthlyCubeTest(ExtractTest):
+    SIMPLE_ID_COLS = ['Part Number', 'Vendor', 'Vendor Number', 'Aggregated OUn', 'Crcy']
+
+    def setUp(self):
+        # built once at the detailed level; the simple view is a rollup of it
+        self.cube = phr.build_monthly_cube(self.df, self.standard_id_cols, self.pstng_col, self.qty_col)
+
+    def views(self):
+        for id_cols in (self.standard_id_cols, self.SIMPLE_ID_COLS):
+            with self.subTest(id_cols=id_cols):
+                yield id_cols
+
+    def test_analysis_tables_match_baseline(self):
+        for id_cols in self.views():
+            tables = phr.generate_analysis_tables(self.df, id_cols, self.pstng_col, self.qty_col, cube=self.cube)
+            want = baseline_monthly(self.df, id_cols, self.pstng_col, self.qty_col)
+            assert_frame_equal(tables['summary'].to_frame(), want['summary'], check_names=False)
+            assert_frame_equal(tables['mom'].to_frame().fillna(0), want['mom'].fillna(0), check_names=False)
+            assert_frame_equal(tables['vol_monthly'].to_frame(), want['vol_monthly'],
+                               check_names=False, check_dtype=False)
+            assert_frame_equal(tables['last_paid'], baseline_last_paid(self.df, id_cols, self.pstng_col))
+
+    def test_last_paid_period_tables_match_baseline(self):
+        gen_options = {'last_paid_year': True, 'last_paid_month': True}
+        for id_cols in self.views():
+            tables = phr.generate_last_paid_period_tables(self.df, id_cols, self.pstng_col, None, gen_options,
+                                                          params={'start': 2022, 'end': 2023}, cube=self.cube)
+            want = baseline_last_paid_periods(self.df, id_cols, self.pstng_col, 2022, 2023)
+            for name in ('last_paid_yearly', 'last_paid_monthly'):
+                assert_frame_equal(tables[name].to_frame(), want[name], check_names=False)
+
+    def test_years_come_from_priced_months(self):
+        priced = self.df.dropna(subset=[self.pstng_col, 'P/U'])
+        self.assertEqual(phr.cube_years(self.cube), sorted(priced[self.pstng_col].dt.year.unique()))
+
+
+class PartitionTest(ExtractTest):
+    def setUp(self):
+        id_cols = ['Part Number', 'Vendor', 'Crcy']
+        cube = phr.build_monthly_cube(self.df, self.standard_id_cols, self.pstng_col, self.qty_col)
+        self.tables = phr.generate_analysis_tables(self.df, id_cols, self.pstng_col, self.qty_col, cube=cube)
+        self.tables.update(phr.generate_yearly_comparison_tables(
+            self.df, id_cols, self.pstng_col, self.qty_col, None,
+            params={'start': 2021, 'end': 2024, 'target': 2024}, cube=cube))
+        self.tables['SWAT Cost analysis'] = pd.DataFrame({
+            'Part Number': ['P01', 'X99', 'P02'],
+            'Vendor': ['Acme', phr.SWAT_NOT_FOUND, 'Bolt'],
+        })
+        self.tables['no_vendor'] = pd.DataFrame({'Part Number': ['P01']})
+
+    @staticmethod
+    def rows_of(frame, vendor):
+        return frame[frame['Vendor'] == vendor].reset_index(drop=True)
+
+    def test_partitions_hold_each_vendors_rows(self):
+        parts = phr.partition_tables(self.tables, 'Vendor')
+        self.assertEqual(set(parts), {'Acme', 'Bolt', 'Cogs', phr.UNASSIGNED})
+        for vendor in ('Acme', 'Bolt', 'Cogs'):
+            with self.subTest(vendor=vendor):
+                part = parts[vendor]
+                for name in ('summary', 'mom', 'vol_monthly'):
+                    assert_frame_equal(part[name].to_frame(), self.rows_of(self.tables[name].to_frame(), vendor))
+                for name in ('last_paid', 'yearly_prices', 'yearly_volumes', 'yearly_comparison'):
+                    assert_frame_equal(part[name], self.rows_of(self.tables[name], vendor))
+                rows = np.flatnonzero(self.tables['yearly_prices']['Vendor'] == vendor)
+                assert_frame_equal(part['yearly_ffill_mask'],
+                                   self.tables['yearly_ffill_mask'].iloc[rows].reset_index(drop=True))
+                np.testing.assert_array_equal(part['yearly_change'].change, self.tables['yearly_change'].change[
+                    np.flatnonzero(self.tables['yearly_change'].keys['Vendor'] == vendor)])
+                self.assertEqual(part['price_id_cols'], self.tables['price_id_cols'])
+                self.assertNotIn('no_vendor', part)
+
+    def test_placeholder_rows_go_to_one_unassigned_part(self):
+        parts = phr.partition_tables(self.tables, 'Vendor')
+        self.assertNotIn(phr.SWAT_NOT_FOUND, parts)
+        unassigned = parts[phr.UNASSIGNED]
+        self.assertEqual(list(unassigned['SWAT Cost analysis']['Part Number']), ['X99'])
+        self.assertNotIn('summary', unassigned)
+
+    def test_split_file_names(self):
+        tables = dict(self.tables, **{'SWAT Cost analysis': pd.DataFrame({
+            'Vendor': ['Acme', phr.SWAT_NOT_FOUND, 'unassigned', 'a/b']})})
+        with tempfile.TemporaryDirectory() as tmp, \
+             mock.patch.object(phr, '_write_partition', lambda job: job[0]):
+            paths = phr.write_split_reports(tmp, 'extract', tables, {}, 'Vendor', max_workers=1)
+        self.assertEqual([p.name for p in paths], [
+            'extract_Acme.xlsx', 'extract_Bolt.xlsx', 'extract_Cogs.xlsx', 'extract_a_b.xlsx',
+            'extract_unassigned.xlsx', 'extract_unassigned_.xlsx'])
+
+
+class ReportGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = phr.ReportGraph()
+        self.ran = []
+
+    def node(self, name, func, deps=(), interactive=False):
+        def run(*args):
+            self.ran.append(name)
+            return func(*args)
+        self.graph.add(name, run, deps, interactive)
+
+    def test_only_requested_nodes_run_once(self):
+        self.node('data', lambda: 2)
+        self.node('double', lambda x: x * 2, ['data'])
+        self.node('square', lambda x: x * x, ['data'])
+        self.node('both', lambda a, b: a + b, ['double', 'square'])
+        self.node('unused', lambda: 1 / 0)
+        self.assertEqual(self.graph.evaluate(['double']), {'double': 4})
+        self.assertEqual(self.graph.evaluate(['both', 'data']), {'both': 8, 'data': 2})
+        self.assertEqual(sorted(self.ran), ['both', 'data', 'double', 'square'])
+        self.assertEqual(set(self.graph.timings), {'data', 'double', 'square', 'both'})
+
+    def test_independent_nodes_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=10)
+        self.node('a', lambda: barrier.wait() is not None)
+        self.node('b', lambda: barrier.wait() is not None)
+        self.assertEqual(self.graph.evaluate(['a', 'b'], max_workers=2), {'a': True, 'b': True})
+
+    def test_interactive_nodes_run_on_the_calling_thread(self):
+        caller = threading.current_thread()
+        self.node('data', lambda: 1)
+        self.node('ask', lambda x: threading.current_thread() is caller, ['data'], interactive=True)
+        self.node('ask_again', lambda: threading.current_thread() is caller, interactive=True)
+        self.assertEqual(self.graph.evaluate(['ask', 'ask_again']), {'ask': True, 'ask_again': True})
+
+    def test_errors_propagate(self):
+        self.node('bad', lambda: 1 / 0)
+        self.node('after', lambda x: x, ['bad'])
+        with self.assertRaises(ZeroDivisionError):
+            self.graph.evaluate(['after'])
+        self.assertNotIn('after', self.ran)
+
+
+class FolderWatcherTest(TempDirTest):
+    def watcher(self, settle_secs=0.0, use_inotify=False):
+        watcher = phr.FolderWatcher(self.tmp, settle_secs=settle_secs, poll_secs=0.02, use_inotify=use_inotify)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def write(self, name, content=b'data'):
+        with open(self.path(name), 'wb') as f:
+            f.write(content)
+        return Path(self.path(name))
+
+    def poll_until(self, watcher, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            ready = watcher.poll()
+            if ready:
+                return ready
+        return []
+
+    def test_candidates(self):
+        for name, wanted in [('a.csv', True), ('b.XLSX', True), ('c.xlsb', True), ('d.txt', False),
+                             ('a_processed_detailed.xlsx', False), ('~$a.xlsx', False), ('.a.csv', False)]:
+            self.assertEqual(phr.is_watch_candidate(Path(name)), wanted, name)
+
+    def test_complete_files_are_handed_out_once(self):
+        watcher = self.watcher()
+        extract = self.write('extract.csv')
+        self.write('notes.txt')
+        self.write('empty.csv', b'')
+        self.assertEqual(self.poll_until(watcher), [extract])
+        self.assertEqual(watcher.poll(), [])
+        self.write('extract.csv', b'more data')
+        self.assertEqual(self.poll_until(watcher), [extract])
+
+    def test_growing_file_waits_to_settle(self):
+        watcher = self.watcher(settle_secs=0.3)
+        extract = self.write('extract.csv')
+        start = time.monotonic()
+        for i in range(5):
+            self.assertEqual(watcher.poll(), [])
+            self.write('extract.csv', b'data' * (i + 2))
+        self.assertEqual(self.poll_until(watcher), [extract])
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    def test_seed_skips_files_with_a_current_report(self):
+        done, todo = self.write('done.csv'), self.write('todo.csv')
+        watcher = self.watcher()
+        watcher.seed(lambda path: path == done)
+        self.assertEqual(self.poll_until(watcher), [todo])
+        self.assertEqual(watcher.poll(), [])
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+    def test_inotify_sees_new_files(self):
+        watcher = self.watcher(use_inotify=True)
+        if watcher.inotify is None:
+            self.skipTest('inotify unavailable')
+        extract = self.write('extract.xlsx')
+        self.assertEqual(self.poll_until(watcher), [extract])
+
+
+class YearlyChangeTensorTest(ExtractTest):
+    ID_COLS = ['Part Number', 'Vendor', 'Plnt', 'Crcy']
+    # (start, end, target): full range, target after / before / inside the range, a gap, years without data
+    PARAMS = [(2021, 2024, 2024), (2022, 2023, 2024), (2022, 2024, 2022), (2021, 2022, 2024), (2019, 2020, 2022)]
+
+    def setUp(self):
+        self.cube = phr.build_monthly_cube(self.df, self.standard_id_cols, self.pstng_col, self.qty_col)
+
+    def test_tables_match_baseline(self):
+        for start_y, end_y, target_y in self.PARAMS:
+            with self.subTest(start=start_y, end=end_y, target=target_y):
+                got = phr.generate_yearly_comparison_tables(
+                    self.df, self.ID_COLS, self.pstng_col, self.qty_col, None,
+                    params={'start': start_y, 'end': end_y, 'target': target_y}, cube=self.cube)
+                want = baseline_yearly(self.df, self.ID_COLS, self.pstng_col, self.qty_col, start_y, end_y, target_y)
+                for name, frame in want.items():
+                    assert_frame_equal(got[name], frame, check_names=False, check_dtype=False)
+                changes = got['yearly_comparison'].iloc[:, len(self.ID_COLS):]
+                self.assertEqual(changes.notna().any().any(), start_y >= 2021)  # the extract starts in 2021
+
+    def test_every_pair_is_a_ratio_of_forward_filled_prices(self):
+        tensor = phr.generate_yearly_comparison_tables(
+            self.df, self.ID_COLS, self.pstng_col, self.qty_col, None,
+            params={'start': 2021, 'end': 2024, 'target': 2024}, cube=self.cube)['yearly_change']
+        prices = baseline_yearly(self.df, self.ID_COLS, self.pstng_col, self.qty_col, 2021, 2024, 2024)
+        prices = prices['yearly_prices'][tensor.years].to_numpy()
+        for t in tensor.years:
+            for r in tensor.years:
+                want = prices[:, tensor.years.index(t)] / prices[:, tensor.years.index(r)] - 1
+                np.testing.assert_allclose(tensor.pair(t, r), want)
+
+    def test_take_keeps_rows(self):
+        tensor = phr.generate_yearly_comparison_tables(
+            self.df, self.ID_COLS, self.pstng_col, self.qty_col, None,
+            params={'start': 2021, 'end': 2024, 'target': 2024}, cube=self.cube)['yearly_change']
+        rows = np.array([3, 0, 7])
+        part = tensor.take(rows)
+        assert_frame_equal(part.comparison_frame(2024, [2022, 2023], since=2022),
+                           tensor.comparison_frame(2024, [2022, 2023], since=2022).iloc[rows].reset_index(drop=True))
+
+
+class ShardedCubeTest(ExtractTest):
+    def build(self, df, workers):
+        with mock.patch.object(phr, 'SHARD_MIN_ROWS', 0):
+            return phr.build_monthly_cube(df, self.standard_id_cols, self.pstng_col, self.qty_col, workers=workers)
+
+    def test_matches_single_process_cube(self):
+        df = self.df.copy()
+        # missing keys must group (and sort) like they do in one process
+        df.loc[df.index[::7], 'Vendor'] = np.nan
+        df.loc[df.index[::11], 'Plnt'] = np.nan
+        want = self.build(df, None)
+        for workers in (2, 3, 16):
+            with self.subTest(workers=workers):
+                assert_frame_equal(self.build(df, workers), want)
+
+    def test_feeds_the_same_tables(self):
+        id_cols = ['Part Number', 'Vendor', 'Crcy']
+        tables = [phr.generate_analysis_tables(self.df, id_cols, self.pstng_col, self.qty_col,
+                                               cube=self.build(self.df, workers)) for workers in (None, 2)]
+        for name in ('summary', 'mom', 'vol_monthly'):
+            assert_frame_equal(tables[1][name].to_frame(), tables[0][name].to_frame())
+        assert_frame_equal(tables[1]['last_paid'], tables[0]['last_paid'])
+
+
+class ParallelWriterTest(ExtractTest):
+    def report_tables(self, options):
+        view_mode, gen_options = phr.parse_profile({'options': dict(options, use_cache=False)})
+        tables, _, _ = phr.compute_report_tables(self.extract, gen_options, view_mode, None)
+        return tables, gen_options
+
+    @staticmethod
+    def describe(path):
+        # everything the sheets show: values, formats, styles, tables, panes and widths
+        from openpyxl import load_workbook
+        wb = load_workbook(path)
+        book = {}
+        for ws in wb.worksheets:
+            cells = [
+                (c.coordinate, c.value, c.number_format, c.font.b, c.font.i, c.font.color and c.font.color.rgb,
+                 c.fill.fill_type, c.fill.fgColor.rgb, c.alignment.horizontal, c.border.bottom.style)
+                for row in ws.iter_rows() for c in row
+            ]
+            book[ws.title] = {
+                'cells': cells,
+                'tables': sorted((t.displayName, t.ref, t.tableStyleInfo.name) for t in ws.tables.values()),
+                'panes': ws.freeze_panes,
+                'widths': {k: d.width for k, d in ws.column_dimensions.items()},
+                'selected': ws.sheet_view.tabSelected,
+            }
+        return list(wb.sheetnames), book
+
+    def check(self, options):
+        tables, gen_options = self.report_tables(options)
+        with tempfile.TemporaryDirectory() as tmp:
+            serial, parallel = os.path.join(tmp, 'serial.xlsx'), os.path.join(tmp, 'parallel.xlsx')
+            phr.write_formatted_excel_report(serial, tables, gen_options)
+            phr.write_report_parallel(parallel, tables, gen_options, max_workers=2)
+            want_names, want = self.describe(serial)
+            got_names, got = self.describe(parallel)
+        self.assertEqual(got_names, want_names)
+        self.assertGreater(len(want_names), 2)
+        for name in want_names:
+            with self.subTest(sheet=name):
+                got_cells, want_cells = got[name].pop('cells'), want[name].pop('cells')
+                self.assertEqual(got[name], want[name])
+                self.assertEqual(len(got_cells), len(want_cells))
+                self.assertEqual([pair for pair in zip(got_cells, want_cells) if pair[0] != pair[1]][:5], [])
+
+    def test_all_sheets_match_serial_writer(self):
+        self.check({'last_paid_year': True, 'last_paid_month': True})
+
+    def test_without_raw_data(self):
+        self.check({'raw_data': False, 'mom': False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+import os
+import sys
+import itertools
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Python_PackV1 as pack
+
+
+class TempDirTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        index_dir, pack.INDEX_DIR = pack.INDEX_DIR, os.path.join(self.tmp, 'index')
+        self.addCleanup(setattr, pack, 'INDEX_DIR', index_dir)
+
+    def make(self, *paths, content=b'x'):
+        for path in paths:
+            path = os.path.join(self.tmp, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+    def chdir(self):
+        # relative paths, as typed in the tools' path boxes
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.addCleanup(os.chdir, cwd)
+
+    def open_index(self, root):
+        index = pack.LibraryIndex(root)
+        self.addCleanup(index.close)
+        index.refresh()
+        return index
+
+
+class OperationPlanTest(TempDirTest):
+    def test_same_operation_is_planned_once(self):
+        plan = pack.OperationPlan()
+        self.assertTrue(plan.add('copy', 'a', 'b', None, "Failed"))
+        self.assertFalse(plan.add('copy', 'a', 'b', None, "Failed"))
+        plan.skip('no match', "No file found containing the phrase 'x'")
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(plan.describe(), "Plan: 1 operations (1 copy); skipped 1 duplicate, 1 no match")
+
+    def test_dry_run_changes_nothing(self):
+        self.make('a.txt')
+        plan = pack.OperationPlan()
+        plan.add('rename', os.path.join(self.tmp, 'a.txt'), os.path.join(self.tmp, 'b.txt'), "Renamed", "Failed")
+        messages = []
+        self.assertIsNone(pack.execute_plan(plan, messages.append, dry_run=True))
+        self.assertEqual(os.listdir(self.tmp), ['a.txt'])
+        self.assertEqual(messages[-1], "Dry run: nothing was changed.")
+
+    def test_chains_keep_plan_order_and_barriers_wait(self):
+        self.make('a')
+        path = lambda *parts: os.path.join(self.tmp, *parts)
+        plan = pack.OperationPlan()
+        plan.add('rename', path('a'), path('b'), None, "Failed", chain='x')
+        plan.add('rename', path('b'), path('c'), None, "Failed", chain='x')
+        plan.add('mkdir', None, path('d'), None, "Failed")
+        plan.barrier()
+        plan.add('mkdir', None, path('d', 'e'), None, "Failed")
+        engine = pack.execute_plan(plan, lambda message: None, max_workers=4)
+        self.assertEqual(engine.failed, 0)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['c', 'd'])
+        self.assertEqual(os.listdir(path('d')), ['e'])
+
+
+class PhraseMatcherTest(unittest.TestCase):
+    def test_finds_every_contained_phrase(self):
+        matcher = pack.PhraseMatcher(['P12', 'P123', '23_', 'X'])
+        found = {matcher.phrases[i] for i in matcher.find('P123_a.pdf')}
+        self.assertEqual(found, {'P12', 'P123', '23_'})
+
+    def test_duplicates_and_empty_phrase(self):
+        matcher = pack.PhraseMatcher(['ab', 'ab', ''])
+        self.assertEqual(matcher.phrases, ['ab', ''])
+        self.assertEqual(matcher.find('zzz'), {1})
+        self.assertEqual(matcher.find('xaby'), {0, 1})
+
+
+def apply_renames(names, plan):
+    # replays a plan's renames on a set of names, failing on anything the disk would refuse
+    names = set(names)
+    for step in plan.steps:
+        if isinstance(step, pack.PlannedOp):
+            src, dst = os.path.basename(step.src), os.path.basename(step.dst)
+            assert src in names, f"{src} is not there"
+            assert dst not in names, f"{dst} would be overwritten"
+            names.remove(src)
+            names.add(dst)
+    return names
+
+
+class FileNameMappingTest(unittest.TestCase):
+    def test_keeps_numbered_names_and_fills_gaps(self):
+        files = ['P1_2.pdf', 'b.png', 'a.txt']
+        mapping = pack._file_name_mapping('P1', files, files)
+        self.assertEqual(mapping, {'P1_2.pdf': 'P1_2.pdf', 'a.txt': 'P1_1.txt', 'b.png': 'P1_3.png'})
+
+    def test_rerun_is_identity(self):
+        files = ['x.pdf', 'y.pdf', 'P1_5.doc', 'z']
+        mapping = pack._file_name_mapping('P1', files, files)
+        renamed = list(mapping.values())
+        again = pack._file_name_mapping('P1', renamed, renamed)
+        self.assertTrue(all(old == new for old, new in again.items()))
+
+    def test_names_held_by_folders_are_not_reused(self):
+        mapping = pack._file_name_mapping('P1', ['P1_1', 'a'], ['a'])
+        self.assertEqual(mapping, {'a': 'P1_2'})
+
+    def test_duplicate_numbers_are_renumbered(self):
+        files = ['P1_1.pdf', 'P1_1.png']
+        mapping = pack._file_name_mapping('P1', files, files)
+        self.assertEqual(mapping, {'P1_1.pdf': 'P1_1.pdf', 'P1_1.png': 'P1_2.png'})
+
+
+class PlanMovesTest(unittest.TestCase):
+    def plan(self, moves):
+        plan = pack.OperationPlan()
+        pack._plan_moves(plan, 'root', moves, "{old} -> {new}", "{old}")
+        return plan
+
+    def test_swap(self):
+        self.assertEqual(apply_renames({'a', 'b'}, self.plan({'a': 'b', 'b': 'a'})), {'a', 'b'})
+
+    def test_cycle(self):
+        plan = self.plan({'a': 'b', 'b': 'c', 'c': 'a'})
+        self.assertEqual(apply_renames({'a', 'b', 'c'}, plan), {'a', 'b', 'c'})
+        finals = {os.path.basename(step.dst): step.done_msg for step in plan.steps if step.done_msg}
+        self.assertEqual(finals['b'], os.path.join('root', 'a') + " -> " + os.path.join('root', 'b'))
+
+    def test_chain_into_free_name(self):
+        plan = self.plan({'a': 'b', 'b': 'c'})
+        self.assertEqual(apply_renames({'a', 'b'}, plan), {'b', 'c'})
+        self.assertEqual(len(plan), 3)  # only b needs a temporary name
+
+
+class FileRenamesTest(TempDirTest):
+    def test_rename_then_rerun_plans_nothing(self):
+        self.make('lib/P1/b.pdf', 'lib/P1/a.pdf', 'lib/P1/P1_1.png', 'lib/P1/desktop.ini', 'lib/P2/P2_1.pdf')
+        lib = os.path.join(self.tmp, 'lib')
+        pack.execute_plan(pack.plan_file_renames(lib), lambda message: None)
+        self.assertEqual(sorted(os.listdir(os.path.join(lib, 'P1'))),
+                         ['P1_1.png', 'P1_2.pdf', 'P1_3.pdf', 'desktop.ini'])
+        again = pack.plan_file_renames(lib)
+        self.assertEqual(len(again), 0)
+        self.assertEqual(again.skipped, {'already named': 4})
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), "needs symlinks")
+    def test_linked_folders_are_listed_not_walked(self):
+        self.make('lib/F/sub/a.txt')
+        try:
+            os.symlink('..', os.path.join(self.tmp, 'lib', 'F', 'sub', 'loop'))
+        except OSError:
+            self.skipTest("cannot create symlinks here")
+        lib = os.path.join(self.tmp, 'lib')
+        walked = list(itertools.islice(pack.walk_parallel(lib), 50))
+        self.assertEqual(sorted(walked), sorted(os.walk(lib)))
+
+
+class FolderTagsTest(TempDirTest):
+    def test_tagging_twice_changes_nothing(self):
+        self.make('lib/C/P1/a.pdf', 'lib/C/P2/a.png', 'lib/C/P3_nfy/a.pdf', 'lib/C/P3_r/a.txt')
+        lib = os.path.join(self.tmp, 'lib')
+        pack.execute_plan(pack.plan_folder_tags(lib, 'docs'), lambda message: None)
+        self.assertEqual(sorted(os.listdir(os.path.join(lib, 'C'))), ['P1_r', 'P2_nfy', 'P3_nfy', 'P3_r'])
+        self.assertEqual(os.listdir(os.path.join(lib, 'C', 'P3_r')), ['a.pdf'])  # the two swapped
+        self.assertEqual(len(pack.plan_folder_tags(lib, 'docs')), 0)
+
+
+class IndexTest(TempDirTest):
+    def test_index_finds_what_the_disk_walk_finds(self):
+        self.make('src/a/P122_1.pdf', 'src/b/c/P122_2.png', 'src/b/x.txt', 'dst/P122/x.txt', 'dst/g/P122_r/y.txt')
+        self.chdir()
+        args = ('src', 'dst', ['P122', '22_', 'x'], 'folders')
+        indexed = pack.index_phrase_matches(*args, self.open_index('src'), self.open_index('dst'))
+        self.assertEqual(indexed, pack.index_phrase_matches(*args))
+
+    def test_refresh_only_rescans_changed_folders(self):
+        self.make('lib/a/x.pdf', 'lib/b/y.pdf')
+        self.chdir()
+        index = self.open_index('lib')
+        self.assertEqual(index.refresh(), 0)
+        self.make('lib/b/z.pdf')
+        st = os.stat('lib/b')  # file system clocks can be coarser than the test
+        os.utime('lib/b', ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(index.find('z', 'lib'), [(os.path.join('lib', 'b'), 'z.pdf')])
+
+
+class DumpCopiesTest(TempDirTest):
+    def test_same_file_copied_once_and_name_clash_gets_hash(self):
+        self.make('s1/P1.pdf', 's2/P1.pdf', 's4/P2.pdf', content=b'same')
+        self.make('s3/P1.pdf', content=b'other')
+        sources = [os.path.join(self.tmp, p) for p in ('s1/P1.pdf', 's2/P1.pdf', 's3/P1.pdf', 's4/P2.pdf')]
+        plan = pack.OperationPlan()
+        pack.plan_dump_copies(plan, sources, 'dump')
+        targets = [os.path.basename(step.dst) for step in plan.steps if isinstance(step, pack.PlannedOp)]
+        digest = pack._file_digest(sources[2])
+        # same content under another name is still copied, so a search for P2 finds it
+        self.assertEqual(targets, ['P1.pdf', f"P1_{digest[:8]}.pdf", 'P2.pdf'])
+        self.assertEqual(plan.skipped, {'duplicate content': 1})
+        self.assertEqual(plan.stored_as[sources[1]][0], os.path.join('dump', 'P1.pdf'))
+
+    def test_plan_is_deterministic(self):
+        self.make(*[f"s{i}/P1.pdf" for i in range(4)])
+        self.make('s9/P1.pdf', content=b'y')
+        sources = sorted(os.path.join(self.tmp, f"s{i}", 'P1.pdf') for i in (0, 1, 2, 3, 9))
+        plans = []
+        for _ in range(2):
+            plan = pack.OperationPlan()
+            pack.plan_dump_copies(plan, sources, 'dump', max_workers=4)
+            plans.append([(step.src, step.dst) for step in plan.steps])
+        self.assertEqual(plans[0], plans[1])
+
+
+class ZipMembersTest(TempDirTest):
+    def zip_cache(self):
+        cache = pack.ZipListingCache()
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_index_and_disk_walk_open_the_same_archives(self):
+        self.make('src/a/P122_1.pdf', 'src/b/x.txt', 'dst/P122/x.txt')
+        for name in ('src/a/arch.Zip', 'src/b/notazip.zipper', 'src/b/ok.zip'):
+            with zipfile.ZipFile(os.path.join(self.tmp, name), 'w') as zf:
+                zf.writestr('in/P122_q.pdf', 'q')
+        self.chdir()
+        args = ('src', 'dst', ['P122'], 'folders')
+        on_disk = pack.index_phrase_matches(*args, zip_cache=self.zip_cache())
+        indexed = pack.index_phrase_matches(*args, self.open_index('src'), self.open_index('dst'), self.zip_cache())
+        self.assertEqual(indexed, on_disk)
+        archives = {root.archive for root, name in on_disk[0]['P122'] if isinstance(root, pack.ZipMember)}
+        self.assertEqual(archives, {os.path.join('src', 'a', 'arch.Zip'), os.path.join('src', 'b', 'ok.zip')})
+
+    def test_member_is_extracted_on_its_own(self):
+        archive = os.path.join(self.tmp, 'a.zip')
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('in/P1.pdf', b'data')
+            zf.writestr('other.bin', b'y' * 1000)
+        member, = [m for m in self.zip_cache().members([archive])[archive] if m.member == 'in/P1.pdf']
+        self.assertEqual(str(member), os.path.join(archive, 'in', 'P1.pdf'))
+        dst = os.path.join(self.tmp, 'P1.pdf')
+        self.assertEqual(pack.extract_member(member, dst), 4)
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+
+if __name__ == '__main__':
+    unittest.main()